@@ -1,22 +1,94 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import csv
+import ctypes
+import ctypes.util
+import fcntl
 import gi
+import hashlib
+import heapq
+import itertools
 import json
+import mmap
 import os
+import pickle
+import queue
+import re
 import shutil
+import sqlite3
+import struct
 import subprocess
+import sys
+import threading
 import time
+from array import array
+from collections.abc import Sequence
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
 
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
 from gi.repository import Gtk, Gdk, GLib
 
 CONFIG_FILE = os.path.expanduser("~/.config/prompt_click/strings.json")
+STORAGE_DB_FILE = os.path.join(os.path.dirname(CONFIG_FILE), "snippets.db")
+JOURNAL_COMPACT_ENTRIES = 50
+IMPORT_BATCH_SIZE = 1000
+IMPORT_DEFAULT_SECTION = "Imported"
+IMPORT_FILE_EXTENSIONS = (".txt", ".md", ".markdown")
+STORAGE_JSON = "json"
+STORAGE_SQLITE = "sqlite"
+STORAGE_BACKEND = os.environ.get("PROMPT_CLICK_STORAGE")
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "prompt_click",
+)
+SEARCH_INDEX_FILE = os.path.join(CACHE_DIR, "search_index.pickle")
+PREVIEW_CACHE_FILE = os.path.join(CACHE_DIR, "previews.pickle")
+SNIPPET_PACK_FILE = os.path.join(CACHE_DIR, "snippets.pack")
+SEARCH_INDEX_CHARS = 200
+SEARCH_RESULT_LIMIT = 50
 DEFAULT_TRUNCATE_LENGTH = 100
+DEFAULT_DIRECT_TYPING = False
+DEFAULT_FREQUENT_SECTION = True
+DEFAULT_STICKY_POPUP = False
+DEFAULT_TEMPLATE_COMMANDS = False
+DEFAULT_FORM_FILL_KEY = "tab"
+FORM_FILL_KEYS = {"tab": "Tab", "enter": "Return", "down": "Down"}  # Setting value -> X keysym
+FORM_FILL_PASTE_SETTLE_SECONDS = 0.05
 PASTE_MODE_AUTO = "auto"
 PASTE_MODE_COPY = "copy"
 AUTOPASTE_TRIGGER_PATH = os.environ.get("PROMPT_CLICK_AUTOPASTE_TRIGGER")
 AUTOPASTE_TRIGGER_TOKEN = os.environ.get("PROMPT_CLICK_AUTOPASTE_TOKEN")
+AUTOPASTE_DONE_TIMEOUT_SECONDS = 2.0
+TRACE_FILE = os.environ.get("PROMPT_CLICK_TRACE_FILE")
+PASTE_TIMING_FILE = os.path.join(os.path.dirname(CONFIG_FILE), "paste_timing.json")
+USAGE_LOG_FILE = os.path.join(os.path.dirname(CONFIG_FILE), "usage.log")
+USAGE_COMPACT_LINES = 1000
+FRECENCY_HALF_LIFE_SECONDS = 7 * 24 * 3600
+FREQUENT_SECTION_SIZE = 20
+FREQUENT_SECTION_IDX = -1
+# {{name}} or {{name:argument}}, e.g. {{date:%d.%m.%Y}} or {{cmd:git branch --show-current}}
+TEMPLATE_PATTERN = re.compile(r"\{\{\s*(\w+)(?::(.*?))?\s*\}\}", re.DOTALL)
+TEMPLATE_FIELDS = ("date", "time", "clipboard", "cmd", "file")
+TEMPLATE_SAFE_FIELDS = ("date", "time", "clipboard")  # Read nothing outside the popup
+TEMPLATE_WORKERS = 4
+TEMPLATE_COMMAND_TIMEOUT_SECONDS = 2.0
+TEMPLATE_EXPAND_TIMEOUT_SECONDS = 2.0
+TEMPLATE_CACHE_TTL_SECONDS = 30.0
+POPUP_UNMAP_TIMEOUT_SECONDS = 0.5
+FOCUS_POLL_INTERVAL_SECONDS = 0.005
+FOCUS_TIMEOUT_MIN_SECONDS = 0.15
+FOCUS_TIMEOUT_MAX_SECONDS = 1.0
+CLIPBOARD_CONFIRM_TIMEOUT_SECONDS = 0.5
+POPUP_WIDTH_SAMPLE_ROWS = 50
+POPUP_MIN_LIST_WIDTH = 240
+POPUP_STORE_FIRST_ROWS = 50  # Rows added before the first frame; more than a screenful
+POPUP_STORE_CHUNK_ROWS = 2000  # Rows added per idle callback after that
+CONFIG_RELOAD_DEBOUNCE_MS = 200
+DIRECTORY_INDEX_DIR = os.path.join(CACHE_DIR, "directories")
+CONFIG_SCHEMA_VERSION = 3
+TAG_PREFIX = "#"
 
 
 def detect_session_type():
@@ -32,7 +104,9 @@ IS_WAYLAND = SESSION_TYPE == "wayland"
 
 DEFAULT_CONFIG = {
     "settings": {
-        "truncate_length": DEFAULT_TRUNCATE_LENGTH
+        "truncate_length": DEFAULT_TRUNCATE_LENGTH,
+        "direct_typing": DEFAULT_DIRECT_TYPING,
+        "frequent_section": DEFAULT_FREQUENT_SECTION
     },
     "sections": [
         {
@@ -52,51 +126,2498 @@ def apply_config_migrations(config):
     if truncate_len in (None, 30):
         settings["truncate_length"] = DEFAULT_TRUNCATE_LENGTH
 
+    # Schema 2: every snippet has a stable id, and "snippets" maps the ids
+    # of some of them to their tags and other metadata. Schema 3 files keep
+    # each id next to its text as {"id", "text"}, so snippets inserted or
+    # reordered by hand keep theirs; schema 2 files kept them in a parallel
+    # "ids" list. Missing or clashing ids are numbered in document order,
+    # so re-reading an older file gives the same ids.
+    sections = config.setdefault("sections", [])
+    for section in sections:
+        strings = section["strings"]
+        if any(isinstance(entry, dict) for entry in strings):
+            section["ids"] = [entry.get("id") if isinstance(entry, dict) else None for entry in strings]
+            section["strings"] = [
+                entry.get("text", "") if isinstance(entry, dict) else entry for entry in strings
+            ]
+    next_id = config.get("next_id")
+    if not is_snippet_id(next_id):
+        next_id = 1
+    for section in sections:
+        ids = section.get("ids")
+        if isinstance(ids, list) and ids:
+            next_id = max(next_id, max((i for i in ids if is_snippet_id(i)), default=0) + 1)
+    seen = set()
+    for section in sections:
+        ids = section.get("ids")
+        if not isinstance(ids, list) or len(ids) != len(section["strings"]):
+            ids = [None] * len(section["strings"])
+        fixed = []
+        for snippet_id in ids:
+            if not is_snippet_id(snippet_id) or snippet_id in seen:
+                snippet_id = next_id
+                next_id += 1
+            seen.add(snippet_id)
+            fixed.append(snippet_id)
+        section["ids"] = fixed
+    snippets = config.get("snippets")
+    config["snippets"] = {
+        key: info
+        for key, info in (snippets.items() if isinstance(snippets, dict) else ())
+        if isinstance(info, dict) and key.isdigit() and int(key) in seen
+    }
+    config["next_id"] = next_id
+    config["schema"] = CONFIG_SCHEMA_VERSION
+
     return config
 
 
-def load_config():
-    """Load config from file with migration support."""
-    if os.path.exists(CONFIG_FILE):
+def is_snippet_id(value):
+    return type(value) is int and value > 0
+
+
+def config_from_data(data):
+    """Build a config from parsed JSON, upgrading legacy shapes."""
+    # Migration: old format (just a list)
+    if isinstance(data, list):
+        return apply_config_migrations({
+            "settings": DEFAULT_CONFIG["settings"].copy(),
+            "sections": [{"name": "General", "strings": data}]
+        })
+
+    # Migration: old format with "strings" key
+    if "strings" in data and "sections" not in data:
+        return apply_config_migrations({
+            "settings": data.get("settings", DEFAULT_CONFIG["settings"].copy()),
+            "sections": [{"name": "General", "strings": data["strings"]}]
+        })
+
+    return apply_config_migrations(data)
+
+
+def config_to_data(config):
+    """Return config in the shape strings.json stores, each id next to its text."""
+    return {
+        **config,
+        "sections": [
+            {
+                **{key: value for key, value in section.items() if key != "ids"},
+                "strings": [
+                    {"id": snippet_id, "text": text}
+                    for snippet_id, text in zip(section["ids"], section["strings"])
+                ],
+            }
+            for section in config["sections"]
+        ],
+    }
+
+
+def journal_entry(old, new):
+    """Describe new as a change of old, or return None if they are equal.
+
+    Sections whose strings and ids did not change are referenced by their
+    index in old; only edited sections carry them. The snippet metadata is
+    only written when it changed.
+    """
+    by_content = {}  # {(count, first string): [old section index, ...]}
+    for idx, section in enumerate(old["sections"]):
+        strings = section["strings"]
+        by_content.setdefault((len(strings), strings[0] if strings else None), []).append(idx)
+
+    items = []
+    unchanged = new["settings"] == old["settings"] and len(new["sections"]) == len(old["sections"])
+    for idx, section in enumerate(new["sections"]):
+        strings = section["strings"]
+        candidates = by_content.get((len(strings), strings[0] if strings else None), [])
+        if idx in candidates:
+            candidates = [idx] + candidates  # Prefer the same position
+        origin = next(
+            (
+                i for i in candidates
+                if old["sections"][i]["strings"] == strings
+                and old["sections"][i].get("ids") == section["ids"]
+            ),
+            None,
+        )
+        if origin is None:
+            items.append({"name": section["name"], "strings": list(strings), "ids": list(section["ids"])})
+            unchanged = False
+        else:
+            items.append({"name": section["name"], "from": origin})
+            unchanged = unchanged and origin == idx and section["name"] == old["sections"][idx]["name"]
+    entry = {"settings": new["settings"], "next_id": new["next_id"], "sections": items}
+    if new["snippets"] != old.get("snippets"):
+        entry["snippets"] = new["snippets"]
+        unchanged = False
+    if unchanged and new["next_id"] == old.get("next_id"):
+        return None
+    return entry
+
+
+def apply_journal_entry(config, entry):
+    sections = config["sections"]
+    return {
+        "settings": entry["settings"],
+        "sections": [
+            {
+                "name": item["name"],
+                "strings": sections[item["from"]]["strings"] if "from" in item else item["strings"],
+                "ids": sections[item["from"]].get("ids") if "from" in item else item.get("ids"),
+            }
+            for item in entry["sections"]
+        ],
+        "next_id": entry.get("next_id", config.get("next_id")),
+        "snippets": entry.get("snippets", config.get("snippets")),
+    }
+
+
+def renumber_config(config, renumbered):
+    """config with its snippet ids mapped through renumbered."""
+    sections = [
+        {**section, "ids": [renumbered.get(snippet_id, snippet_id) for snippet_id in section["ids"]]}
+        if any(snippet_id in renumbered for snippet_id in section["ids"]) else section
+        for section in config["sections"]
+    ]
+    snippets = {
+        str(renumbered.get(int(key), int(key))): info for key, info in config.get("snippets", {}).items()
+    }
+    return {**config, "sections": sections, "snippets": snippets}
+
+
+def merge_configs(base, ours, theirs, renumbered=None):
+    """Apply the changes from base to ours on top of theirs.
+
+    Used when another process saved since base was loaded. Snippets are
+    matched by id. In the sections ours changed, its order, additions,
+    edits and deletions win; snippets it left untouched keep their text
+    from theirs, or stay deleted if theirs deleted them, and snippets theirs
+    added follow. Sections ours did not change are taken from theirs. New
+    ids that both sides handed out are renumbered on ours' side.
+
+    Returns (merged config, renumbered), where renumbered maps ours' ids to
+    the ids they were saved under. Pass it back for the next merge of a
+    config that still uses ours' ids.
+    """
+    renumbered = dict(renumbered or {})
+    if renumbered:
+        base = renumber_config(base, renumbered)
+        ours = renumber_config(ours, renumbered)
+    base_ids = {snippet_id for section in base["sections"] for snippet_id in section["ids"]}
+    base_sections = {}
+    for section in base["sections"]:
+        base_sections.setdefault(section["name"], section)
+    ours_names = {section["name"] for section in ours["sections"]}
+
+    def changed(section):
+        old = base_sections.get(section["name"])
+        if old is None:
+            return True
+        if old["strings"] is section["strings"] and old["ids"] is section["ids"]:
+            return False
+        return list(old["ids"]) != list(section["ids"]) or list(old["strings"]) != list(section["strings"])
+
+    touched = [section for section in ours["sections"] if changed(section)]
+    touched_names = {section["name"] for section in touched}
+    removed_names = set(base_sections) - ours_names
+    base_text = {}  # {id: text} in the base sections ours changed or removed
+    for name in touched_names | removed_names:
+        if name in base_sections:
+            base_text.update(zip(base_sections[name]["ids"], base_sections[name]["strings"]))
+
+    theirs_text = {}
+    for section in theirs["sections"]:
+        theirs_text.update(zip(section["ids"], section["strings"]))
+    next_id = max(ours.get("next_id", 1), theirs.get("next_id", 1))
+    new_ids = {}
+    for section in touched:
+        for snippet_id in section["ids"]:
+            if snippet_id not in base_ids and snippet_id in theirs_text and snippet_id not in new_ids:
+                new_ids[snippet_id] = next_id
+                next_id += 1
+
+    placed = set(base_text)  # Ids whose place ours decides
+    ours_entries = {}
+    for section in touched:
+        entries = []
+        for snippet_id, text in zip(section["ids"], section["strings"]):
+            if snippet_id not in new_ids:
+                placed.add(snippet_id)
+            if snippet_id in base_text and text == base_text[snippet_id]:
+                if snippet_id not in theirs_text:
+                    continue  # Deleted by theirs
+                text = theirs_text[snippet_id]
+            entries.append((new_ids.get(snippet_id, snippet_id), text))
+        ours_entries.setdefault(section["name"], entries)
+
+    sections = []
+    theirs_names = set()
+    for section in theirs["sections"]:
+        name = section["name"]
+        rest = [entry for entry in zip(section["ids"], section["strings"]) if entry[0] not in placed]
+        if name in touched_names and name not in theirs_names:
+            entries = ours_entries[name] + rest
+        elif name in removed_names:
+            entries = [entry for entry in rest if entry[0] not in base_ids]  # Added by theirs
+            if not entries:
+                continue
+        elif len(rest) == len(section["ids"]):
+            sections.append(section)
+            theirs_names.add(name)
+            continue
+        else:
+            entries = rest
+        theirs_names.add(name)
+        sections.append({
+            "name": name,
+            "strings": [text for _snippet_id, text in entries],
+            "ids": [snippet_id for snippet_id, _text in entries],
+        })
+    for idx, section in enumerate(ours["sections"]):
+        name = section["name"]
+        if name in touched_names and name not in theirs_names:
+            theirs_names.add(name)
+            entries = ours_entries[name]
+            sections.insert(min(idx, len(sections)), {
+                "name": name,
+                "strings": [text for _snippet_id, text in entries],
+                "ids": [snippet_id for snippet_id, _text in entries],
+            })
+
+    def merge_dict(base_items, ours_items, theirs_items):
+        merged = dict(theirs_items)
+        for key in base_items.keys() | ours_items.keys():
+            if key not in ours_items:
+                merged.pop(key, None)
+            elif key not in base_items or ours_items[key] != base_items[key]:
+                merged[key] = ours_items[key]
+        return merged
+
+    ours_snippets = {str(new_ids.get(int(key), int(key))): info for key, info in ours.get("snippets", {}).items()}
+    snippets = merge_dict(base.get("snippets", {}), ours_snippets, theirs.get("snippets", {}))
+    kept = {str(snippet_id) for section in sections for snippet_id in section["ids"]}
+    renumbered.update(new_ids)
+    return {
+        **theirs,
+        "settings": merge_dict(base["settings"], ours["settings"], theirs["settings"]),
+        "sections": sections,
+        "next_id": next_id,
+        "snippets": {key: info for key, info in snippets.items() if key in kept},
+    }, renumbered
+
+
+class ConfigJournal:
+    """strings.json plus an append-only journal of the saves since.
+
+    A save appends one fsynced line (see journal_entry) instead of
+    rewriting the file. After JOURNAL_COMPACT_ENTRIES lines, or once the
+    journal outgrows the file, both are folded into strings.json through a
+    temp file, fsync and rename. The journal starts with the digest of the
+    file it applies to; one left behind by a crash during compaction or by
+    an outside edit of strings.json is moved aside with a notification
+    instead of being applied. A torn last line is dropped. Readers and writers hold an advisory lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+
+    @contextlib.contextmanager
+    def locked(self, operation):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, operation)
+            yield  # Closing the file releases the lock
+
+    def version(self):
+        """Identity of the file and its journal, or None if the file is missing."""
+        base = config_version(self.path)
+        journal = config_version(self.journal_path)
+        if base is None or journal is None:
+            return base
+        return f"{base}:{journal}"
+
+    def digest(self):
+        digest = hashlib.blake2b(digest_size=16)
+        for path in (self.path, self.journal_path):
+            try:
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return None
+        return digest.digest()
+
+    def read(self):
+        """Return (config, state), with config None if the file is missing.
+
+        Raises OSError or ValueError if strings.json cannot be read.
+        Call with the lock held.
+        """
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None, None
+        config = config_from_data(json.loads(raw))
+        state = {
+            "base": hashlib.blake2b(raw, digest_size=16).hexdigest(),
+            "base_size": len(raw),
+            "entries": 0,
+            "end": 0,  # Journal offset after the last valid line
+        }
+        try:
+            with open(self.journal_path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+        except FileNotFoundError:
+            lines = []
+        try:
+            if lines and json.loads(lines[0]).get("base") == state["base"]:
+                state["end"] = len(lines[0])
+                for line in lines[1:]:
+                    if not line.endswith(b"\n"):
+                        break  # Torn by a crash mid-append
+                    config = apply_journal_entry(config, json.loads(line))
+                    state["entries"] += 1
+                    state["end"] += len(line)
+            elif len(lines) > 1:
+                self.set_aside(sum(1 for line in lines[1:] if line.endswith(b"\n")))
+        except (ValueError, AttributeError, LookupError, TypeError):
+            pass  # Keep the entries read so far
+        return apply_config_migrations(config), state
+
+    def set_aside(self, entries):
+        """Keep a journal that no longer applies to strings.json, and say so"""
+        orphaned_path = f"{self.journal_path}.orphaned"
+        try:
+            os.replace(self.journal_path, orphaned_path)
+        except OSError:
+            return  # Already moved by another reader
+        notify_user(
+            f"{self.path} was changed outside Prompt Click, so its journal no longer"
+            f" applies ({entries} saves). It was kept as {orphaned_path}."
+        )
 
-                # Migration: old format (just a list)
-                if isinstance(data, list):
-                    return apply_config_migrations({
-                        "settings": DEFAULT_CONFIG["settings"].copy(),
-                        "sections": [{"name": "General", "strings": data}]
-                    })
-
-                # Migration: old format with "strings" key
-                if "strings" in data and "sections" not in data:
-                    return apply_config_migrations({
-                        "settings": data.get("settings", DEFAULT_CONFIG["settings"].copy()),
-                        "sections": [{"name": "General", "strings": data["strings"]}]
-                    })
-
-                return apply_config_migrations(data)
-        except:
-            pass
-    return apply_config_migrations(DEFAULT_CONFIG.copy())
+    def write(self, config, current, state):
+        """Record config over the current one read under the same lock.
+
+        Returns False if nothing changed.
+        """
+        if current is None or state is None:
+            self.compact(config)
+            return True
+        entry = journal_entry(current, config)
+        if entry is None:
+            return False
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        if state["entries"] + 1 >= JOURNAL_COMPACT_ENTRIES or state["end"] + len(line) > state["base_size"]:
+            self.compact(config)
+        elif state["end"] == 0:
+            header = (json.dumps({"base": state["base"]}) + "\n").encode("utf-8")
+            self.replace(self.journal_path, header + line)
+        else:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(state["end"])
+                f.seek(state["end"])
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def compact(self, config):
+        data = config_to_data(config)
+        self.replace(self.path, json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"))
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.journal_path)
+
+    @staticmethod
+    def replace(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        dir_fd = os.open(os.path.dirname(path), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class JsonStore:
+    """Config kept as a JSON document with a journal of later saves."""
+
+    has_fts = False
+
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.journal = ConfigJournal(path)
+        self.loaded_version = None  # Version the caller's config came from
+        self.loaded_config = None  # That config, the base of a merge with another save
+        self.renumbered = {}  # Ids of the caller's config renumbered by such merges
+
+    def load(self):
+        """Load config from file with migration support."""
+        config = None
+        with self.journal.locked(fcntl.LOCK_SH):
+            self.loaded_version = self.journal.version()
+            try:
+                config, _state = self.journal.read()
+            except (OSError, ValueError, TypeError) as exc:
+                self.keep_unreadable(exc)
+        if config is None:
+            config = apply_config_migrations(DEFAULT_CONFIG.copy())
+        self.loaded_config = config
+        self.renumbered = {}
+        return config
+
+    def keep_unreadable(self, error):
+        """Copy an unreadable strings.json aside before the defaults replace it."""
+        backup = f"{self.path}.corrupt"
+        try:
+            shutil.copy2(self.path, backup)
+        except OSError:
+            backup = None
+        notify_user(
+            f"Could not read {self.path} ({error}); starting with the default snippets."
+            + (f" The old file was kept as {backup}." if backup else "")
+        )
+
+    def save(self, config):
+        """Journal config on top of the file; returns False if nothing changed.
+
+        If another process saved since the config was loaded, the changes
+        are merged into its save instead. loaded_version is then left
+        behind the file, so the caller reloads the merged config and its
+        next save merges again.
+        """
+        with self.journal.locked(fcntl.LOCK_EX):
+            version = self.journal.version()
+            try:
+                current, state = self.journal.read()
+            except (OSError, ValueError, TypeError):
+                current, state = None, None  # Unreadable: rewrite it whole
+            merged = (
+                current is not None and self.loaded_config is not None
+                and self.loaded_version is not None and version != self.loaded_version
+            )
+            if merged:
+                notify_user("Snippets were changed in another Prompt Click window; merged your changes into theirs.")
+                config_merged, self.renumbered = merge_configs(self.loaded_config, config, current, self.renumbered)
+                changed = self.journal.write(config_merged, current, state)
+                self.loaded_version = version
+            else:
+                changed = self.journal.write(config, current, state)
+                self.loaded_version = self.journal.version()
+                self.renumbered = {}
+            self.loaded_config = config
+        return changed
+
+    def export(self, config):
+        """Write config as one plain JSON document without a journal."""
+        self.journal.compact(config)
+
+    def fold_journal(self):
+        """Fold the journal into strings.json, so scripts and hand edits see every save.
+
+        Returns the (old, new) store versions, or None if there was nothing to fold.
+        """
+        with self.journal.locked(fcntl.LOCK_EX):
+            try:
+                config, state = self.journal.read()
+            except (OSError, ValueError, TypeError):
+                return None
+            if config is None or not state["entries"]:
+                return None
+            version = self.journal.version()
+            self.journal.compact(config)
+            folded = self.journal.version()
+            if self.loaded_version == version:
+                self.loaded_version = folded
+            return version, folded
+
+    def iter_snippets(self):
+        for section in self.load()["sections"]:
+            for text in section["strings"]:
+                yield section["name"], text
+
+    def import_snippets(self, rows, batch_size=IMPORT_BATCH_SIZE):
+        """Append (section_name, text) rows, skipping texts already present.
+
+        The document is held in memory anyway, so it is saved once at the
+        end, read and written under one exclusive lock; returns (added,
+        skipped).
+        """
+        with self.journal.locked(fcntl.LOCK_EX):
+            try:
+                current, state = self.journal.read()
+            except (OSError, ValueError, TypeError) as exc:
+                self.keep_unreadable(exc)
+                current, state = None, None
+            if current is None:
+                current = apply_config_migrations(DEFAULT_CONFIG.copy())
+            # Copied sections, so current stays the base the journal entry is taken against
+            config = {**current, "sections": [dict(section) for section in current["sections"]]}
+            seen = {snippet_key(text) for section in config["sections"] for text in section["strings"]}
+            sections = {}
+            for section in config["sections"]:
+                sections.setdefault(section["name"], section)
+            copied = set()  # Names of the sections whose lists were copied
+            added = skipped = 0
+            for name, text in rows:
+                key = snippet_key(text)
+                if key in seen:
+                    skipped += 1
+                    continue
+                seen.add(key)
+                section = sections.get(name)
+                if section is None:
+                    section = sections[name] = {"name": name, "strings": [], "ids": []}
+                    config["sections"].append(section)
+                elif name not in copied:
+                    section["strings"] = list(section["strings"])
+                    section["ids"] = list(section["ids"])
+                copied.add(name)
+                section["strings"].append(text)
+                section["ids"].append(config["next_id"])
+                config["next_id"] += 1
+                added += 1
+            if added:
+                self.journal.write(config, current, state)
+        return added, skipped
+
+    def version(self):
+        return self.journal.version()
+
+    def digest(self):
+        """Hash of the file and journal contents, which outlives an unchanged rewrite."""
+        return self.journal.digest()
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        return None  # No built-in index; the picker builds a SearchIndex
+
+
+class SqliteStore:
+    """Sections and snippets as SQLite rows with an FTS5 search index.
+
+    A snippet's row id is its stable id. Saving diffs the config against
+    the stored rows by id in one transaction: unchanged snippets are not
+    touched, moved ones only get a new position, and only added or edited
+    texts are written and re-indexed. A new database is filled from
+    strings.json. The connection is shared with the background writer, so
+    every use holds self.lock.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS sections (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS snippets (
+            id INTEGER PRIMARY KEY,
+            section_id INTEGER NOT NULL REFERENCES sections(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            text TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS snippets_by_section ON snippets(section_id, position);
+        CREATE TABLE IF NOT EXISTS snippet_info (
+            snippet_id INTEGER PRIMARY KEY REFERENCES snippets(id) ON DELETE CASCADE,
+            data TEXT NOT NULL
+        );
+    """
+
+    FTS_INSERT_TRIGGER = """
+        CREATE TRIGGER IF NOT EXISTS snippets_ai AFTER INSERT ON snippets BEGIN
+            INSERT INTO snippets_fts(rowid, text) VALUES (new.id, new.text);
+        END
+    """
+
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5(
+            text, content='snippets', content_rowid='id', tokenize='trigram'
+        );
+    """ + FTS_INSERT_TRIGGER + """;
+        CREATE TRIGGER IF NOT EXISTS snippets_ad AFTER DELETE ON snippets BEGIN
+            INSERT INTO snippets_fts(snippets_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS snippets_au AFTER UPDATE OF text ON snippets BEGIN
+            INSERT INTO snippets_fts(snippets_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO snippets_fts(rowid, text) VALUES (new.id, new.text);
+        END;
+    """
+
+    def __init__(self, path=STORAGE_DB_FILE, json_path=CONFIG_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.loaded_version = None  # Version the caller's config came from
+        self.loaded_config = None  # That config, the base of a merge with another save
+        self.renumbered = {}  # Ids of the caller's config renumbered by such merges
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        with self.db:
+            self.db.executescript(self.SCHEMA)
+        try:
+            with self.db:
+                self.db.executescript(self.FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 or its trigram tokenizer
+            self.has_fts = False
+
+        if self.version() is None:
+            self.save(JsonStore(json_path).load())
+
+    def load(self):
+        with self.lock:
+            self.loaded_version = self.version()
+            settings = {key: json.loads(value) for key, value in self.db.execute("SELECT key, value FROM settings")}
+            sections = []
+            by_id = {}
+            for section_id, name in self.db.execute("SELECT id, name FROM sections ORDER BY position"):
+                by_id[section_id] = {"name": name, "strings": [], "ids": []}
+                sections.append(by_id[section_id])
+            for section_id, snippet_id, text in self.db.execute(
+                "SELECT section_id, id, text FROM snippets ORDER BY section_id, position"
+            ):
+                by_id[section_id]["strings"].append(text)
+                by_id[section_id]["ids"].append(snippet_id)
+            snippets = {
+                str(snippet_id): json.loads(data)
+                for snippet_id, data in self.db.execute("SELECT snippet_id, data FROM snippet_info")
+            }
+            next_id = self.next_id()
+        self.loaded_config = apply_config_migrations({
+            "settings": settings,
+            "sections": sections,
+            "next_id": next_id,
+            "snippets": snippets,
+        })
+        self.renumbered = {}
+        return self.loaded_config
+
+    def save(self, config):
+        """Write the differences to config; returns False if nothing changed.
+
+        Changes made by another process since the config was loaded are
+        merged as in JsonStore.save.
+        """
+        with self.lock:
+            version = self.version()
+            if self.loaded_config is not None and self.loaded_version is not None and version != self.loaded_version:
+                notify_user("Snippets were changed in another Prompt Click window; merged your changes into theirs.")
+                loaded_config, renumbered = self.loaded_config, self.renumbered
+                config_merged, renumbered = merge_configs(loaded_config, config, self.load(), renumbered)
+                changed = self._save(config_merged)
+                self.loaded_version = version
+                self.renumbered = renumbered
+            else:
+                changed = self._save(config)
+                self.loaded_version = self.version()
+                self.renumbered = {}
+            self.loaded_config = config
+        return changed
+
+    def _save(self, config):
+        with self.db:
+            changes = self.db.total_changes
+            self._save_settings(config["settings"])
+            section_ids = self._save_sections(config["sections"])
+
+            stored = {
+                row[0]: row[1:] for row in self.db.execute("SELECT id, section_id, position, text FROM snippets")
+            }
+            for section_id, section in zip(section_ids, config["sections"]):
+                for position, (snippet_id, text) in enumerate(zip(section["ids"], section["strings"])):
+                    row = stored.pop(snippet_id, None)
+                    if row is None:
+                        self.db.execute(
+                            "INSERT INTO snippets (id, section_id, position, text) VALUES (?, ?, ?, ?)",
+                            (snippet_id, section_id, position, text),
+                        )
+                    elif row[2] != text:
+                        self.db.execute(
+                            "UPDATE snippets SET section_id = ?, position = ?, text = ? WHERE id = ?",
+                            (section_id, position, text, snippet_id),
+                        )
+                    elif row[:2] != (section_id, position):
+                        # Leaves text out of the SET, so the FTS trigger stays quiet
+                        self.db.execute(
+                            "UPDATE snippets SET section_id = ?, position = ? WHERE id = ?",
+                            (section_id, position, snippet_id),
+                        )
+            self.db.executemany("DELETE FROM snippets WHERE id = ?", [(snippet_id,) for snippet_id in stored])
+            self.db.execute(
+                "DELETE FROM sections WHERE id NOT IN (%s)" % ",".join("?" * len(section_ids)),
+                section_ids,
+            )
+            self._save_snippet_info(config["snippets"])
+            if config["next_id"] > self.next_id():
+                self.set_next_id(config["next_id"])
+            if self.db.total_changes == changes:
+                return False
+            self.db.execute(
+                "INSERT INTO meta (key, value) VALUES ('revision', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+            )
+        return True
+
+    def _save_settings(self, settings):
+        stored = dict(self.db.execute("SELECT key, value FROM settings"))
+        for key, value in settings.items():
+            encoded = json.dumps(value)
+            if stored.pop(key, None) != encoded:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, encoded)
+                )
+        self.db.executemany("DELETE FROM settings WHERE key = ?", [(key,) for key in stored])
+
+    def _save_snippet_info(self, snippets):
+        stored = dict(self.db.execute("SELECT snippet_id, data FROM snippet_info"))
+        for key, info in snippets.items():
+            encoded = json.dumps(info, ensure_ascii=False)
+            if stored.pop(int(key), None) != encoded:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO snippet_info (snippet_id, data) VALUES (?, ?)", (int(key), encoded)
+                )
+        self.db.executemany("DELETE FROM snippet_info WHERE snippet_id = ?", [(key,) for key in stored])
+
+    def next_id(self):
+        row = self.db.execute(
+            "SELECT MAX(COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'next_id'), 1), "
+            "COALESCE((SELECT MAX(id) + 1 FROM snippets), 1))"
+        ).fetchone()
+        return row[0]
+
+    def set_next_id(self, next_id):
+        self.db.execute(
+            "INSERT INTO meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (str(next_id),),
+        )
+
+    def _save_sections(self, sections):
+        """Match sections to stored rows, by name first, and return their ids in order."""
+        stored = self.db.execute("SELECT id, position, name FROM sections ORDER BY position").fetchall()
+        by_name = {}
+        for row in stored:
+            by_name.setdefault(row[2], []).append(row)
+        matched = [by_name[s["name"]].pop(0) if by_name.get(s["name"]) else None for s in sections]
+        # Renamed sections take over the remaining rows in order
+        leftover = [row for row in stored if row not in matched]
+        section_ids = []
+        for position, (section, row) in enumerate(zip(sections, matched)):
+            if row is None and leftover:
+                row = leftover.pop(0)
+            if row is None:
+                cursor = self.db.execute(
+                    "INSERT INTO sections (position, name) VALUES (?, ?)", (position, section["name"])
+                )
+                section_ids.append(cursor.lastrowid)
+                continue
+            if (row[1], row[2]) != (position, section["name"]):
+                self.db.execute(
+                    "UPDATE sections SET position = ?, name = ? WHERE id = ?",
+                    (position, section["name"], row[0]),
+                )
+            section_ids.append(row[0])
+        return section_ids
+
+    def iter_snippets(self):
+        with self.lock:
+            yield from self.db.execute(
+                """
+                SELECT sections.name, snippets.text
+                FROM snippets JOIN sections ON sections.id = snippets.section_id
+                ORDER BY sections.position, snippets.position
+                """
+            )
+
+    def import_snippets(self, rows, batch_size=IMPORT_BATCH_SIZE):
+        """Append (section_name, text) rows, skipping texts already stored.
+
+        rows is consumed lazily and committed every batch_size snippets, so
+        memory holds one batch plus a short hash per snippet; returns
+        (added, skipped).
+        """
+        added = skipped = 0
+        with self.lock:
+            seen = {snippet_key(text) for (text,) in self.db.execute("SELECT text FROM snippets")}
+            sections = {}  # {name: [section_id, next position]}
+            for section_id, name, next_position in self.db.execute(
+                """
+                SELECT sections.id, sections.name, COALESCE(MAX(snippets.position) + 1, 0)
+                FROM sections LEFT JOIN snippets ON snippets.section_id = sections.id
+                GROUP BY sections.id ORDER BY sections.position DESC
+                """
+            ):
+                sections[name] = [section_id, next_position]  # First of equal names wins
+            batch = []
+            for name, text in rows:
+                key = snippet_key(text)
+                if key in seen:
+                    skipped += 1
+                    continue
+                seen.add(key)
+                batch.append((name, text))
+                if len(batch) >= batch_size:
+                    added += self._import_batch(batch, sections)
+                    batch = []
+            if batch:
+                added += self._import_batch(batch, sections)
+            self.loaded_version = self.version()
+        return added, skipped
+
+    def _import_batch(self, batch, sections):
+        with self.db:
+            # sqlite3 only begins a transaction implicitly at the first
+            # INSERT; the DROP TRIGGER below must be inside it to be undone
+            self.db.execute("BEGIN IMMEDIATE")
+            rows = []
+            first_id = self.next_id()
+            for name, text in batch:
+                section = sections.get(name)
+                if section is None:
+                    cursor = self.db.execute(
+                        "INSERT INTO sections (position, name) "
+                        "VALUES ((SELECT COALESCE(MAX(position) + 1, 0) FROM sections), ?)",
+                        (name,),
+                    )
+                    section = sections[name] = [cursor.lastrowid, 0]
+                rows.append((first_id + len(rows), section[0], section[1], text))
+                section[1] += 1
+            if self.has_fts:
+                # Index the batch in one statement instead of row by row from
+                # the trigger; a rollback restores it
+                self.db.execute("DROP TRIGGER snippets_ai")
+            self.db.executemany(
+                "INSERT INTO snippets (id, section_id, position, text) VALUES (?, ?, ?, ?)", rows
+            )
+            if self.has_fts:
+                self.db.execute(
+                    "INSERT INTO snippets_fts (rowid, text) SELECT id, text FROM snippets WHERE id >= ?",
+                    (first_id,),
+                )
+                self.db.execute(self.FTS_INSERT_TRIGGER)
+            self.set_next_id(first_id + len(rows))
+            self.db.execute(
+                "INSERT INTO meta (key, value) VALUES ('revision', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+            )
+        return len(rows)
+
+    def version(self):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return f"sqlite:{row[0]}" if row else None
+
+    def digest(self):
+        return None  # The revision only moves when the contents change
+
+    def fold_journal(self):
+        return None  # Saves go straight to the database
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return (section_idx, row_idx) keys by FTS rank, or None if unsupported."""
+        needle = " ".join(query.split())
+        # The trigram tokenizer cannot match fewer than three characters
+        if not self.has_fts or len(needle) < 3:
+            return None
+        phrase = '"' + needle.replace('"', '""') + '"'
+        with self.lock:
+            return self.db.execute(
+                """
+                SELECT sections.position, snippets.position
+                FROM snippets_fts
+                JOIN snippets ON snippets.id = snippets_fts.rowid
+                JOIN sections ON sections.id = snippets.section_id
+                WHERE snippets_fts MATCH ?
+                ORDER BY snippets_fts.rank
+                LIMIT ?
+                """,
+                (phrase, limit),
+            ).fetchall()
+
+
+_store = None
+
+
+def get_store():
+    """Return the storage backend; SQLite is used once its database exists."""
+    global _store
+    if _store is None:
+        backend = STORAGE_BACKEND or (
+            STORAGE_SQLITE if os.path.exists(STORAGE_DB_FILE) else STORAGE_JSON
+        )
+        if backend == STORAGE_SQLITE:
+            try:
+                _store = SqliteStore()
+            except sqlite3.Error as exc:
+                notify_user(f"Snippet database unavailable, using strings.json: {exc}")
+                _store = JsonStore()
+        else:
+            _store = JsonStore()
+    return _store
+
+
+def load_config():
+    """Load config from the storage backend."""
+    return get_store().load()
+
+
+def write_config(config):
+    """Save config to the storage backend and refresh the popup snapshot.
+
+    Returns the store version after the save.
+    """
+    store = get_store()
+    # After a merge with another save the pack is left to the next load
+    if store.save(config) and store.loaded_version == store.version():
+        SnippetPack.write(config, store.loaded_version, store.digest())
+    return store.loaded_version
+
+
+class ConfigWriter:
+    """Saves configs on a background thread, one at a time.
+
+    A save queued while another runs replaces any older queued config. The
+    thread is not a daemon, so the process only exits once the last save
+    has landed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None  # (config, [Future, ...])
+        self.thread = None
+
+    def save(self, config):
+        """Queue config and return a Future of the new store version.
+
+        The Future resolves to None if the save failed.
+        """
+        future = Future()
+        with self.lock:
+            futures = self.pending[1] if self.pending else []
+            futures.append(future)
+            self.pending = (config, futures)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="prompt-click-save")
+                self.thread.start()
+        return future
+
+    def run(self):
+        while True:
+            with self.lock:
+                if self.pending is None:
+                    self.thread = None
+                    return
+                config, futures = self.pending
+                self.pending = None
+            version = None
+            try:
+                version = write_config(config)
+            except Exception as exc:  # Report and keep serving later saves
+                notify_user(f"Could not save snippets: {exc}")
+            for future in futures:
+                future.set_result(version)
+
+    def join(self):
+        """Wait for the queued saves to land"""
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+
+
+_writer = ConfigWriter()
 
 
 def save_config(config):
-    """Save config to file."""
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, ensure_ascii=False, indent=2)
+    """Save config off the calling thread; see ConfigWriter.save."""
+    return _writer.save(config)
+
+
+def fold_config_journal():
+    """Fold the journal into the store once the last save has landed.
+
+    Run when the popup exits. The snippet pack already holds the folded
+    contents, so it is retagged with the new version rather than rebuilt.
+    """
+    _writer.join()
+    versions = get_store().fold_journal()
+    if versions is None:
+        return
+    pack = SnippetPack.open()
+    if pack is not None:
+        if pack.has_version(versions[0]):
+            pack.retag(versions[1])
+        pack.close()
+
+
+class InotifyWatcher:
+    """Calls settled() on the main loop once watched directories stop changing.
+
+    Subclasses watch directories with add_watch and pick the events they
+    care about in relevant(); bursts of events within
+    CONFIG_RELOAD_DEBOUNCE_MS are collapsed into one call. Raises OSError
+    if inotify is unavailable.
+    """
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_ISDIR = 0x40000000
+    EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.timeout_id = None
+        self.watch_id = GLib.io_add_watch(self.fd, GLib.PRIORITY_DEFAULT, GLib.IOCondition.IN, self.on_events)
+
+    def add_watch(self, path, mask):
+        """Watch a directory; return its watch descriptor."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def relevant(self, wd, mask, name):
+        raise NotImplementedError
+
+    def settled(self):
+        raise NotImplementedError
+
+    def on_events(self, fd, condition):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return True
+        relevant = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            relevant = self.relevant(wd, mask, name) or relevant
+        if relevant:
+            if self.timeout_id is not None:
+                GLib.source_remove(self.timeout_id)
+            self.timeout_id = GLib.timeout_add(CONFIG_RELOAD_DEBOUNCE_MS, self.on_settled)
+        return True
 
+    def on_settled(self):
+        self.timeout_id = None
+        self.settled()
+        return False
 
-def truncate(text, max_len):
-    """Build one-line preview and truncate to max_len with ellipsis."""
-    single_line = " ".join(
-        text.replace("\r\n", "\n").replace("\r", "\n").replace("\n", " ").split()
+    def close(self):
+        if self.timeout_id is not None:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+        GLib.source_remove(self.watch_id)
+        os.close(self.fd)
+
+
+class ConfigWatcher(InotifyWatcher):
+    """Calls back on the main loop once the config files stop changing.
+
+    Watches the config directory rather than the files, since saves
+    replace files by rename.
+    """
+
+    def __init__(self, callback, path=CONFIG_FILE, db_path=STORAGE_DB_FILE):
+        super().__init__()
+        self.callback = callback
+        self.names = {
+            os.path.basename(path),
+            os.path.basename(path) + ".journal",
+            os.path.basename(db_path),
+            os.path.basename(db_path) + "-wal",
+        }
+        try:
+            self.add_watch(
+                os.path.dirname(path), self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_DELETE
+            )
+        except OSError:
+            self.close()
+            raise
+
+    def relevant(self, wd, mask, name):
+        return name in self.names
+
+    def settled(self):
+        self.callback()
+
+
+class DirectoryWatcher(InotifyWatcher):
+    """Calls back with the directory sections whose files changed.
+
+    Each folder of a section's tree is watched on its own, as inotify is
+    not recursive; watch() is called again after every refresh to cover
+    new folders.
+    """
+
+    MASK = (
+        InotifyWatcher.IN_CLOSE_WRITE | InotifyWatcher.IN_MOVED_FROM | InotifyWatcher.IN_MOVED_TO
+        | InotifyWatcher.IN_CREATE | InotifyWatcher.IN_DELETE
     )
-    if len(single_line) <= max_len:
-        return single_line
-    return single_line[:max_len] + "..."
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+        self.sections = {}  # {wd: DirectorySection}
+        self.changed = set()
+
+    def watch(self, directory):
+        for path in directory.folders:
+            try:
+                self.sections[self.add_watch(path, self.MASK)] = directory
+            except OSError:
+                pass  # Out of watches or gone: picked up on the next open
+
+    def relevant(self, wd, mask, name):
+        directory = self.sections.get(wd)
+        if directory is None:
+            return False
+        if not (mask & self.IN_ISDIR or is_snippet_file_name(name)):
+            return False
+        self.changed.add(directory)
+        return True
+
+    def settled(self):
+        changed, self.changed = self.changed, set()
+        self.callback(changed)
+
+
+def snippet_file_format(path):
+    """Bulk format for path: a folder tree, JSON Lines or CSV."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    if os.path.isdir(path) or not extension:
+        return "tree"
+    raise ValueError(f"{path}: use a folder, a .jsonl file or a .csv file")
+
+
+def read_snippet_tree(path, default_section):
+    """Yield (section, text) for the text files under path.
+
+    Top-level folders name the sections; files directly in path go to
+    default_section. Hidden folders such as .git are skipped.
+    """
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+        relative = os.path.relpath(root, path)
+        section = default_section if relative == "." else relative.split(os.sep)[0]
+        for name in sorted(files):
+            if not is_snippet_file_name(name):
+                continue
+            file_path = os.path.join(root, name)
+            try:
+                text = read_snippet_file(file_path)
+            except UnicodeDecodeError:
+                print(f"Skipping {file_path}: not UTF-8 text", file=sys.stderr)
+                continue
+            if text.strip():
+                yield section, text
+
+
+def is_snippet_file_name(name):
+    return name.lower().endswith(IMPORT_FILE_EXTENSIONS)
+
+
+def read_snippet_file(path):
+    """Text of one snippet file, without its final newline."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return text[:-1] if text.endswith("\n") else text
+
+
+def read_snippet_lines(path, default_section):
+    """Yield (section, text) from JSON Lines of {"section", "text"} objects or strings."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if isinstance(item, str):
+                    section, text = default_section, item
+                else:
+                    section, text = item.get("section") or default_section, item["text"]
+            except (ValueError, AttributeError, KeyError) as exc:
+                raise ValueError(f"{path}:{line_number}: expected a string or an object with \"text\" ({exc})")
+            if text:
+                yield section, text
+
+
+def read_snippet_csv(path, default_section):
+    """Yield (section, text) from a CSV file with a "text" and optional "section" column."""
+    csv.field_size_limit(2 ** 31 - 1)  # Snippets can be far longer than the default limit
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        if "text" not in (reader.fieldnames or ()):
+            raise ValueError(f"{path}: needs a \"text\" column")
+        for row in reader:
+            if row["text"]:
+                yield row.get("section") or default_section, row["text"]
+
+
+def write_snippet_tree(path, rows):
+    """Write each snippet to <path>/<section>/<number>.txt."""
+    if os.path.isdir(path) and os.listdir(path):
+        raise ValueError(f"{path}: export folder must be empty")
+    counts = {}
+    for section, text in rows:
+        folder = re.sub(r"[/\\\0]", "_", section).strip(". ") or "Section"
+        counts[folder] = counts.get(folder, 0) + 1
+        os.makedirs(os.path.join(path, folder), exist_ok=True)
+        with open(os.path.join(path, folder, f"{counts[folder]:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return sum(counts.values())
+
+
+def write_snippet_lines(path, rows):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for section, text in rows:
+            f.write(json.dumps({"section": section, "text": text}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_snippet_csv(path, rows):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["section", "text"])
+        for section, text in rows:
+            writer.writerow([section, text])
+            count += 1
+    return count
+
+
+SNIPPET_READERS = {"tree": read_snippet_tree, "jsonl": read_snippet_lines, "csv": read_snippet_csv}
+SNIPPET_WRITERS = {"tree": write_snippet_tree, "jsonl": write_snippet_lines, "csv": write_snippet_csv}
+
+
+def import_snippets(path, default_section=IMPORT_DEFAULT_SECTION):
+    """Stream snippets from path into the store; returns (added, skipped)."""
+    rows = SNIPPET_READERS[snippet_file_format(path)](path, default_section)
+    return get_store().import_snippets(rows)
+
+
+def export_snippets(path):
+    """Stream every snippet from the store to path; returns the count."""
+    return SNIPPET_WRITERS[snippet_file_format(path)](path, get_store().iter_snippets())
+
+
+def truncate(text, max_len):
+    """Build one-line preview and truncate to max_len with ellipsis.
+
+    Only a prefix of text is normalized, doubled until it yields more than
+    max_len characters, so huge snippets cost about as much as short ones.
+    """
+    end = max_len + 1
+    while True:
+        single_line = " ".join(text[:end].split())
+        if len(single_line) > max_len:
+            return single_line[:max_len] + "..."
+        if end >= len(text):
+            return single_line
+        end *= 2
+
+
+class PreviewCache:
+    """One-line previews of every snippet, persisted per config version.
+
+    Keyed by the config file identity and truncate length like the search
+    index, so a warm start fills whole sections without reading any
+    snippet bodies.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, version, truncate_len, sections=None):
+        self.version = version
+        self.truncate_len = truncate_len
+        self.sections = sections or {}  # {section_idx: [preview, ...]}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, version, truncate_len, path=PREVIEW_CACHE_FILE):
+        if version is not None:
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                if (
+                    isinstance(state, dict)
+                    and state.get("format") == cls.FORMAT
+                    and state.get("version") == version
+                    and state.get("truncate_length") == truncate_len
+                ):
+                    return cls(version, truncate_len, state["sections"])
+            except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+                pass
+        return cls(version, truncate_len)
+
+    def section(self, section_idx, strings):
+        """Return the previews of one section, computing them on a miss."""
+        previews = self.sections.get(section_idx)
+        if previews is None or len(previews) != len(strings):
+            previews = [truncate(text, self.truncate_len) for text in strings]
+            self.sections[section_idx] = previews
+            self.dirty = True
+        return previews
+
+    def save(self, path=PREVIEW_CACHE_FILE):
+        if not self.dirty or self.version is None:
+            return
+        state = {
+            "format": self.FORMAT,
+            "version": self.version,
+            "truncate_length": self.truncate_len,
+            "sections": self.sections,
+        }
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self.dirty = False
+
+
+class SnippetPack:
+    """Memory-mapped snapshot of the migrated config for the popup.
+
+    Layout: a header (hash of the store version and content digest), JSON metadata
+    (settings, section names and sizes, tags), a fixed-width record per
+    snippet with its id, then each snippet's preview followed by its body. The popup renders
+    previews straight from the map and decodes a body only when that
+    snippet is used.
+    """
+
+    MAGIC = b"PCPK"
+    FORMAT = 4
+    HEADER = struct.Struct("<4sII16s16s")  # magic, format, metadata length, version key, digest
+    VERSION_OFFSET = 12
+    RECORD = struct.Struct("<QHII")  # offset, preview length, body length, snippet id
+
+    def __init__(self, data, version_key, digest, meta, records_start, inode):
+        self.data = data
+        self.version_key = version_key
+        self.digest = digest
+        self.meta = meta
+        self.records_start = records_start
+        self.inode = inode
+
+    @classmethod
+    def write(cls, config, version, digest=None, path=SNIPPET_PACK_FILE):
+        """Write config to path atomically, streaming one snippet at a time."""
+        if version is None:
+            return False
+        truncate_len = config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+        meta = json.dumps({
+            "settings": config["settings"],
+            "sections": [
+                {"name": section["name"], "count": len(section["strings"])}
+                for section in config["sections"]
+            ],
+            "next_id": config["next_id"],
+            "snippets": config["snippets"],
+        }).encode("utf-8")
+        total = sum(len(section["strings"]) for section in config["sections"])
+        records_start = cls.HEADER.size + len(meta)
+        offset = records_start + total * cls.RECORD.size
+        records = bytearray()
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(cls.HEADER.pack(
+                    cls.MAGIC, cls.FORMAT, len(meta), cls.version_key_of(version), digest or b""
+                ))
+                f.write(meta)
+                f.seek(offset)
+                for section in config["sections"]:
+                    for text, snippet_id in zip(section["strings"], section["ids"]):
+                        preview = truncate(text, truncate_len).encode("utf-8")
+                        body = text.encode("utf-8")
+                        records += cls.RECORD.pack(offset, len(preview), len(body), snippet_id)
+                        f.write(preview)
+                        f.write(body)
+                        offset += len(preview) + len(body)
+                f.seek(records_start)
+                f.write(records)
+            os.replace(tmp_path, path)
+        except (OSError, struct.error):
+            return False
+        return True
+
+    @classmethod
+    def open(cls, path=SNIPPET_PACK_FILE):
+        """Map the pack at path, or return None if it is missing or unreadable."""
+        try:
+            with open(path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, pack_format, meta_len, version_key, digest = cls.HEADER.unpack_from(data, 0)
+            if magic == cls.MAGIC and pack_format == cls.FORMAT:
+                records_start = cls.HEADER.size + meta_len
+                meta = json.loads(data[cls.HEADER.size:records_start])
+                return cls(data, version_key, digest if any(digest) else None, meta, records_start, inode)
+            data.close()
+        except (OSError, ValueError, struct.error):
+            pass
+        return None
+
+    def close(self):
+        self.data.close()
+
+    @staticmethod
+    def version_key_of(version):
+        """Fixed-size key of a store version string, which has no length bound."""
+        return hashlib.blake2b(version.encode("utf-8"), digest_size=16).digest()
+
+    def has_version(self, version):
+        return self.version_key == self.version_key_of(version)
+
+    def retag(self, version, path=SNIPPET_PACK_FILE):
+        """Record a new store version for unchanged contents in place."""
+        version_key = self.version_key_of(version)
+        try:
+            with open(path, "r+b") as f:
+                if os.fstat(f.fileno()).st_ino != self.inode:
+                    return  # Replaced since it was mapped
+                f.seek(self.VERSION_OFFSET)
+                f.write(version_key)
+        except OSError:
+            return
+        self.version_key = version_key
+
+    def record(self, doc_id):
+        return self.RECORD.unpack_from(self.data, self.records_start + doc_id * self.RECORD.size)
+
+    def config(self):
+        """Config whose section strings and ids read from the map."""
+        sections = []
+        first = 0
+        for section in self.meta["sections"]:
+            sections.append({
+                "name": section["name"],
+                "strings": PackedStrings(self, first, section["count"]),
+                "ids": PackedIds(self, first, section["count"]),
+            })
+            first += section["count"]
+        return {
+            "settings": self.meta["settings"],
+            "sections": sections,
+            "next_id": self.meta["next_id"],
+            "snippets": self.meta["snippets"],
+            "schema": CONFIG_SCHEMA_VERSION,
+        }
+
+
+class PackedRows(Sequence):
+    """Read-only view of the records of one pack section."""
+
+    def __init__(self, pack, first, count):
+        self.pack = pack
+        self.first = first
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def record(self, row_idx):
+        if row_idx < 0:
+            row_idx += self.count
+        if not 0 <= row_idx < self.count:
+            raise IndexError(row_idx)
+        return self.pack.record(self.first + row_idx)
+
+    def records(self):
+        size = self.pack.RECORD.size
+        start = self.pack.records_start + self.first * size
+        return self.pack.RECORD.iter_unpack(self.pack.data[start:start + self.count * size])
+
+
+class PackedStrings(PackedRows):
+    """Read-only strings of one pack section, decoded on access."""
+
+    def __getitem__(self, row_idx):
+        if isinstance(row_idx, slice):
+            return [self[i] for i in range(*row_idx.indices(self.count))]
+        offset, preview_len, body_len, _snippet_id = self.record(row_idx)
+        start = offset + preview_len
+        return self.pack.data[start:start + body_len].decode("utf-8")
+
+    def preview(self, row_idx):
+        offset, preview_len, _body_len, _snippet_id = self.record(row_idx)
+        return self.pack.data[offset:offset + preview_len].decode("utf-8")
+
+    def layout(self):
+        """Preview and body lengths of every row."""
+        return [record[1:3] for record in self.records()]
+
+    def content(self):
+        """Raw previews and bodies of the whole section."""
+        if not self.count:
+            return b""
+        start = self.record(0)[0]
+        offset, preview_len, body_len, _snippet_id = self.record(self.count - 1)
+        return self.pack.data[start:offset + preview_len + body_len]
+
+
+class PackedIds(PackedRows):
+    """Read-only snippet ids of one pack section."""
+
+    def __getitem__(self, row_idx):
+        if isinstance(row_idx, slice):
+            return [self[i] for i in range(*row_idx.indices(self.count))]
+        return self.record(row_idx)[3]
+
+    def __iter__(self):
+        return (record[3] for record in self.records())
+
+
+def strings_equal(a, b):
+    """Compare two sections' strings, without decoding pack bodies if possible."""
+    if isinstance(a, PackedStrings) and isinstance(b, PackedStrings):
+        return a.count == b.count and a.layout() == b.layout() and a.content() == b.content()
+    return len(a) == len(b) and list(a) == list(b)
+
+
+def load_packed_config():
+    """Load the config for the popup from the snippet pack, refreshing it if stale.
+
+    A pack whose store version is outdated is still used when the store
+    contents hash the same, e.g. after an unchanged save or a checkout.
+    """
+    store = get_store()
+    version = store.version()
+    if version is None:
+        return load_config()
+    pack = SnippetPack.open()
+    store.loaded_version = version
+    digest = None
+    if pack is not None and not pack.has_version(version):
+        digest = store.digest()
+        if digest is not None and digest == pack.digest:
+            pack.retag(version)
+        else:
+            pack.close()
+            pack = None
+    if pack is None:
+        config = load_config()
+        if not SnippetPack.write(config, version, digest or store.digest()):
+            return config
+        pack = SnippetPack.open()
+        if pack is None:
+            return config
+    config = pack.config()
+    store.loaded_config = config
+    return config
+
+
+class SelectionModel:
+    """Ordered set of selected snippets shared by the pickers.
+
+    Entries are keyed by (section_idx, row_idx) and keep their text, so the
+    count is O(1), output follows the order the user picked snippets in,
+    and the selection can be re-resolved after the config is edited.
+    """
+
+    def __init__(self):
+        self.entries = {}  # {(section_idx, row_idx): text}, in selection order
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, key, text):
+        self.entries.setdefault(key, text)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def toggle(self, key, text):
+        """Flip one snippet; return True if it is now selected."""
+        if key in self.entries:
+            del self.entries[key]
+            return False
+        self.entries[key] = text
+        return True
+
+    def texts(self):
+        return list(self.entries.values())
+
+    def remap(self, old_config, new_config):
+        """Re-resolve the selection against an edited config.
+
+        Each snippet is looked up by its id, which follows it through moves
+        and edits, then by text, preferring a section with the same name;
+        snippets that no longer exist are dropped.
+        """
+        by_id = {
+            old_config["sections"][section_idx]["ids"][row_idx]: (section_idx, row_idx)
+            for section_idx, row_idx in self.entries
+        }
+        found = {}  # {old key: new key}
+        for section_idx, section in enumerate(new_config["sections"]):
+            for row_idx, snippet_id in enumerate(section["ids"]):
+                if snippet_id in by_id:
+                    found[by_id[snippet_id]] = (section_idx, row_idx)
+
+        wanted = {text for key, text in self.entries.items() if key not in found}
+        candidates = {}  # {text: [(section_idx, row_idx), ...]}
+        if wanted:
+            for section_idx, section in enumerate(new_config["sections"]):
+                if is_directory_section(section):
+                    continue  # Its files are matched by path
+                for row_idx, text in enumerate(section["strings"]):
+                    if text in wanted:
+                        candidates.setdefault(text, []).append((section_idx, row_idx))
+
+        entries = {}
+        for (section_idx, row_idx), text in self.entries.items():
+            key = found.get((section_idx, row_idx))
+            if key is not None:
+                entries[key] = new_config["sections"][key[0]]["strings"][key[1]]
+                continue
+            positions = candidates.get(text)
+            if not positions:
+                continue
+            old_name = old_config["sections"][section_idx]["name"]
+            chosen = next(
+                (pos for pos in positions if new_config["sections"][pos[0]]["name"] == old_name),
+                positions[0],
+            )
+            positions.remove(chosen)
+            entries[chosen] = text
+        self.entries = entries
+
+
+class EditorModel:
+    """Change-tracked copy of a config that the editors modify in place.
+
+    Sections share their string and id lists with the source config until
+    their first edit copies them, so opening an editor copies no snippets.
+    Edits are small operations on one or two sections, and to_config()
+    passes untouched lists through as they are. Snippets keep their id
+    when they are edited or moved; new ones take the next free id.
+    """
+
+    def __init__(self, config):
+        self.settings = dict(config["settings"])
+        self.next_id = config["next_id"]
+        self.snippets = config["snippets"]  # Copied on the first tag edit
+        self.snippets_owned = False
+        # origin: index in the source config, None for new sections.
+        # owned: strings were copied on write and may differ from the source.
+        self.sections = [
+            {
+                "name": section["name"],
+                "strings": section["strings"],
+                "ids": section["ids"],
+                "origin": idx,
+                "owned": False,
+            }
+            for idx, section in enumerate(config["sections"])
+        ]
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.sections)
+
+    def name(self, idx):
+        return self.sections[idx]["name"]
+
+    def strings(self, idx):
+        """Strings of a section; read-only, edit through the model."""
+        return self.sections[idx]["strings"]
+
+    def ids(self, idx):
+        """Snippet ids of a section, parallel to its strings; read-only."""
+        return self.sections[idx]["ids"]
+
+    def origin(self, idx):
+        """Source index of a section whose strings are untouched, else None."""
+        section = self.sections[idx]
+        return None if section["owned"] else section["origin"]
+
+    def _writable(self, idx):
+        section = self.sections[idx]
+        if not section["owned"]:
+            section["strings"] = list(section["strings"])
+            section["ids"] = list(section["ids"])
+            section["owned"] = True
+        self.dirty = True
+        return section
+
+    def add_section(self, name):
+        self.sections.append({"name": name, "strings": [], "ids": [], "origin": None, "owned": True})
+        self.dirty = True
+        return len(self.sections) - 1
+
+    def rename_section(self, idx, name):
+        self.sections[idx]["name"] = name
+        self.dirty = True
+
+    def remove_section(self, idx):
+        del self.sections[idx]
+        self.dirty = True
+
+    def move_section(self, from_idx, to_idx):
+        self.sections.insert(to_idx, self.sections.pop(from_idx))
+        self.dirty = True
+
+    def insert_strings(self, idx, row_idx, texts, ids=None):
+        """Insert rows, as new snippets unless their ids are given; return the ids."""
+        if ids is None:
+            ids = list(range(self.next_id, self.next_id + len(texts)))
+            self.next_id += len(texts)
+        section = self._writable(idx)
+        section["strings"][row_idx:row_idx] = texts
+        section["ids"][row_idx:row_idx] = ids
+        return ids
+
+    def replace_string(self, idx, row_idx, text):
+        self._writable(idx)["strings"][row_idx] = text
+
+    def set_strings(self, idx, texts, ids):
+        section = self._writable(idx)
+        section["strings"][:] = texts
+        section["ids"][:] = ids
+
+    def _take(self, idx, row_indexes):
+        section = self._writable(idx)
+        drop = set(row_indexes)
+        taken = [(section["strings"][row_idx], section["ids"][row_idx]) for row_idx in sorted(drop)]
+        for key in ("strings", "ids"):
+            section[key][:] = [value for row_idx, value in enumerate(section[key]) if row_idx not in drop]
+        return [text for text, _snippet_id in taken], [snippet_id for _text, snippet_id in taken]
+
+    def remove_strings(self, idx, row_indexes):
+        """Remove rows from a section and return their texts in order."""
+        return self._take(idx, row_indexes)[0]
+
+    def move_strings(self, idx, row_indexes, to_row):
+        """Move rows as one block so the first lands at to_row."""
+        texts, ids = self._take(idx, row_indexes)
+        self.insert_strings(idx, to_row, texts, ids)
+
+    def move_strings_to_section(self, idx, row_indexes, target_idx):
+        """Append rows to another section and return their texts."""
+        texts, ids = self._take(idx, row_indexes)
+        self.insert_strings(target_idx, len(self.sections[target_idx]["strings"]), texts, ids)
+        return texts
+
+    def tags(self, snippet_id):
+        return list(self.snippets.get(str(snippet_id), {}).get("tags", []))
+
+    def set_tags(self, snippet_id, tags):
+        if tags == self.tags(snippet_id):
+            return
+        if not self.snippets_owned:
+            self.snippets = dict(self.snippets)
+            self.snippets_owned = True
+        key = str(snippet_id)
+        info = {k: v for k, v in self.snippets.get(key, {}).items() if k != "tags"}
+        if tags:
+            info["tags"] = list(tags)
+        if info:
+            self.snippets[key] = info
+        else:
+            self.snippets.pop(key, None)
+        self.dirty = True
+
+    def to_config(self):
+        # Unchanged sections may still be read-only pack strings and ids
+        sections = [
+            {"name": section["name"], "strings": list(section["strings"]), "ids": list(section["ids"])}
+            for section in self.sections
+        ]
+        snippets = self.snippets
+        if snippets:
+            live = {snippet_id for section in sections for snippet_id in section["ids"]}
+            snippets = {key: info for key, info in snippets.items() if int(key) in live}
+        return {
+            "settings": dict(self.settings),
+            "sections": sections,
+            "next_id": self.next_id,
+            "snippets": dict(snippets),
+            "schema": CONFIG_SCHEMA_VERSION,
+        }
+
+
+def config_version(path):
+    """Cheap identity of the config file contents, or None if missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def search_head(text):
+    """Normalized prefix of a snippet that search looks at."""
+    return " ".join(text[:SEARCH_INDEX_CHARS].lower().split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Trigram index over all snippets for type-to-filter search.
+
+    Built once per config version and pickled to the cache directory, so
+    later launches only load it. Only the first SEARCH_INDEX_CHARS of each
+    snippet are indexed, which bounds build time and memory.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, config, version=None):
+        self.version = version
+        self.keys = []  # doc id -> (section_idx, row_idx)
+        self.texts = []  # doc id -> search_head(text)
+        self.postings = {}  # trigram -> array of doc ids, ascending
+        for section_idx, section in enumerate(config["sections"]):
+            for row_idx, text in enumerate(section["strings"]):
+                doc_id = len(self.keys)
+                head = search_head(text)
+                self.keys.append((section_idx, row_idx))
+                self.texts.append(head)
+                for gram in trigrams(head):
+                    posting = self.postings.get(gram)
+                    if posting is None:
+                        posting = self.postings[gram] = array("I")
+                    posting.append(doc_id)
+
+    @classmethod
+    def load_or_build(cls, config, version, path=SEARCH_INDEX_FILE):
+        """Return the cached index for version, rebuilding it if stale."""
+        if version is not None:
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                if (
+                    isinstance(state, dict)
+                    and state.get("format") == cls.FORMAT
+                    and state.get("version") == version
+                ):
+                    index = cls.__new__(cls)
+                    index.version = version
+                    index.keys = state["keys"]
+                    index.texts = state["texts"]
+                    index.postings = state["postings"]
+                    return index
+            except Exception:
+                pass  # Unreadable or from an older build; rebuild it
+
+        index = cls(config, version)
+        if version is not None:
+            index.save(path)
+        return index
+
+    def save(self, path=SEARCH_INDEX_FILE):
+        state = {
+            "format": self.FORMAT,
+            "version": self.version,
+            "keys": self.keys,
+            "texts": self.texts,
+            "postings": self.postings,
+        }
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return up to limit (section_idx, row_idx) keys, best match first.
+
+        Exact substring matches rank first, earlier matches higher. For
+        queries of three or more trigrams, a doc sharing at least two thirds
+        of them also matches, which tolerates a typo.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+
+        if len(query) < 3:
+            # Too short for trigrams: take the first matches in library
+            # order instead of scanning everything.
+            hits = itertools.islice(
+                (doc_id for doc_id, text in enumerate(self.texts) if query in text),
+                limit,
+            )
+            ranked = sorted((self.texts[doc_id].find(query), doc_id) for doc_id in hits)
+            return [self.keys[doc_id] for _pos, doc_id in ranked]
+
+        grams = trigrams(query)
+        postings = sorted(
+            (posting for posting in (self.postings.get(gram) for gram in grams) if posting),
+            key=len,
+        )
+        # Any doc containing the query contains its rarest trigram; the
+        # second rarest also catches a typo inside the rarest one.
+        candidates = set()
+        for posting in postings[:2]:
+            candidates.update(posting)
+
+        ranked = []
+        for doc_id in candidates:
+            text = self.texts[doc_id]
+            pos = text.find(query)
+            if pos >= 0:
+                ranked.append(((0, pos), doc_id))
+                continue
+            if len(grams) < 3:
+                continue
+            matched = sum(1 for gram in grams if gram in text)
+            if matched * 3 >= len(grams) * 2:
+                ranked.append(((1, len(grams) - matched), doc_id))
+        return [self.keys[doc_id] for _score, doc_id in heapq.nsmallest(limit, ranked)]
+
+
+def split_tag_query(query):
+    """Split a search query into its #tags, lowercased, and the other words."""
+    tags = []
+    words = []
+    for word in query.split():
+        if word.startswith(TAG_PREFIX) and len(word) > len(TAG_PREFIX):
+            tags.append(word[len(TAG_PREFIX):].lower())
+        else:
+            words.append(word)
+    return tags, " ".join(words)
+
+
+def parse_tags(text):
+    """Tags from comma- or space-separated text, with any leading # dropped."""
+    tags = []
+    for word in text.replace(",", " ").split():
+        tag = word.lstrip(TAG_PREFIX)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def bitmap_ids(bits):
+    """Yield the positions of the set bits of an int bitmap, ascending."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_idx, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_idx * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+class TagIndex:
+    """Bitmap index from tags to snippet ids.
+
+    Each tag maps to an int whose set bits are the ids of its snippets, so
+    filtering on several tags is one AND per tag. Ids do not change when
+    snippets move, and positions are only resolved for the ids that
+    remain after the AND.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.tagged = set()
+        self.locations = None  # {snippet_id: (section_idx, row_idx)} of tagged snippets
+        bitmaps = {}  # {tag: bytearray}
+        for key, info in config["snippets"].items():
+            snippet_id = int(key)
+            for tag in info.get("tags", ()):
+                bitmap = bitmaps.setdefault(tag.lower(), bytearray())
+                byte_idx = snippet_id >> 3
+                if len(bitmap) <= byte_idx:
+                    bitmap.extend(bytes(byte_idx + 1 - len(bitmap)))
+                bitmap[byte_idx] |= 1 << (snippet_id & 7)
+                self.tagged.add(snippet_id)
+        self.bitmaps = {tag: int.from_bytes(bitmap, "little") for tag, bitmap in bitmaps.items()}
+
+    def match(self, tags):
+        """Bitmap of the snippets that carry all of tags."""
+        if not tags:
+            return 0
+        bits = -1
+        for tag in tags:
+            bits &= self.bitmaps.get(tag.lower(), 0)
+        return bits
+
+    def keys(self, tags):
+        """(section_idx, row_idx) of the snippets carrying all of tags, in library order."""
+        bits = self.match(tags)
+        if not bits:
+            return []
+        if self.locations is None:
+            self.locations = {
+                snippet_id: (section_idx, row_idx)
+                for section_idx, section in enumerate(self.config["sections"])
+                for row_idx, snippet_id in enumerate(section["ids"])
+                if snippet_id in self.tagged
+            }
+        return sorted(
+            self.locations[snippet_id] for snippet_id in bitmap_ids(bits) if snippet_id in self.locations
+        )
+
+
+class DirectoryStrings(Sequence):
+    """Read-only strings of a directory section, read from their files on access."""
+
+    def __init__(self, path, entries):
+        self.path = path
+        self.entries = entries  # ((relative path, mtime_ns, size, preview, search head), ...)
+        self.rows = None  # {relative path: row_idx}, built on first find()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, row_idx):
+        if isinstance(row_idx, slice):
+            return [self[i] for i in range(*row_idx.indices(len(self)))]
+        try:
+            return read_snippet_file(os.path.join(self.path, self.entries[row_idx][0]))
+        except (OSError, UnicodeDecodeError):
+            return ""  # Removed or rewritten since it was indexed
+
+    def preview(self, row_idx):
+        return self.entries[row_idx][3]
+
+    def relative_path(self, row_idx):
+        return self.entries[row_idx][0]
+
+    def find(self, relative_path):
+        """Row of the file at relative_path, or None if it is not listed"""
+        if self.rows is None:
+            self.rows = {entry[0]: row_idx for row_idx, entry in enumerate(self.entries)}
+        return self.rows.get(relative_path)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Rows whose search head contains query, earlier matches first."""
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+        ranked = (
+            (entry[4].find(query), row_idx)
+            for row_idx, entry in enumerate(self.entries)
+        )
+        return [row_idx for _pos, row_idx in heapq.nsmallest(limit, (hit for hit in ranked if hit[0] >= 0))]
+
+
+class DirectoryIds(Sequence):
+    """Ids of a directory section: the absolute paths of its files."""
+
+    def __init__(self, path, entries):
+        self.path = path
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, row_idx):
+        if isinstance(row_idx, slice):
+            return [self[i] for i in range(*row_idx.indices(len(self)))]
+        return os.path.join(self.path, self.entries[row_idx][0])
+
+
+class DirectorySection:
+    """A live section listing the snippet files under a directory.
+
+    The file list with each file's mtime, size, preview and search head is
+    pickled per directory, so opening the picker costs one cache load
+    however many files there are. refresh() re-stats the tree and reads
+    only new and changed files; a snippet's full text is read from its
+    file when it is selected. Both refresh() and load() are meant to run
+    off the UI thread, and only ever swap in a new entries tuple.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, name, path, truncate_len, cache_dir=DIRECTORY_INDEX_DIR):
+        self.name = name
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.truncate_len = truncate_len
+        key = hashlib.blake2b(os.fsencode(self.path), digest_size=8).hexdigest()
+        self.cache_path = os.path.join(cache_dir, f"{key}.pickle")
+        self.entries = ()
+        self.loaded = False
+        self.folders = []  # Folders of the tree as of the last refresh
+        self.refreshing = False
+        self.stale = False  # Changed again while refreshing
+
+    def section(self):
+        return {
+            "name": self.name,
+            "strings": DirectoryStrings(self.path, self.entries),
+            "ids": DirectoryIds(self.path, self.entries),
+            "directory": self.path,
+        }
+
+    def load(self):
+        """Take the entries from the cache, if it was written for this directory."""
+        self.loaded = True
+        try:
+            with open(self.cache_path, "rb") as f:
+                state = pickle.load(f)
+            if (
+                isinstance(state, dict)
+                and state.get("format") == self.FORMAT
+                and state.get("path") == self.path
+                and state.get("truncate_length") == self.truncate_len
+            ):
+                self.entries = state["entries"]
+        except Exception:
+            pass  # Unreadable or from an older build; the refresh rescans
+
+    def save(self):
+        state = {
+            "format": self.FORMAT,
+            "path": self.path,
+            "truncate_length": self.truncate_len,
+            "entries": self.entries,
+        }
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def scan(self):
+        """Yield (relative path, mtime_ns, size) of the snippet files, in tree order."""
+        folders = []
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+            folders.append(root)
+            for name in sorted(files):
+                if not is_snippet_file_name(name):
+                    continue
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                yield os.path.relpath(file_path, self.path), stat.st_mtime_ns, stat.st_size
+        self.folders = folders
+
+    def refresh(self):
+        """Bring the entries up to date with the tree; return True if they changed."""
+        known = {entry[0]: entry for entry in self.entries}
+        entries = []
+        for relative, mtime_ns, size in self.scan():
+            entry = known.get(relative)
+            if entry is None or entry[1:3] != (mtime_ns, size):
+                try:
+                    text = read_snippet_file(os.path.join(self.path, relative))
+                except (OSError, UnicodeDecodeError):
+                    continue
+                if not text.strip():
+                    continue
+                entry = (relative, mtime_ns, size, truncate(text, self.truncate_len), search_head(text))
+            entries.append(entry)
+        entries = tuple(entries)
+        if entries == self.entries:
+            return False
+        self.entries = entries
+        self.save()
+        return True
+
+
+def directory_sections(settings, truncate_len):
+    """DirectorySection objects for the "directory_sections" setting."""
+    sections = []
+    for spec in settings.get("directory_sections", []):
+        if isinstance(spec, dict) and spec.get("path"):
+            name = spec.get("name") or os.path.basename(os.path.normpath(spec["path"]))
+            sections.append(DirectorySection(name, spec["path"], truncate_len))
+    return sections
+
+
+def is_directory_section(section):
+    return "directory" in section
+
+
+def with_directory_sections(config, directories):
+    """The config with the directory sections appended after the stored ones."""
+    return {**config, "sections": config["sections"] + [directory.section() for directory in directories]}
+
+
+def snippet_key(text):
+    """Short content hash identifying a snippet independent of its position."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class UsageLog:
+    """Append-only record of pasted snippets with frecency scores.
+
+    Every paste appends one JSON line per snippet. Once the log grows past
+    USAGE_COMPACT_LINES it is rewritten with one line per snippet holding
+    its score decayed to a reference time. A snippet's score is the sum of
+    0.5 ** (age / FRECENCY_HALF_LIFE_SECONDS) over its uses, so it blends
+    how often and how recently it was used. Lines also keep the section
+    name and row a snippet was last seen at, so resolving the top entries
+    does not need to hash the whole library. Snippets of directory
+    sections are kept by their file's relative path instead; they are
+    resolved once the folder has loaded and never searched for. When it does, the new
+    positions are appended, and so are the snippets that were not found
+    (edited or deleted) along with the store version they were missing
+    from; those are only looked for again once the store changes. Nothing
+    is dropped on a miss, so a broken or half-edited config cannot erase
+    the history.
+    """
+
+    def __init__(self, path=USAGE_LOG_FILE):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.read()
+
+    def read(self):
+        self.scores = {}  # {key: (score, reference_time)}
+        self.hints = {}  # {key: (section_name, row_idx)}
+        self.misses = {}  # {key: store version it was last not found in}
+        self.lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        key = entry["k"]
+                        if "t" in entry:  # Lines without a time only update the hint
+                            self._add(key, float(entry.get("s", 1.0)), float(entry["t"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if "n" in entry and "r" in entry:
+                        self.hints[key] = (entry["n"], entry["r"])
+                        self.misses.pop(key, None)
+                    if "x" in entry:
+                        self.misses[key] = entry["x"]
+                    self.lines += 1
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def locked(self, operation):
+        """Appends take a shared lock and compaction an exclusive one."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    @staticmethod
+    def _decay(seconds):
+        return 0.5 ** (seconds / FRECENCY_HALF_LIFE_SECONDS)
+
+    def _add(self, key, score, when):
+        current = self.scores.get(key)
+        if current is None:
+            self.scores[key] = (score, when)
+            return
+        old_score, old_when = current
+        if when >= old_when:
+            self.scores[key] = (old_score * self._decay(when - old_when) + score, when)
+        else:
+            self.scores[key] = (old_score + score * self._decay(old_when - when), old_when)
+
+    def score(self, key, now=None):
+        current = self.scores.get(key)
+        if current is None:
+            return 0.0
+        score, when = current
+        return score * self._decay((now or time.time()) - when)
+
+    def append(self, entries):
+        try:
+            with self.locked(fcntl.LOCK_SH), open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        except OSError:
+            return False
+        self.lines += len(entries)
+        return True
+
+    def record(self, entries):
+        """Log uses of (section, row_idx, text) entries."""
+        now = time.time()
+        lines = []
+        for section, row_idx, text in entries:
+            key = snippet_key(text)
+            if is_directory_section(section):
+                row_idx = section["strings"].relative_path(row_idx)
+            self._add(key, 1.0, now)
+            self.hints[key] = (section["name"], row_idx)
+            self.misses.pop(key, None)
+            lines.append({"t": now, "k": key, "n": section["name"], "r": row_idx})
+        if self.append(lines) and self.lines > USAGE_COMPACT_LINES:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the log as one decayed score per snippet.
+
+        The log is read again under the exclusive lock first, so uses that
+        other pickers appended since this one loaded it are kept.
+        """
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with self.locked(fcntl.LOCK_EX):
+                self.read()
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for key, (score, when) in self.scores.items():
+                        entry = {"t": when, "k": key, "s": score}
+                        if key in self.hints:
+                            entry["n"], entry["r"] = self.hints[key]
+                        if key in self.misses:
+                            entry["x"] = self.misses[key]
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.path)
+        except OSError:
+            return
+        self.lines = len(self.scores)
+
+    def top(self, config, version, limit=FREQUENT_SECTION_SIZE):
+        """Return (section_idx, row_idx) keys of the highest scoring snippets.
+
+        version is the store version config was loaded from, or None if
+        unknown; snippets missing from it are skipped without a search.
+        """
+        now = time.time()
+        ranked = heapq.nlargest(limit, self.scores, key=lambda key: self.score(key, now))
+        section_by_name = {
+            section["name"]: section_idx
+            for section_idx, section in enumerate(config["sections"])
+        }
+
+        found = {}
+        missing = set()
+        for key in ranked:
+            section_name, row_idx = self.hints.get(key, (None, None))
+            section_idx = section_by_name.get(section_name)
+            strings = config["sections"][section_idx]["strings"] if section_idx is not None else []
+            if isinstance(row_idx, str) and isinstance(strings, DirectoryStrings):
+                # Left out until the folder has loaded, or once the file is gone.
+                row_idx = strings.find(row_idx)
+                if row_idx is not None:
+                    found[key] = (section_idx, row_idx)
+                continue
+            if isinstance(row_idx, int) and 0 <= row_idx < len(strings) and snippet_key(strings[row_idx]) == key:
+                found[key] = (section_idx, row_idx)
+            elif version is None or self.misses.get(key) != version:
+                missing.add(key)
+
+        # Snippets moved since they were logged: look them up by content.
+        if missing:
+            moved = {}
+            for section_idx, section in enumerate(config["sections"]):
+                if is_directory_section(section):
+                    continue  # Would read every file
+                for row_idx, text in enumerate(section["strings"]):
+                    key = snippet_key(text)
+                    if key in missing:
+                        missing.discard(key)
+                        found[key] = (section_idx, row_idx)
+                        moved[key] = (section["name"], row_idx)
+                if not missing:
+                    break
+            # Remember the outcome so the next open does not search again.
+            self.hints.update(moved)
+            lines = [{"k": key, "n": name, "r": row_idx} for key, (name, row_idx) in moved.items()]
+            if version is not None:
+                for key in missing:
+                    self.misses[key] = version
+                    lines.append({"k": key, "x": version})
+            if lines:
+                self.append(lines)
+
+        return [found[key] for key in ranked if key in found]
+
+
+class Tracer:
+    """Spans written in the Chrome trace JSON array format.
+
+    The middle-click daemon passes the file of a click in
+    PROMPT_CLICK_TRACE_FILE and records its own stages there, so Perfetto
+    or chrome://tracing shows the click as one timeline. Events are
+    appended one write each and tagged with the click's token; timestamps
+    come from CLOCK_MONOTONIC, which both processes share. A tracer without
+    a path records nothing.
+    """
+
+    def __init__(self, path, token, process_name):
+        self.path = path
+        self.token = token
+        self.fd = None
+        if path is None:
+            return
+        try:
+            self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC, 0o644)
+            if os.fstat(self.fd).st_size == 0:
+                os.write(self.fd, b"[\n")  # The closing bracket is optional
+        except OSError:
+            self.fd = None
+            return
+        self.write({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": process_name}})
+
+    def write(self, event):
+        if self.fd is None:
+            return
+        try:
+            os.write(self.fd, (json.dumps(event) + ",\n").encode("utf-8"))
+        except OSError:
+            pass
+
+    def complete(self, name, start_ns, **args):
+        """Record a span from start_ns, a time.monotonic_ns() value, until now."""
+        if self.fd is None:
+            return
+        end_ns = time.monotonic_ns()
+        self.write({
+            "name": name,
+            "cat": "prompt_click",
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "args": {"token": self.token, **args},
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start_ns = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.complete(name, start_ns, **args)
+
+
+tracer = Tracer(TRACE_FILE, AUTOPASTE_TRIGGER_TOKEN, "prompt_click")
 
 
 def command_exists(command):
@@ -113,22 +2634,53 @@ def notify_user(message):
         ])
 
 
-def request_autopaste(text):
-    """Signal the external launcher that clipboard is ready for paste."""
+def request_autopaste(text, focus_confirmed=False, direct_typing=False, sequence=None, fields=None, separator=None):
+    """Signal the external launcher that clipboard is ready for paste.
+
+    With direct_typing the launcher may type short text instead, in which
+    case the clipboard is left untouched. A sequence number marks a paste
+    from a popup that stays open: the launcher serves it right away and
+    confirms it in the trigger file, see wait_for_autopaste. fields asks
+    the launcher to paste each of them in turn, pressing the separator key
+    between them; launchers that predate it paste text.
+    """
     if not AUTOPASTE_TRIGGER_PATH or not AUTOPASTE_TRIGGER_TOKEN:
         return False
 
+    request = {
+        "token": AUTOPASTE_TRIGGER_TOKEN,
+        "text": text,
+        "focus_confirmed": focus_confirmed,
+        "direct_typing": direct_typing,
+    }
+    if sequence is not None:
+        request["sticky"] = True
+        request["sequence"] = sequence
+    if fields is not None:
+        request["fields"] = fields
+        request["separator"] = separator
     try:
         with open(AUTOPASTE_TRIGGER_PATH, "w", encoding="utf-8") as f:
-            json.dump({
-                "token": AUTOPASTE_TRIGGER_TOKEN,
-                "text": text,
-            }, f, ensure_ascii=False)
+            json.dump(request, f, ensure_ascii=False)
         return True
     except OSError:
         return False
 
 
+def autopaste_done(sequence):
+    try:
+        with open(AUTOPASTE_TRIGGER_PATH, "r", encoding="utf-8") as f:
+            reply = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(reply, dict) and reply.get("token") == AUTOPASTE_TRIGGER_TOKEN and reply.get("done") == sequence
+
+
+def wait_for_autopaste(sequence, timeout=AUTOPASTE_DONE_TIMEOUT_SECONDS):
+    """Wait until the launcher has pasted request sequence; False on timeout."""
+    return wait_until(lambda: autopaste_done(sequence), timeout)
+
+
 def copy_text_to_clipboards(text):
     """Copy text using the best clipboard backend available."""
     text_bytes = text.encode("utf-8")
@@ -158,10 +2710,529 @@ def copy_text_to_clipboards(text):
     return "gtk"
 
 
+def wait_for_clipboard(text, timeout=CLIPBOARD_CONFIRM_TIMEOUT_SECONDS):
+    """Wait until the clipboard owner serves text; False on timeout."""
+    clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
+    deadline = time.monotonic() + timeout
+    while True:
+        if clipboard.wait_for_text() == text:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(FOCUS_POLL_INTERVAL_SECONDS)
+
+
+def wait_until(predicate, timeout, interval=FOCUS_POLL_INTERVAL_SECONDS):
+    """Poll predicate until it holds or timeout expires."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if predicate():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+class XClientMessageEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("serial", ctypes.c_ulong),
+        ("send_event", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("window", ctypes.c_ulong),
+        ("message_type", ctypes.c_ulong),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_long * 5),
+    ]
+
+
+class XEvent(ctypes.Union):
+    _fields_ = [
+        ("xclient", XClientMessageEvent),
+        ("pad", ctypes.c_long * 24),
+    ]
+
+
+X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+
+class X11Automation:
+    """In-process window tracking and XTest key injection.
+
+    Talks to the X server over its own Xlib connection, so capturing and
+    restoring the previous window and sending the paste keystroke need no
+    xdotool process spawns.
+    """
+
+    XA_CARDINAL = 6
+    XA_WINDOW = 33
+    CLIENT_MESSAGE = 33
+    SUBSTRUCTURE_MASK = (1 << 19) | (1 << 20)
+    SOURCE_PAGER = 2
+
+    def __init__(self):
+        x11_path = ctypes.util.find_library("X11")
+        xtst_path = ctypes.util.find_library("Xtst")
+        if not x11_path or not xtst_path:
+            raise OSError("libX11/libXtst not available")
+
+        self.xlib = ctypes.cdll.LoadLibrary(x11_path)
+        self.xtst = ctypes.cdll.LoadLibrary(xtst_path)
+        self._declare_prototypes()
+
+        self.display = self.xlib.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("cannot open X display")
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        self.net_active_window = self.xlib.XInternAtom(self.display, b"_NET_ACTIVE_WINDOW", False)
+        self.net_wm_pid = self.xlib.XInternAtom(self.display, b"_NET_WM_PID", False)
+        self.shift_keycode = self.keycode("Shift_L")
+        self.insert_keycode = self.keycode("Insert")
+        self._ignore_errors = X_ERROR_HANDLER(lambda _display, _event: 0)
+
+    def _declare_prototypes(self):
+        xlib = self.xlib
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XStringToKeysym.restype = ctypes.c_ulong
+        xlib.XStringToKeysym.argtypes = [ctypes.c_char_p]
+        xlib.XKeysymToKeycode.restype = ctypes.c_ubyte
+        xlib.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        xlib.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long,
+            ctypes.c_long, ctypes.c_int, ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_void_p),
+        ]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xlib.XSendEvent.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_long,
+            ctypes.POINTER(XEvent),
+        ]
+        xlib.XFlush.argtypes = [ctypes.c_void_p]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XSetErrorHandler.restype = ctypes.c_void_p
+        xlib.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+        self.xtst.XTestFakeKeyEvent.argtypes = [
+            ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong,
+        ]
+
+    def keycode(self, keysym_name):
+        keysym = self.xlib.XStringToKeysym(keysym_name.encode("ascii"))
+        return self.xlib.XKeysymToKeycode(self.display, keysym)
+
+    def _get_cardinal(self, window, atom, prop_type):
+        """Read the first 32-bit item of a window property, or None."""
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+
+        # A window that vanished raises BadWindow; trap it like GDK does
+        # instead of letting Xlib's default handler exit the process.
+        previous = self.xlib.XSetErrorHandler(
+            ctypes.cast(self._ignore_errors, ctypes.c_void_p)
+        )
+        try:
+            status = self.xlib.XGetWindowProperty(
+                self.display, window, atom, 0, 1, False, prop_type,
+                ctypes.byref(actual_type), ctypes.byref(actual_format),
+                ctypes.byref(nitems), ctypes.byref(bytes_after), ctypes.byref(data),
+            )
+            self.xlib.XSync(self.display, False)
+        finally:
+            self.xlib.XSetErrorHandler(previous)
+
+        if status != 0 or not data.value:
+            return None
+        try:
+            if actual_format.value != 32 or nitems.value < 1:
+                return None
+            # Format 32 items are stored as C longs.
+            return ctypes.cast(data, ctypes.POINTER(ctypes.c_ulong))[0]
+        finally:
+            self.xlib.XFree(data)
+
+    def get_active_window(self):
+        window = self._get_cardinal(self.root, self.net_active_window, self.XA_WINDOW)
+        return str(window) if window else None
+
+    def get_window_pid(self, window_id):
+        return self._get_cardinal(int(window_id), self.net_wm_pid, self.XA_CARDINAL)
+
+    def activate_window(self, window_id):
+        event = XEvent()
+        event.xclient.type = self.CLIENT_MESSAGE
+        event.xclient.send_event = True
+        event.xclient.display = self.display
+        event.xclient.window = int(window_id)
+        event.xclient.message_type = self.net_active_window
+        event.xclient.format = 32
+        event.xclient.data[0] = self.SOURCE_PAGER
+        self.xlib.XSendEvent(
+            self.display, self.root, False, self.SUBSTRUCTURE_MASK, ctypes.byref(event)
+        )
+        self.xlib.XFlush(self.display)
+
+    def send_paste_keystroke(self):
+        for keycode, pressed in (
+            (self.shift_keycode, True),
+            (self.insert_keycode, True),
+            (self.insert_keycode, False),
+            (self.shift_keycode, False),
+        ):
+            self.xtst.XTestFakeKeyEvent(self.display, keycode, pressed, 0)
+        self.xlib.XFlush(self.display)
+
+    def send_key(self, keysym_name):
+        keycode = self.keycode(keysym_name)
+        self.xtst.XTestFakeKeyEvent(self.display, keycode, True, 0)
+        self.xtst.XTestFakeKeyEvent(self.display, keycode, False, 0)
+        self.xlib.XFlush(self.display)
+
+
+_x11_automation = None
+
+
+def x11_automation():
+    """Shared X11Automation, or None when Xlib/XTest are unavailable."""
+    global _x11_automation
+    if _x11_automation is None and not IS_WAYLAND:
+        try:
+            _x11_automation = X11Automation()
+        except (OSError, AttributeError):
+            _x11_automation = False
+    return _x11_automation or None
+
+
+def get_active_window():
+    """Return the X11 id of the focused window, or None."""
+    automation = x11_automation()
+    if automation:
+        return automation.get_active_window()
+
+    try:
+        result = subprocess.run(
+            ["xdotool", "getactivewindow"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def get_window_app(window_id):
+    """Name the application owning window_id, used to key learned timings."""
+    automation = x11_automation()
+    try:
+        if automation:
+            pid = automation.get_window_pid(window_id)
+            if pid is None:
+                return None
+        else:
+            result = subprocess.run(
+                ["xdotool", "getwindowpid", window_id],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            pid = result.stdout.strip()
+        with open(f"/proc/{pid}/comm", "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def activate_window(window_id):
+    automation = x11_automation()
+    if automation:
+        automation.activate_window(window_id)
+        return
+    subprocess.run(["xdotool", "windowactivate", window_id], check=False)
+
+
+def send_paste_keystroke():
+    automation = x11_automation()
+    if automation:
+        automation.send_paste_keystroke()
+        return
+    subprocess.run(["xdotool", "key", "shift+Insert"], check=False)
+
+
+def send_key(keysym_name):
+    automation = x11_automation()
+    if automation:
+        automation.send_key(keysym_name)
+        return
+    subprocess.run(["xdotool", "key", keysym_name], check=False)
+
+
+def fill_fields(fields, separator):
+    """Paste each field into the focused window, pressing separator between them.
+
+    Each paste gets FORM_FILL_PASTE_SETTLE_SECONDS to read the clipboard
+    before the next field replaces it.
+    """
+    keysym_name = FORM_FILL_KEYS.get(separator, FORM_FILL_KEYS[DEFAULT_FORM_FILL_KEY])
+    for index, text in enumerate(fields):
+        if index:
+            time.sleep(FORM_FILL_PASTE_SETTLE_SECONDS)
+            send_key(keysym_name)
+        if not text:
+            continue
+        copy_text_to_clipboards(text)
+        if not wait_for_clipboard(text):
+            notify_user(f"Stopped filling after {index} fields: the clipboard did not update.")
+            return
+        send_paste_keystroke()
+
+
+class PasteTimings:
+    """Focus-return latency learned per application from previous pastes.
+
+    The learned value bounds how long we wait for the target window to get
+    focus back; waiting longer than that means something else grabbed focus
+    and pasting would land in the wrong window.
+    """
+
+    SMOOTHING = 0.3
+    TIMEOUT_FACTOR = 4
+
+    def __init__(self, path=PASTE_TIMING_FILE):
+        self.path = path
+        self.timings = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.timings = {
+                    app: float(value) for app, value in data.items()
+                    if isinstance(value, (int, float))
+                }
+        except (OSError, ValueError):
+            pass
+
+    def timeout_for(self, app):
+        learned = self.timings.get(app)
+        if learned is None:
+            return FOCUS_TIMEOUT_MAX_SECONDS
+        return min(
+            FOCUS_TIMEOUT_MAX_SECONDS,
+            max(FOCUS_TIMEOUT_MIN_SECONDS, learned * self.TIMEOUT_FACTOR),
+        )
+
+    def record(self, app, elapsed):
+        if not app:
+            return
+        previous = self.timings.get(app)
+        if previous is None:
+            self.timings[app] = elapsed
+        else:
+            self.timings[app] = previous + self.SMOOTHING * (elapsed - previous)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.timings, f, indent=2)
+        except OSError:
+            pass
+
+
+class SnippetTemplate:
+    """A snippet split once into literal text and placeholder fields."""
+
+    def __init__(self, text, names=TEMPLATE_FIELDS):
+        self.parts = []  # literal strings and (name, arg) fields, in order
+        pos = 0
+        for match in TEMPLATE_PATTERN.finditer(text):
+            name, arg = match.group(1), match.group(2)
+            if name not in names:
+                continue  # Unknown and disabled placeholders stay literal text
+            if match.start() > pos:
+                self.parts.append(text[pos:match.start()])
+            self.parts.append((name, arg.strip() if arg else ""))
+            pos = match.end()
+        if pos < len(text):
+            self.parts.append(text[pos:])
+        self.fields = [part for part in self.parts if isinstance(part, tuple)]
+
+    def render(self, values):
+        return "".join(
+            part if isinstance(part, str) else values.get(part, "")
+            for part in self.parts
+        )
+
+
+class TemplateEngine:
+    """Expands snippet placeholders without blocking the GTK main loop.
+
+    Each snippet is compiled once. Cheap fields (date, time, clipboard) are
+    filled in at render time. Commands and file reads run on a small pool
+    of daemon threads under a timeout, and their results are cached for
+    TEMPLATE_CACHE_TTL_SECONDS. File reads are prefetched when a snippet
+    is selected, so by the time Paste is clicked they are usually ready.
+    Commands only run once the snippet is actually pasted.
+
+    Commands and file reads are only expanded with the template_commands
+    setting, and never in snippets from directory sections.
+    """
+
+    SLOW_FIELDS = ("cmd", "file")
+    PREFETCH_FIELDS = ("file",)  # Selecting a row must not run a command
+
+    def __init__(self, commands=DEFAULT_TEMPLATE_COMMANDS):
+        self.commands = commands
+        self.templates = {}  # {(text, names): SnippetTemplate, or None without fields}
+        self.cache = {}  # {(name, arg): (expires_at, value)}
+        self.pending = {}  # {(name, arg): Future}
+        self.lock = threading.Lock()
+        self.jobs = None  # queue of (future, field); workers start on first use
+        self.clipboard_text = None
+
+    def compile(self, text, trusted=True):
+        names = TEMPLATE_FIELDS if trusted and self.commands else TEMPLATE_SAFE_FIELDS
+        key = (text, names)
+        if key not in self.templates:
+            template = SnippetTemplate(text, names) if "{{" in text else None
+            self.templates[key] = template if template and template.fields else None
+        return self.templates[key]
+
+    def capture_clipboard(self):
+        """Remember the clipboard before paste replaces it, for {{clipboard}}."""
+        def on_text(_clipboard, text):
+            self.clipboard_text = text or ""
+
+        Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD).request_text(on_text)
+
+    def _cached(self, field):
+        entry = self.cache.get(field)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _submit(self, field):
+        """Return a future for a slow field, starting it unless cached or running."""
+        with self.lock:
+            future = self.pending.get(field)
+            if future is not None:
+                return future
+            future = Future()
+            value = self._cached(field)
+            if value is not None:
+                future.set_result(value)
+                return future
+            self.pending[field] = future
+            if self.jobs is None:
+                self.jobs = queue.Queue()
+                for i in range(TEMPLATE_WORKERS):
+                    threading.Thread(
+                        target=self._work, name=f"prompt-click-template-{i}", daemon=True
+                    ).start()
+        self.jobs.put((future, field))
+        return future
+
+    def _work(self):
+        while True:
+            future, field = self.jobs.get()
+            try:
+                value = self._evaluate_slow(*field)
+            except Exception:
+                value = ""  # e.g. a NUL in the command; the future must still resolve
+            with self.lock:
+                self.cache[field] = (time.monotonic() + TEMPLATE_CACHE_TTL_SECONDS, value)
+                self.pending.pop(field, None)
+            future.set_result(value)
+
+    @staticmethod
+    def _evaluate_slow(name, arg):
+        try:
+            if name == "cmd":
+                result = subprocess.run(
+                    arg, shell=True, capture_output=True, text=True,
+                    timeout=TEMPLATE_COMMAND_TIMEOUT_SECONDS,
+                )
+                return result.stdout.rstrip("\n")
+            with open(os.path.expanduser(arg), "r", encoding="utf-8") as f:
+                return f.read().rstrip("\n")
+        except (OSError, UnicodeDecodeError, subprocess.SubprocessError):
+            return ""
+
+    def _evaluate_fast(self, name, arg):
+        if name == "date":
+            return time.strftime(arg or "%Y-%m-%d")
+        if name == "time":
+            return time.strftime(arg or "%H:%M")
+        return self.clipboard_text or ""
+
+    def prefetch(self, text, trusted=True):
+        """Start the file reads of a snippet that is likely to be pasted."""
+        template = self.compile(text, trusted)
+        if template:
+            for field in template.fields:
+                if field[0] in self.PREFETCH_FIELDS:
+                    self._submit(field)
+
+    def expand(self, texts, separator=", ", trusted=None):
+        """Return a Future of the expanded texts joined with separator.
+
+        With separator None the Future holds the list of expanded texts.
+        trusted holds one flag per text; untrusted texts get no slow fields.
+
+        It is already done when no slow field is still running; otherwise
+        it completes on a helper thread, waiting at most
+        TEMPLATE_EXPAND_TIMEOUT_SECONDS for slow fields, which then expand
+        to an empty string.
+        """
+        if trusted is None:
+            trusted = [True] * len(texts)
+        templates = [self.compile(text, ok) for text, ok in zip(texts, trusted)]
+        slow = {
+            field: self._submit(field)
+            for template in templates if template
+            for field in template.fields if field[0] in self.SLOW_FIELDS
+        }
+
+        def render():
+            values = {}
+            deadline = time.monotonic() + TEMPLATE_EXPAND_TIMEOUT_SECONDS
+            for field, future in slow.items():
+                try:
+                    values[field] = future.result(max(0.0, deadline - time.monotonic()))
+                except FuturesTimeoutError:
+                    values[field] = ""
+            for template in templates:
+                for field in template.fields if template else ():
+                    if field not in values:
+                        values[field] = self._evaluate_fast(*field)
+            expanded = [
+                template.render(values) if template else text
+                for text, template in zip(texts, templates)
+            ]
+            return expanded if separator is None else separator.join(expanded)
+
+        result = Future()
+        if all(future.done() for future in slow.values()):
+            result.set_result(render())
+        else:
+            threading.Thread(
+                target=lambda: result.set_result(render()),
+                name="prompt-click-template-render",
+                daemon=True,
+            ).start()
+        return result
+
+
 class StringEditDialog(Gtk.Dialog):
-    """Dialog for editing a single string with a textbox."""
+    """Dialog for editing a single string with a textbox and its tags."""
 
-    def __init__(self, parent, text=""):
+    def __init__(self, parent, text="", tags=()):
         super().__init__(title="Edit String", parent=parent, modal=True)
         self.set_default_size(500, 200)
         self.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
@@ -184,12 +3255,23 @@ class StringEditDialog(Gtk.Dialog):
         scroll.add(self.textview)
         box.pack_start(scroll, True, True, 0)
 
+        tags_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
+        tags_box.pack_start(Gtk.Label(label="Tags:"), False, False, 0)
+        self.tags_entry = Gtk.Entry()
+        self.tags_entry.set_text(", ".join(tags))
+        self.tags_entry.set_placeholder_text("e.g. email, work")
+        tags_box.pack_start(self.tags_entry, True, True, 0)
+        box.pack_start(tags_box, False, False, 0)
+
         self.show_all()
 
     def get_text(self):
         buf = self.textview.get_buffer()
         return buf.get_text(buf.get_start_iter(), buf.get_end_iter(), False)
 
+    def get_tags(self):
+        return parse_tags(self.tags_entry.get_text())
+
 
 class SectionNameDialog(Gtk.Dialog):
     """Dialog for entering section name."""
@@ -257,25 +3339,18 @@ class MoveToSectionDialog(Gtk.Dialog):
 class EditDialog(Gtk.Dialog):
     """Dialog for editing sections and strings with tabs."""
 
-    @staticmethod
-    def _move_in_list(items, from_idx, to_idx):
-        """Move one item inside list while preserving order of others."""
-        item = items.pop(from_idx)
-        items.insert(to_idx, item)
-
     def __init__(self, parent, config):
         super().__init__(title="Edit Strings", parent=parent, modal=True)
         self.set_default_size(550, 450)
         self.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
                          Gtk.STOCK_OK, Gtk.ResponseType.OK)
 
-        # Deep copy config
-        self.config = {
-            "settings": config["settings"].copy(),
-            "sections": [{"name": s["name"], "strings": s["strings"].copy()}
-                         for s in config["sections"]]
-        }
-        self.truncate_len = self.config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+        # Edits go to a change-tracked model that shares untouched sections
+        self.model = EditorModel(config)
+        self.truncate_len = self.model.settings.get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+        # Previews of untouched sections come from the cache of the config on disk
+        self.preview_cache = PreviewCache.load(get_store().version(), self.truncate_len)
+        self.connect("destroy", lambda _widget: self.preview_cache.save())
 
         box = self.get_content_area()
         box.set_spacing(10)
@@ -299,6 +3374,18 @@ class EditDialog(Gtk.Dialog):
         self.truncate_spin.set_value(self.truncate_len)
         settings_box.pack_start(self.truncate_spin, False, False, 0)
 
+        self.direct_typing_check = Gtk.CheckButton(label="Type short snippets (keeps clipboard)")
+        self.direct_typing_check.set_active(
+            self.model.settings.get("direct_typing", DEFAULT_DIRECT_TYPING)
+        )
+        settings_box.pack_start(self.direct_typing_check, False, False, 0)
+
+        self.frequent_section_check = Gtk.CheckButton(label="Show Frequent section")
+        self.frequent_section_check.set_active(
+            self.model.settings.get("frequent_section", DEFAULT_FREQUENT_SECTION)
+        )
+        settings_box.pack_start(self.frequent_section_check, False, False, 0)
+
         settings_frame.add(settings_box)
         box.pack_start(settings_frame, False, False, 0)
 
@@ -328,40 +3415,60 @@ class EditDialog(Gtk.Dialog):
         self.notebook = Gtk.Notebook()
         self.notebook.set_scrollable(True)
         self.notebook.connect("page-reordered", self.on_section_reordered)
+        self.notebook.connect("switch-page", self.on_switch_page)
         box.pack_start(self.notebook, True, True, 0)
 
-        # Store references to tree views and stores
+        # Per-tab widgets; store and tree stay None until the tab is first shown
         self.section_stores = []
         self.section_trees = []
         self.section_pages = []
 
-        self.rebuild_tabs()
+        for idx in range(len(self.model)):
+            self.add_section_tab(idx)
 
         self.show_all()
+        self.ensure_section_built(self.get_current_section_idx())
 
-    def rebuild_tabs(self):
-        """Rebuild all tabs from config."""
-        # Clear existing tabs
-        while self.notebook.get_n_pages() > 0:
-            self.notebook.remove_page(0)
+    def add_section_tab(self, idx):
+        """Add an empty tab for a section; its list is built on first view."""
+        tab_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
+        tab_box.set_margin_start(5)
+        tab_box.set_margin_end(5)
+        tab_box.set_margin_top(5)
+        tab_box.set_margin_bottom(5)
 
-        self.section_stores = []
-        self.section_trees = []
-        self.section_pages = []
+        # Register first: appending the first page emits switch-page
+        self.section_stores.append(None)
+        self.section_trees.append(None)
+        self.section_pages.append(tab_box)
 
-        for idx, section in enumerate(self.config["sections"]):
-            self.add_section_tab(section, idx)
+        label = Gtk.Label(label=self.model.name(idx))
+        self.notebook.append_page(tab_box, label)
+        self.notebook.set_tab_reorderable(tab_box, True)
+
+    def section_previews(self, idx):
+        origin = self.model.origin(idx)
+        strings = self.model.strings(idx)
+        if origin is not None:
+            return self.preview_cache.section(origin, strings)
+        return [truncate(s, self.truncate_len) for s in strings]
+
+    def ensure_section_built(self, idx):
+        """Build the list of a section tab the first time it is shown."""
+        if idx < 0 or self.section_stores[idx] is not None:
+            return
 
-    def add_section_tab(self, section, idx):
-        """Add a tab for a section."""
         # Create store and tree
-        store = Gtk.ListStore(str, str)
-        for s in section["strings"]:
-            store.append([truncate(s, self.truncate_len), s])
+        store = Gtk.ListStore(str, str, int)  # preview, text, snippet id
+        for preview, s, snippet_id in zip(self.section_previews(idx), self.model.strings(idx), self.model.ids(idx)):
+            store.insert_with_valuesv(-1, [0, 1, 2], [preview, s, snippet_id])
 
         tree = Gtk.TreeView(model=store)
         tree.set_reorderable(True)
+        tree.get_selection().set_mode(Gtk.SelectionMode.MULTIPLE)
         tree.connect("row-activated", self.on_row_activated)
+        # Drag-and-drop reorders the store behind our back; resync once it ends
+        tree.connect("drag-end", self.on_rows_dragged)
 
         renderer = Gtk.CellRendererText()
         column = Gtk.TreeViewColumn("Strings (double-click to edit)", renderer, text=0)
@@ -371,12 +3478,7 @@ class EditDialog(Gtk.Dialog):
         scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
         scroll.add(tree)
 
-        # Tab content box
-        tab_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
-        tab_box.set_margin_start(5)
-        tab_box.set_margin_end(5)
-        tab_box.set_margin_top(5)
-        tab_box.set_margin_bottom(5)
+        tab_box = self.section_pages[idx]
         tab_box.pack_start(scroll, True, True, 0)
 
         # String management buttons
@@ -407,15 +3509,20 @@ class EditDialog(Gtk.Dialog):
         btn_box.pack_start(move_btn, False, False, 0)
 
         tab_box.pack_start(btn_box, False, False, 0)
+        tab_box.show_all()
 
-        # Add tab
-        label = Gtk.Label(label=section["name"])
-        self.notebook.append_page(tab_box, label)
-        self.notebook.set_tab_reorderable(tab_box, True)
+        self.section_stores[idx] = store
+        self.section_trees[idx] = tree
 
-        self.section_stores.append(store)
-        self.section_trees.append(tree)
-        self.section_pages.append(tab_box)
+    def on_switch_page(self, notebook, page, page_num):
+        # Also emitted mid-removal, so look the page up instead of trusting page_num
+        if page in self.section_pages:
+            self.ensure_section_built(self.section_pages.index(page))
+
+    def on_rows_dragged(self, tree, context):
+        idx = self.section_trees.index(tree)
+        store = self.section_stores[idx]
+        self.model.set_strings(idx, [row[1] for row in store], [row[2] for row in store])
 
     def on_section_reordered(self, notebook, child, page_num):
         """Keep section data in sync with notebook tab reorder."""
@@ -427,10 +3534,9 @@ class EditDialog(Gtk.Dialog):
         if old_idx == page_num:
             return
 
-        self._move_in_list(self.section_pages, old_idx, page_num)
-        self._move_in_list(self.section_stores, old_idx, page_num)
-        self._move_in_list(self.section_trees, old_idx, page_num)
-        self._move_in_list(self.config["sections"], old_idx, page_num)
+        for items in (self.section_pages, self.section_stores, self.section_trees):
+            items.insert(page_num, items.pop(old_idx))
+        self.model.move_section(old_idx, page_num)
 
     def get_current_section_idx(self):
         return self.notebook.get_current_page()
@@ -443,35 +3549,77 @@ class EditDialog(Gtk.Dialog):
         idx = self.get_current_section_idx()
         return self.section_trees[idx] if idx >= 0 else None
 
+    def get_selected_rows(self):
+        """Return (section_idx, store, sorted row indexes) of the selection, or None."""
+        tree = self.get_current_tree()
+        if not tree:
+            return None
+        store, paths = tree.get_selection().get_selected_rows()
+        if not paths:
+            return None
+        rows = sorted(path.get_indices()[0] for path in paths)
+        return self.get_current_section_idx(), store, rows
+
+    def batch_update(self, idx, update):
+        """Run update(store) with the store detached from its view.
+
+        A detached store has no view to notify, so bulk changes cost no
+        per-row redraw or selection bookkeeping.
+        """
+        tree = self.section_trees[idx]
+        store = self.section_stores[idx]
+        if store is None:
+            return
+        tree.set_model(None)
+        update(store)
+        tree.set_model(store)
+
+    def select_rows(self, idx, first, count):
+        selection = self.section_trees[idx].get_selection()
+        selection.unselect_all()
+        if count:
+            selection.select_range(
+                Gtk.TreePath.new_from_indices([first]),
+                Gtk.TreePath.new_from_indices([first + count - 1]),
+            )
+
+    @staticmethod
+    def take_rows(store, rows):
+        """Remove rows from a store and return their (preview, text, id) rows."""
+        taken = [(store[row][0], store[row][1], store[row][2]) for row in rows]
+        for row in reversed(rows):
+            store.remove(store.get_iter(Gtk.TreePath.new_from_indices([row])))
+        return taken
+
     def on_add_section(self, button):
         dialog = SectionNameDialog(self, "New Section")
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             name = dialog.get_name()
             if name:
-                self.config["sections"].append({"name": name, "strings": []})
-                self.add_section_tab(self.config["sections"][-1], len(self.config["sections"]) - 1)
+                idx = self.model.add_section(name)
+                self.add_section_tab(idx)
                 self.notebook.show_all()
-                self.notebook.set_current_page(len(self.config["sections"]) - 1)
+                self.notebook.set_current_page(idx)
         dialog.destroy()
 
     def on_rename_section(self, button):
         idx = self.get_current_section_idx()
         if idx < 0:
             return
-        current_name = self.config["sections"][idx]["name"]
+        current_name = self.model.name(idx)
         dialog = SectionNameDialog(self, "Rename Section", current_name)
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             name = dialog.get_name()
             if name:
-                self.config["sections"][idx]["name"] = name
+                self.model.rename_section(idx, name)
                 self.notebook.get_tab_label(self.notebook.get_nth_page(idx)).set_text(name)
         dialog.destroy()
 
     def on_remove_section(self, button):
         idx = self.get_current_section_idx()
-        if idx < 0 or len(self.config["sections"]) <= 1:
+        if idx < 0 or len(self.model) <= 1:
             return  # Keep at least one section
 
         dialog = Gtk.MessageDialog(
@@ -479,14 +3627,14 @@ class EditDialog(Gtk.Dialog):
             modal=True,
             message_type=Gtk.MessageType.QUESTION,
             buttons=Gtk.ButtonsType.YES_NO,
-            text=f"Delete section '{self.config['sections'][idx]['name']}'?"
+            text=f"Delete section '{self.model.name(idx)}'?"
         )
         dialog.format_secondary_text("All strings in this section will be deleted.")
         response = dialog.run()
         dialog.destroy()
 
         if response == Gtk.ResponseType.YES:
-            del self.config["sections"][idx]
+            self.model.remove_section(idx)
             del self.section_stores[idx]
             del self.section_trees[idx]
             del self.section_pages[idx]
@@ -499,19 +3647,19 @@ class EditDialog(Gtk.Dialog):
         self.edit_selected_string()
 
     def edit_selected_string(self):
-        tree = self.get_current_tree()
-        if not tree:
-            return
-        selection = tree.get_selection()
-        model, iter = selection.get_selected()
-        if iter:
-            full_text = model[iter][1]
-            dialog = StringEditDialog(self, full_text)
+        selected = self.get_selected_rows()
+        if selected:
+            idx, store, rows = selected
+            row_idx = rows[0]
+            full_text, snippet_id = store[row_idx][1], store[row_idx][2]
+            dialog = StringEditDialog(self, full_text, self.model.tags(snippet_id))
             response = dialog.run()
             if response == Gtk.ResponseType.OK:
                 new_text = dialog.get_text()
-                model[iter][0] = truncate(new_text, self.truncate_len)
-                model[iter][1] = new_text
+                self.model.replace_string(idx, row_idx, new_text)
+                self.model.set_tags(snippet_id, dialog.get_tags())
+                store[row_idx][0] = truncate(new_text, self.truncate_len)
+                store[row_idx][1] = new_text
             dialog.destroy()
 
     def on_add_string(self, button):
@@ -520,87 +3668,83 @@ class EditDialog(Gtk.Dialog):
         if response == Gtk.ResponseType.OK:
             new_text = dialog.get_text()
             if new_text.strip():
+                idx = self.get_current_section_idx()
                 store = self.get_current_store()
                 if store:
-                    store.append([truncate(new_text, self.truncate_len), new_text])
+                    [snippet_id] = self.model.insert_strings(idx, len(store), [new_text])
+                    self.model.set_tags(snippet_id, dialog.get_tags())
+                    store.append([truncate(new_text, self.truncate_len), new_text, snippet_id])
         dialog.destroy()
 
     def on_remove_string(self, button):
-        tree = self.get_current_tree()
-        if not tree:
+        selected = self.get_selected_rows()
+        if selected:
+            idx, store, rows = selected
+            self.model.remove_strings(idx, rows)
+            self.batch_update(idx, lambda store: self.take_rows(store, rows))
+
+    def move_selected_rows(self, step):
+        """Move the selected rows one step as a block."""
+        selected = self.get_selected_rows()
+        if not selected:
+            return
+        idx, store, rows = selected
+        to_row = min(max(rows[0] + step, 0), len(store) - len(rows))
+        if to_row == rows[0] and rows[-1] - rows[0] == len(rows) - 1:
             return
-        selection = tree.get_selection()
-        model, iter = selection.get_selected()
-        if iter:
-            model.remove(iter)
+
+        def update(store):
+            taken = self.take_rows(store, rows)
+            for offset, row in enumerate(taken):
+                store.insert_with_valuesv(to_row + offset, [0, 1, 2], list(row))
+
+        self.model.move_strings(idx, rows, to_row)
+        self.batch_update(idx, update)
+        self.select_rows(idx, to_row, len(rows))
 
     def on_move_up(self, button):
-        tree = self.get_current_tree()
-        if not tree:
-            return
-        selection = tree.get_selection()
-        model, iter = selection.get_selected()
-        if iter:
-            path = model.get_path(iter)
-            if path.get_indices()[0] > 0:
-                prev_iter = model.get_iter(Gtk.TreePath.new_from_indices([path.get_indices()[0] - 1]))
-                model.swap(iter, prev_iter)
+        self.move_selected_rows(-1)
 
     def on_move_down(self, button):
-        tree = self.get_current_tree()
-        if not tree:
-            return
-        selection = tree.get_selection()
-        model, iter = selection.get_selected()
-        if iter:
-            path = model.get_path(iter)
-            if path.get_indices()[0] < len(model) - 1:
-                next_iter = model.get_iter(Gtk.TreePath.new_from_indices([path.get_indices()[0] + 1]))
-                model.swap(iter, next_iter)
+        self.move_selected_rows(1)
 
     def on_move_to_section(self, button):
-        if len(self.config["sections"]) < 2:
+        if len(self.model) < 2:
             return
 
-        tree = self.get_current_tree()
-        if not tree:
-            return
-
-        selection = tree.get_selection()
-        model, iter = selection.get_selected()
-        if not iter:
+        selected = self.get_selected_rows()
+        if not selected:
             return
+        current_idx, store, rows = selected
 
-        current_idx = self.get_current_section_idx()
-        dialog = MoveToSectionDialog(self, self.config["sections"], current_idx)
+        sections = [{"name": self.model.name(i)} for i in range(len(self.model))]
+        dialog = MoveToSectionDialog(self, sections, current_idx)
         response = dialog.run()
 
         if response == Gtk.ResponseType.OK:
             target_idx = dialog.get_section_index()
             if target_idx is not None:
-                # Get the string
-                full_text = model[iter][1]
-                # Remove from current
-                model.remove(iter)
-                # Add to target
-                self.section_stores[target_idx].append([truncate(full_text, self.truncate_len), full_text])
+                self.model.move_strings_to_section(current_idx, rows, target_idx)
+                taken = []
+                self.batch_update(current_idx, lambda store: taken.extend(self.take_rows(store, rows)))
+
+                # Previews move along; an unbuilt target picks the rows up from the model when shown
+                def append(target_store):
+                    for row in taken:
+                        target_store.insert_with_valuesv(-1, [0, 1, 2], list(row))
+
+                self.batch_update(target_idx, append)
 
         dialog.destroy()
 
     def get_config(self):
-        """Build config from current state."""
-        sections = []
-        for i, store in enumerate(self.section_stores):
-            sections.append({
-                "name": self.config["sections"][i]["name"],
-                "strings": [row[1] for row in store]
-            })
-        return {
-            "settings": {
-                "truncate_length": int(self.truncate_spin.get_value())
-            },
-            "sections": sections
-        }
+        """Build config from the edited model."""
+        config = self.model.to_config()
+        settings = config["settings"]
+        settings["truncate_length"] = int(self.truncate_spin.get_value())
+        settings["direct_typing"] = self.direct_typing_check.get_active()
+        settings["frequent_section"] = self.frequent_section_check.get_active()
+        return config
 
 
 class PopupWindow(Gtk.Window):
@@ -608,25 +3752,22 @@ class PopupWindow(Gtk.Window):
 
     def __init__(self, paste_mode):
         super().__init__(type=Gtk.WindowType.TOPLEVEL)
+        self.started_ns = time.monotonic_ns()
         self.paste_mode = paste_mode
         self.external_autopaste = bool(AUTOPASTE_TRIGGER_PATH and AUTOPASTE_TRIGGER_TOKEN)
         self.copy_only_mode = paste_mode == PASTE_MODE_COPY or (
             IS_WAYLAND and not self.external_autopaste
         )
 
+        self.closing = False
+        self.paste_sequence = 0  # Pastes made while the popup stays open
+
         # Remember active window before popup
         self.previous_window_id = None
-        if not self.copy_only_mode:
-            try:
-                result = subprocess.run(
-                    ["xdotool", "getactivewindow"],
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                )
-                self.previous_window_id = result.stdout.strip()
-            except Exception:
-                self.previous_window_id = None
+        self.previous_app = None
+        self.paste_timings = None
+        if not self.copy_only_mode and not IS_WAYLAND:
+            self.previous_window_id = get_active_window()
 
         self.set_decorated(False)
         self.set_skip_taskbar_hint(True)
@@ -636,10 +3777,38 @@ class PopupWindow(Gtk.Window):
             self.set_type_hint(Gdk.WindowTypeHint.POPUP_MENU)
         self.set_resizable(False)
 
-        self.config = load_config()
-        self.truncate_len = self.config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
-        self.current_section_idx = 0
-        self.section_checkboxes = {}  # {section_idx: [checkboxes]}
+        with tracer.span("load_config"):
+            self.stored = load_packed_config()
+        self.truncate_len = self.stored["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+        # Sections read from directories go after the stored ones
+        self.directory_settings = self.get_directory_settings(self.stored)
+        self.directories = directory_sections(self.stored["settings"], self.truncate_len)
+        self.config = with_directory_sections(self.stored, self.directories)
+        self.section_stores = {}  # {section_idx: Gtk.ListStore(selected, row_idx)}
+        self.previews = {}  # {(section_idx, row_idx): preview}, filled for visible rows
+        self.selection = SelectionModel()
+        self.usage_log = UsageLog()
+        self.frequent_keys = self.get_frequent_keys()
+        self.templates = TemplateEngine(
+            self.stored["settings"].get("template_commands", DEFAULT_TEMPLATE_COMMANDS)
+        )
+        self.templates.capture_clipboard()
+        self.frequent_store = None  # Gtk.ListStore(selected, section_idx, row_idx)
+        self.current_section_idx = FREQUENT_SECTION_IDX if self.frequent_keys else 0
+        # Pick up saves from other instances and scripts while open
+        self.editing = False
+        self.reload_pending = False
+        self.reload_generation = 0
+        try:
+            self.config_watcher = ConfigWatcher(self.on_config_changed)
+        except OSError:
+            self.config_watcher = None
+        self.directory_watcher = None
+        if self.directories:
+            try:
+                self.directory_watcher = DirectoryWatcher(self.refresh_directories)
+            except OSError:
+                pass
 
         # Main container with border
         frame = Gtk.Frame()
@@ -662,33 +3831,34 @@ class PopupWindow(Gtk.Window):
         header_box.pack_start(self.section_label, True, True, 0)
 
         # Navigation hint
-        if len(self.config["sections"]) > 1:
+        if len(self.page_order()) > 1:
             nav_label = Gtk.Label(label="(scroll to switch)")
             nav_label.get_style_context().add_class("dim-label")
             header_box.pack_end(nav_label, False, False, 0)
 
         self.main_box.pack_start(header_box, False, False, 0)
 
-        # Scrolled window for checkboxes
-        scroll = Gtk.ScrolledWindow()
-        scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-        scroll.set_max_content_height(300)
-        scroll.set_propagate_natural_height(True)
-
-        # Event box for scroll events
-        self.event_box = Gtk.EventBox()
-        self.event_box.connect("scroll-event", self.on_scroll)
-
-        self.checkbox_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
-        self.event_box.add(self.checkbox_box)
-        scroll.add(self.event_box)
-        self.main_box.pack_start(scroll, True, True, 0)
-
-        # Initialize checkboxes for all sections
-        for i in range(len(self.config["sections"])):
-            self.section_checkboxes[i] = []
-
-        self.rebuild_checkboxes()
+        # Type-to-filter across all sections
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Type to search all sections, #tag to filter")
+        self.search_entry.connect("changed", self.on_search_changed)
+        self.main_box.pack_start(self.search_entry, False, False, 0)
+        self.search_index = None
+        self.tag_index = None  # Built on the first #tag search
+        self.search_store = None
+        self.search_page = None
+        self.start_search_index()
+
+        # One page per section, built on first visit and kept
+        self.stack = Gtk.Stack()
+        self.stack.set_homogeneous(False)
+        self.stack.set_transition_type(Gtk.StackTransitionType.NONE)
+        self.main_box.pack_start(self.stack, True, True, 0)
+        self.section_pages = {}  # {section_idx: Gtk.ScrolledWindow}
+        self.pending_section_steps = 0
+        self.scroll_tick_id = None
+
+        self.show_current_section()
 
         # Separator
         self.main_box.pack_start(Gtk.Separator(), False, False, 5)
@@ -715,6 +3885,12 @@ class PopupWindow(Gtk.Window):
         ok_btn.get_style_context().add_class("suggested-action")
         btn_box.pack_start(ok_btn, True, True, 0)
 
+        if not self.copy_only_mode:
+            fill_btn = Gtk.Button(label="Fill fields")
+            fill_btn.set_tooltip_text("Paste the snippets one per field, in the order picked")
+            fill_btn.connect("clicked", self.on_ok, True)
+            btn_box.pack_start(fill_btn, True, True, 0)
+
         cancel_btn = Gtk.Button(label="Cancel")
         cancel_btn.connect("clicked", self.on_cancel)
         btn_box.pack_start(cancel_btn, True, True, 0)
@@ -725,83 +3901,366 @@ class PopupWindow(Gtk.Window):
 
         self.main_box.pack_start(btn_box, False, False, 0)
 
+        # Sticky mode: stay open after pasting, for several pastes per launch
+        self.sticky_check = Gtk.CheckButton(label="Keep open after pasting")
+        self.sticky_check.set_active(self.config["settings"].get("sticky_popup", DEFAULT_STICKY_POPUP))
+        self.main_box.pack_start(self.sticky_check, False, False, 0)
+
         # Handle Escape key and scroll
         self.connect("key-press-event", self.on_key_press)
         self.connect("scroll-event", self.on_scroll)
         # Close on focus out
         self.connect("focus-out-event", self.on_focus_out)
 
+        if tracer.path:
+            self.first_draw_id = self.connect("draw", self.on_first_draw)
         self.show_all()
         self.position_at_cursor()
+        self.search_entry.grab_focus()
+        if self.previous_window_id:
+            GLib.idle_add(self.load_paste_timing)
+        self.refresh_directories(self.directories)
+
+    def on_first_draw(self, widget, cr):
+        self.disconnect(self.first_draw_id)
+        tracer.complete("first_frame", self.started_ns)
+        return False
+
+    def track_target_window(self):
+        window_id = get_active_window()
+        if window_id and window_id != self.previous_window_id:
+            self.previous_window_id = window_id
+            self.previous_app = get_window_app(window_id)
+        return False
+
+    def load_paste_timing(self):
+        """Resolve the target app and its learned timing off the first frame."""
+        self.previous_app = get_window_app(self.previous_window_id)
+        self.paste_timings = PasteTimings()
+        return False
+
+    def get_frequent_keys(self):
+        """Resolve the most used snippets, or none if the section is off."""
+        if not self.config["settings"].get("frequent_section", DEFAULT_FREQUENT_SECTION):
+            return []
+        return self.usage_log.top(self.config, get_store().loaded_version)
+
+    def page_order(self):
+        """Section indexes in scroll order, the Frequent section first."""
+        order = list(range(len(self.config["sections"])))
+        if self.frequent_keys:
+            order.insert(0, FREQUENT_SECTION_IDX)
+        return order
 
     def get_section_header(self):
         """Get formatted section header."""
-        section = self.config["sections"][self.current_section_idx]
-        total = len(self.config["sections"])
-        if total > 1:
-            return f"<b>{section['name']}</b> ({self.current_section_idx + 1}/{total})"
-        return f"<b>{section['name']}</b>"
-
-    def rebuild_checkboxes(self):
-        """Rebuild checkbox list for current section."""
-        for child in self.checkbox_box.get_children():
-            self.checkbox_box.remove(child)
-
-        section = self.config["sections"][self.current_section_idx]
-
-        # Create checkboxes if not exist for this section
-        if not self.section_checkboxes[self.current_section_idx]:
-            for s in section["strings"]:
-                cb = Gtk.CheckButton(label=truncate(s, self.truncate_len))
-                cb.full_text = s
-                cb.connect("toggled", self.on_checkbox_toggled)
-                self.section_checkboxes[self.current_section_idx].append(cb)
-
-        # Add checkboxes to box
-        for cb in self.section_checkboxes[self.current_section_idx]:
-            self.checkbox_box.pack_start(cb, False, False, 0)
-
-        self.checkbox_box.show_all()
+        if self.current_section_idx == FREQUENT_SECTION_IDX:
+            name = "Frequent"
+        else:
+            name = self.config["sections"][self.current_section_idx]["name"]
+        order = self.page_order()
+        if len(order) > 1:
+            return f"<b>{name}</b> ({order.index(self.current_section_idx) + 1}/{len(order)})"
+        return f"<b>{name}</b>"
+
+    def get_section_store(self, section_idx):
+        """Return the list model for a section, creating it on first use.
+
+        Only the first screenful of rows is added right away; the rest
+        follows in chunks from an idle callback, so a large section shows
+        without walking every snippet first.
+        """
+        store = self.section_stores.get(section_idx)
+        if store is None:
+            store = Gtk.ListStore(bool, int)
+            self.section_stores[section_idx] = store
+            if self.fill_section_store(section_idx, store, POPUP_STORE_FIRST_ROWS):
+                GLib.idle_add(self.fill_section_store, section_idx, store)
+        return store
+
+    def fill_section_store(self, section_idx, store, limit=POPUP_STORE_CHUNK_ROWS):
+        """Append up to limit more rows to a section store; True while rows remain."""
+        if self.section_stores.get(section_idx) is not store:
+            return False  # Replaced by a config change
+        start = len(store)
+        end = min(len(self.config["sections"][section_idx]["strings"]), start + limit)
+        for row_idx in range(start, end):
+            selected = (section_idx, row_idx) in self.selection
+            store.insert_with_valuesv(-1, [0, 1], [selected, row_idx])
+        return end < len(self.config["sections"][section_idx]["strings"])
+
+    def get_preview(self, section_idx, row_idx):
+        key = (section_idx, row_idx)
+        preview = self.previews.get(key)
+        if preview is None:
+            strings = self.config["sections"][section_idx]["strings"]
+            if isinstance(strings, (PackedStrings, DirectoryStrings)):
+                preview = strings.preview(row_idx)
+            else:
+                preview = truncate(strings[row_idx], self.truncate_len)
+            self.previews[key] = preview
+        return preview
+
+    def render_preview(self, column, renderer, model, tree_iter, section_idx):
+        renderer.set_property("text", self.get_preview(section_idx, model[tree_iter][1]))
+
+    def list_width(self, section_idx):
+        """Estimate the list width from the first rows of a section."""
+        if section_idx == FREQUENT_SECTION_IDX:
+            keys = self.frequent_keys
+        else:
+            rows = range(min(len(self.config["sections"][section_idx]["strings"]), POPUP_WIDTH_SAMPLE_ROWS))
+            keys = [(section_idx, row_idx) for row_idx in rows]
+        layout = self.create_pango_layout("")
+        width = POPUP_MIN_LIST_WIDTH
+        for key in keys:
+            layout.set_text(self.get_preview(*key), -1)
+            width = max(width, layout.get_pixel_size()[0] + 16)
+        return width
+
+    def build_list_page(self, store, render_func, section_idx, on_activated, name, width):
+        """Build a scrolled toggle list page in the stack."""
+        tree = Gtk.TreeView(model=store)
+        tree.set_headers_visible(False)
+        tree.set_fixed_height_mode(True)
+        tree.set_activate_on_single_click(True)
+        tree.connect("row-activated", on_activated, section_idx)
+        # Wheel over the list switches sections, as over the rest of the popup
+        tree.connect("scroll-event", self.on_scroll)
+
+        toggle_renderer = Gtk.CellRendererToggle()
+        toggle_column = Gtk.TreeViewColumn("", toggle_renderer, active=0)
+        toggle_column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        toggle_column.set_fixed_width(28)
+        tree.append_column(toggle_column)
+
+        text_renderer = Gtk.CellRendererText()
+        text_column = Gtk.TreeViewColumn("", text_renderer)
+        text_column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        text_column.set_fixed_width(width)
+        text_column.set_cell_data_func(text_renderer, render_func, section_idx)
+        tree.append_column(text_column)
+
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scroll.set_max_content_height(300)
+        scroll.set_propagate_natural_height(True)
+        scroll.add(tree)
+        scroll.show_all()
+        self.stack.add_named(scroll, name)
+        return scroll
+
+    def build_section_page(self, section_idx):
+        """Build the scrolled list page for one section."""
+        if section_idx == FREQUENT_SECTION_IDX:
+            self.frequent_store = Gtk.ListStore(bool, int, int)
+            for key in self.frequent_keys:
+                self.frequent_store.insert_with_valuesv(-1, [0, 1, 2], [key in self.selection, *key])
+            page = self.build_list_page(
+                self.frequent_store,
+                self.render_search_result,
+                None,
+                self.on_key_row_activated,
+                "frequent",
+                self.list_width(section_idx),
+            )
+            self.section_pages[section_idx] = page
+            return page
+
+        page = self.build_list_page(
+            self.get_section_store(section_idx),
+            self.render_preview,
+            section_idx,
+            self.on_row_activated,
+            str(section_idx),
+            self.list_width(section_idx),
+        )
+        self.section_pages[section_idx] = page
+        return page
+
+    def show_current_section(self):
+        """Flip the stack to the current section's page."""
+        page = self.section_pages.get(self.current_section_idx)
+        if page is None:
+            page = self.build_section_page(self.current_section_idx)
+        self.stack.set_visible_child(page)
         self.section_label.set_markup(self.get_section_header())
 
-    def on_checkbox_toggled(self, checkbox):
-        """Update counter when checkbox is toggled."""
+    def on_row_activated(self, tree, path, column, section_idx):
+        """Toggle a row's selection."""
+        row = tree.get_model()[path]
+        text = self.config["sections"][section_idx]["strings"][row[1]]
+        row[0] = self.selection.toggle((section_idx, row[1]), text)
+        if row[0]:
+            self.templates.prefetch(
+                text, not is_directory_section(self.config["sections"][section_idx])
+            )
+        self.sync_frequent_store((section_idx, row[1]), row[0])
+        self.update_counter()
+
+    def sync_frequent_store(self, key, selected):
+        if self.frequent_store is None:
+            return
+        for row in self.frequent_store:
+            if (row[1], row[2]) == key:
+                row[0] = selected
+
+    def start_search_index(self, saved=None):
+        """Load or build the search index for this config off the UI thread.
+
+        saved is the pending save of this config, whose version keys the index.
+        """
+        if get_store().has_fts:
+            return  # The store's full-text index answers searches
+        config = self.stored
+        version = get_store().version() if saved is None else None
+
+        def worker():
+            try:
+                index = SearchIndex.load_or_build(config, version if saved is None else saved.result())
+            except Exception:
+                index = SearchIndex(config)  # Unsaved, but search still works
+            GLib.idle_add(self.on_search_index_ready, config, index)
+
+        threading.Thread(target=worker, name="prompt-click-search-index", daemon=True).start()
+
+    def on_search_index_ready(self, config, index):
+        if config is self.stored:
+            self.search_index = index
+            if self.search_entry.get_text().strip():
+                self.on_search_changed(self.search_entry)
+        return False
+
+    def search(self, query):
+        tags, query = split_tag_query(query)
+        if tags:
+            return self.search_tagged(tags, query)
+        keys = self.search_stored(query)
+        # Directory sections are searched through their cached heads
+        for section_idx, section in enumerate(self.config["sections"]):
+            if len(keys) >= SEARCH_RESULT_LIMIT:
+                break
+            if is_directory_section(section):
+                rows = section["strings"].search(query, SEARCH_RESULT_LIMIT - len(keys))
+                keys.extend((section_idx, row_idx) for row_idx in rows)
+        return keys
+
+    def search_stored(self, query):
+        keys = get_store().search(query)
+        if keys is not None:
+            return list(keys)
+        if self.search_index is not None:
+            return self.search_index.search(query)
+        # Index still loading or query too short for the store: plain scan
+        needle = " ".join(query.lower().split())
+        hits = (
+            (section_idx, row_idx)
+            for section_idx, section in enumerate(self.stored["sections"])
+            for row_idx, text in enumerate(section["strings"])
+            if needle in search_head(text)
+        )
+        return list(itertools.islice(hits, SEARCH_RESULT_LIMIT))
+
+    def search_tagged(self, tags, query):
+        """Snippets carrying all tags, narrowed to those containing query."""
+        if self.tag_index is None:
+            self.tag_index = TagIndex(self.stored)
+        keys = self.tag_index.keys(tags)
+        needle = " ".join(query.lower().split())
+        if needle:
+            sections = self.config["sections"]
+            keys = [key for key in keys if needle in search_head(sections[key[0]]["strings"][key[1]])]
+        return keys
+
+    def render_search_result(self, column, renderer, model, tree_iter, _data):
+        section_idx, row_idx = model[tree_iter][1], model[tree_iter][2]
+        section_name = self.config["sections"][section_idx]["name"]
+        renderer.set_property("text", f"{section_name}: {self.get_preview(section_idx, row_idx)}")
+
+    def on_search_changed(self, entry):
+        """Show matches across all sections, or go back to the section view."""
+        query = entry.get_text()
+        if not query.strip():
+            self.show_current_section()
+            return
+
+        if self.search_store is None:
+            self.search_store = Gtk.ListStore(bool, int, int)
+            self.search_page = self.build_list_page(
+                self.search_store,
+                self.render_search_result,
+                None,
+                self.on_key_row_activated,
+                "search",
+                self.list_width(self.current_section_idx),
+            )
+
+        keys = self.search(query)
+        self.search_store.clear()
+        for key in keys:
+            self.search_store.insert_with_valuesv(-1, [0, 1, 2], [key in self.selection, *key])
+        self.stack.set_visible_child(self.search_page)
+        self.section_label.set_markup(f"<b>Search</b> ({len(keys)} matches)")
+
+    def on_key_row_activated(self, tree, path, column, _data):
+        """Toggle a search or Frequent row and mirror it in the other lists."""
+        row = tree.get_model()[path]
+        section_idx, row_idx = row[1], row[2]
+        text = self.config["sections"][section_idx]["strings"][row_idx]
+        row[0] = self.selection.toggle((section_idx, row_idx), text)
+        if row[0]:
+            self.templates.prefetch(
+                text, not is_directory_section(self.config["sections"][section_idx])
+            )
+        store = self.section_stores.get(section_idx)
+        if store is not None and row_idx < len(store):  # Later rows pick it up when added
+            store[row_idx][0] = row[0]
+        self.sync_frequent_store((section_idx, row_idx), row[0])
         self.update_counter()
 
+    def is_searching(self):
+        return bool(self.search_entry.get_text().strip())
+
     def update_counter(self):
         """Update the selected counter."""
-        total = sum(
-            sum(1 for cb in cbs if cb.get_active())
-            for cbs in self.section_checkboxes.values()
-        )
-        self.counter_label.set_text(f"Selected: {total}")
+        self.counter_label.set_text(f"Selected: {len(self.selection)}")
 
     def on_scroll(self, widget, event):
         """Handle mouse scroll to switch sections."""
-        if len(self.config["sections"]) <= 1:
+        if len(self.page_order()) <= 1 or self.is_searching():
             return False
 
         if event.direction == Gdk.ScrollDirection.UP:
-            self.current_section_idx = (self.current_section_idx - 1) % len(self.config["sections"])
-            self.rebuild_checkboxes()
-            return True
+            step = -1
         elif event.direction == Gdk.ScrollDirection.DOWN:
-            self.current_section_idx = (self.current_section_idx + 1) % len(self.config["sections"])
-            self.rebuild_checkboxes()
-            return True
+            step = 1
         elif event.direction == Gdk.ScrollDirection.SMOOTH:
             # Handle smooth scrolling (touchpad)
             _, dy = event.get_scroll_deltas()
             if dy < -0.5:
-                self.current_section_idx = (self.current_section_idx - 1) % len(self.config["sections"])
-                self.rebuild_checkboxes()
-                return True
+                step = -1
             elif dy > 0.5:
-                self.current_section_idx = (self.current_section_idx + 1) % len(self.config["sections"])
-                self.rebuild_checkboxes()
-                return True
+                step = 1
+            else:
+                return False
+        else:
+            return False
 
-        return False
+        # Coalesce all steps of one frame so intermediate pages are never laid out
+        self.pending_section_steps += step
+        if self.scroll_tick_id is None:
+            self.scroll_tick_id = self.add_tick_callback(self.apply_pending_scroll)
+        return True
+
+    def apply_pending_scroll(self, widget, frame_clock):
+        self.scroll_tick_id = None
+        steps, self.pending_section_steps = self.pending_section_steps, 0
+        if steps:
+            order = self.page_order()
+            position = order.index(self.current_section_idx)
+            self.current_section_idx = order[(position + steps) % len(order)]
+            self.show_current_section()
+        return GLib.SOURCE_REMOVE
 
     def position_at_cursor(self):
         """Position window at mouse cursor."""
@@ -831,68 +4290,325 @@ class PopupWindow(Gtk.Window):
 
         self.move(x, y)
 
-    def on_ok(self, button):
-        """Copy selected strings to clipboard and paste."""
-        selected = []
-        for cbs in self.section_checkboxes.values():
-            for cb in cbs:
-                if cb.get_active():
-                    selected.append(cb.full_text)
+    def is_sticky(self):
+        return self.sticky_check.get_active()
+
+    def on_ok(self, button, fill=False):
+        """Copy selected strings to clipboard and paste.
+
+        With fill, the snippets are pasted one at a time with the
+        form_fill_key setting pressed between them, moving through the
+        fields of a form. In sticky mode the popup only hides while the
+        paste lands, then comes back with an empty selection.
+        """
+        started_ns = time.monotonic_ns()
+        sticky = self.is_sticky()
+        selected = self.selection.texts()
+        used = [
+            (self.config["sections"][section_idx], row_idx, text)
+            for (section_idx, row_idx), text in self.selection.entries.items()
+        ]
 
         if selected:
-            text = ", ".join(selected)
-            copy_text_to_clipboards(text)
-
-            # Close window first
-            self.destroy()
-
-            # Restore focus and paste
-            if request_autopaste(text):
-                pass
-            elif self.previous_window_id:
-                time.sleep(0.1)
-                subprocess.run(["xdotool", "windowactivate", self.previous_window_id], check=False)
-                time.sleep(0.1)
-                subprocess.run(["xdotool", "key", "shift+Insert"], check=False)
+            # Placeholders still being computed finish while the popup closes
+            # Files in directory sections may come from anyone with push access
+            trusted = [
+                not is_directory_section(self.config["sections"][section_idx])
+                for section_idx, _row_idx in self.selection.entries
+            ]
+            expansion = self.templates.expand(selected, None if fill else ", ", trusted)
+            # The launcher owns the clipboard when it may type the text itself
+            direct_typing = self.external_autopaste and self.config["settings"].get(
+                "direct_typing", DEFAULT_DIRECT_TYPING
+            )
+            # Fields go through the clipboard one at a time
+            copy_first = not direct_typing and not fill
+            copied = False
+            if expansion.done() and copy_first:
+                with tracer.span("clipboard"):
+                    copy_text_to_clipboards(expansion.result())
+                copied = True
+
+            # Close window first and let the target window regain focus
+            with tracer.span("hide_popup"):
+                self.hide_until_unmapped()
+            with tracer.span("restore_focus"):
+                focus_confirmed = self.restore_previous_focus()
+            if not sticky:
+                self.destroy()
+
+            with tracer.span("expand"):
+                text = expansion.result()
+            fields = None
+            if fill:
+                fields, text = text, ", ".join(text)
+            if not copied and copy_first:
+                with tracer.span("clipboard"):
+                    copy_text_to_clipboards(text)
+
+            sequence = None
+            if sticky:
+                self.paste_sequence += 1
+                sequence = self.paste_sequence
+            separator = self.config["settings"].get("form_fill_key", DEFAULT_FORM_FILL_KEY)
+            with tracer.span("autopaste_request"):
+                requested = request_autopaste(text, focus_confirmed, direct_typing, sequence, fields, separator)
+            if requested:
+                if sticky:
+                    # Coming back before the paste lands would take the keystroke
+                    with tracer.span("wait_for_autopaste", sequence=sequence):
+                        wait_for_autopaste(sequence)
+            elif fill and focus_confirmed:
+                with tracer.span("fill_fields", fields=len(fields)):
+                    fill_fields(fields, separator)
             else:
-                notify_user("Copied to clipboard. Paste with Ctrl+V.")
+                if direct_typing or fill:
+                    with tracer.span("clipboard"):
+                        copy_text_to_clipboards(text)
+                with tracer.span("paste_keystroke"):
+                    pasted = focus_confirmed and wait_for_clipboard(text)
+                    if pasted:
+                        send_paste_keystroke()
+                if not pasted:
+                    notify_user("Copied to clipboard. Paste with Ctrl+V.")
+            tracer.complete("on_ok", started_ns, fill=fill, sticky=sticky)
+            # Logged after pasting to keep it off the paste latency
+            with tracer.span("usage_log"):
+                self.usage_log.record(used)
+            if sticky:
+                self.show_again()
+                return
         else:
             self.destroy()
         Gtk.main_quit()
 
+    def show_again(self):
+        """Bring the sticky popup back after a paste, with nothing selected."""
+        self.selection = SelectionModel()
+        for store in (*self.section_stores.values(), self.frequent_store, self.search_store):
+            if store is not None:
+                for row in store:
+                    row[0] = False
+        self.update_counter()
+        self.closing = False
+        self.present()
+        self.search_entry.grab_focus()
+        if self.reload_pending:
+            self.reload_pending = False
+            self.on_config_changed()
+
+    def hide_until_unmapped(self):
+        """Hide the popup and wait for the server to confirm the unmap."""
+        self.closing = True
+        unmapped = []
+        handler = self.connect("unmap-event", lambda *_args: unmapped.append(True))
+        self.hide()
+
+        expired = []
+        source = GLib.timeout_add(
+            int(POPUP_UNMAP_TIMEOUT_SECONDS * 1000),
+            lambda: expired.append(True) or False,
+        )
+        while not unmapped and not expired:
+            Gtk.main_iteration_do(True)
+        if not expired:
+            GLib.source_remove(source)
+        self.disconnect(handler)
+
+    def restore_previous_focus(self):
+        """Give focus back to the previous window; True once it is observed."""
+        if not self.previous_window_id:
+            return False
+        if self.paste_timings is None:
+            self.load_paste_timing()
+
+        started = time.monotonic()
+        if get_active_window() != self.previous_window_id:
+            activate_window(self.previous_window_id)
+        focused = wait_until(
+            lambda: get_active_window() == self.previous_window_id,
+            self.paste_timings.timeout_for(self.previous_app),
+        )
+        if focused:
+            self.paste_timings.record(self.previous_app, time.monotonic() - started)
+        return focused
+
     def on_cancel(self, button):
         self.destroy()
         Gtk.main_quit()
 
     def on_edit(self, button):
         """Open edit dialog."""
-        dialog = EditDialog(self, self.config)
+        dialog = EditDialog(self, self.stored)
+        self.editing = True
         response = dialog.run()
+        self.editing = False
 
         if response == Gtk.ResponseType.OK:
-            self.config = dialog.get_config()
-            self.truncate_len = self.config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
-            save_config(self.config)
-            # Reset checkboxes
-            self.section_checkboxes = {i: [] for i in range(len(self.config["sections"]))}
-            self.current_section_idx = min(self.current_section_idx, len(self.config["sections"]) - 1)
-            self.rebuild_checkboxes()
-            self.update_counter()
+            config = dialog.get_config()
+            self.reload_pending = False  # The save replaces outside changes
+            self.replace_config(config, save_config(config))
+        elif self.reload_pending:
+            self.reload_pending = False
+            self.on_config_changed()
 
         dialog.destroy()
 
+    def replace_config(self, config, saved=None, keep=()):
+        """Swap in a new stored config, keeping the pages of the sections in keep.
+
+        Directory sections are re-attached after the stored ones.
+        """
+        old_config = self.config
+        stored_changed = config is not self.stored or saved is not None
+        self.stored = config
+        self.truncate_len = config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+        self.templates.commands = config["settings"].get(
+            "template_commands", DEFAULT_TEMPLATE_COMMANDS
+        )
+        directory_settings = self.get_directory_settings(config)
+        if directory_settings != self.directory_settings:
+            self.directory_settings = directory_settings
+            self.directories = directory_sections(config["settings"], self.truncate_len)
+            keep = {section_idx for section_idx in keep if section_idx < len(config["sections"])}
+            if self.directories and self.directory_watcher is None:
+                try:
+                    self.directory_watcher = DirectoryWatcher(self.refresh_directories)
+                except OSError:
+                    pass
+            self.refresh_directories(self.directories)
+        self.config = with_directory_sections(config, self.directories)
+        self.selection.remap(old_config, self.config)
+        for section_idx in list(self.section_pages):
+            if section_idx not in keep:
+                self.section_pages.pop(section_idx).destroy()
+        self.section_stores = {
+            section_idx: store for section_idx, store in self.section_stores.items() if section_idx in keep
+        }
+        for section_idx, store in self.section_stores.items():
+            for row in store:
+                row[0] = (section_idx, row[1]) in self.selection
+        self.frequent_store = None
+        self.frequent_keys = self.get_frequent_keys()
+        self.previews = {key: preview for key, preview in self.previews.items() if key[0] in keep}
+        if stored_changed:
+            self.search_index = None
+            self.tag_index = None
+            self.start_search_index(saved)
+        self.current_section_idx = min(self.current_section_idx, len(self.config["sections"]) - 1)
+        if self.current_section_idx == FREQUENT_SECTION_IDX and not self.frequent_keys:
+            self.current_section_idx = 0
+        # Shows the current section, or refreshes the search results
+        self.on_search_changed(self.search_entry)
+        self.update_counter()
+
+    def on_config_changed(self):
+        """Reload the config in the background after it changed on disk."""
+        if self.closing:
+            if self.is_sticky():
+                self.reload_pending = True  # Reload once the popup is back
+            return
+        if self.editing:
+            self.reload_pending = True  # Reload if the edit is cancelled
+            return
+        store = get_store()
+        if store.version() == store.loaded_version:
+            return  # Our own save, or nothing new
+        self.reload_generation += 1
+        generation = self.reload_generation
+
+        def worker():
+            config = load_packed_config()
+            GLib.idle_add(self.on_config_reloaded, generation, config)
+
+        threading.Thread(target=worker, name="prompt-click-reload", daemon=True).start()
+
+    def on_config_reloaded(self, generation, config):
+        if generation != self.reload_generation or self.closing:
+            return False
+        if self.editing:
+            self.reload_pending = True
+            return False
+        keep = set()
+        if config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH) == self.truncate_len:
+            old_sections = self.stored["sections"]
+            keep = {
+                section_idx
+                for section_idx, (old, new) in enumerate(zip(old_sections, config["sections"]))
+                if old["name"] == new["name"] and strings_equal(old["strings"], new["strings"])
+            }
+            if len(old_sections) == len(config["sections"]):
+                keep.update(range(len(old_sections), len(self.config["sections"])))
+        self.replace_config(config, keep=keep)
+        return False
+
+    @staticmethod
+    def get_directory_settings(config):
+        settings = config["settings"]
+        return settings.get("directory_sections"), settings.get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+
+    def refresh_directories(self, directories):
+        """Re-index directory sections off the UI thread, one thread each."""
+        for directory in directories:
+            if directory not in self.directories:
+                continue  # Dropped from the settings
+            if directory.refreshing:
+                directory.stale = True
+                continue
+            directory.refreshing = True
+
+            def worker(directory=directory):
+                changed = True  # Redraw whatever a failed refresh left behind
+                try:
+                    if not directory.loaded:
+                        directory.load()
+                        GLib.idle_add(self.on_directory_refreshed, directory, bool(directory.entries), False)
+                    changed = directory.refresh()
+                finally:
+                    # Always clear refreshing, or the folder is never rescanned
+                    GLib.idle_add(self.on_directory_refreshed, directory, changed, True)
+
+            threading.Thread(target=worker, name="prompt-click-directory", daemon=True).start()
+
+    def on_directory_refreshed(self, directory, changed, done):
+        if done:
+            directory.refreshing = False
+        if self.closing or directory not in self.directories:
+            return False
+        if done and self.directory_watcher is not None:
+            self.directory_watcher.watch(directory)
+        if changed:
+            section_idx = len(self.stored["sections"]) + self.directories.index(directory)
+            keep = set(range(len(self.config["sections"]))) - {section_idx}
+            self.replace_config(self.stored, keep=keep)
+        if done and directory.stale:
+            directory.stale = False
+            self.refresh_directories([directory])
+        return False
+
     def on_key_press(self, widget, event):
         if event.keyval == Gdk.KEY_Escape:
+            if self.is_searching():
+                self.search_entry.set_text("")
+                return True
             self.destroy()
             Gtk.main_quit()
             return True
         return False
 
     def on_focus_out(self, widget, event):
+        # Paste in progress manages its own teardown
+        if self.closing:
+            return False
         # Don't close if edit dialog is open
         if any(isinstance(w, (EditDialog, StringEditDialog, SectionNameDialog, MoveToSectionDialog))
                for w in Gtk.Window.list_toplevels()):
             return False
+        if self.is_sticky():
+            # Paste into whichever window the user moved on to
+            if self.previous_window_id:
+                GLib.idle_add(self.track_target_window)
+            return False
         self.destroy()
         Gtk.main_quit()
         return False
@@ -906,14 +4622,51 @@ def parse_args():
         default=PASTE_MODE_AUTO,
         help="auto uses external auto-paste when available; otherwise X11 pastes locally and Wayland falls back to clipboard copy",
     )
+    parser.add_argument(
+        "--export-json",
+        metavar="PATH",
+        help="write all sections and snippets to a JSON file in the strings.json format and exit",
+    )
+    parser.add_argument(
+        "--import",
+        dest="import_path",
+        metavar="PATH",
+        help="add snippets from a folder of .txt/.md files (one section per subfolder), a .jsonl or a .csv file and exit; duplicates are skipped",
+    )
+    parser.add_argument(
+        "--export",
+        dest="export_path",
+        metavar="PATH",
+        help="write all snippets to an empty folder, a .jsonl or a .csv file and exit",
+    )
+    parser.add_argument(
+        "--section",
+        default=IMPORT_DEFAULT_SECTION,
+        help=f"section for imported snippets that do not name one (default: {IMPORT_DEFAULT_SECTION})",
+    )
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    win = PopupWindow(args.paste_mode)
+    if args.export_json:
+        JsonStore(os.path.abspath(args.export_json)).export(load_config())
+        return
+    try:
+        if args.import_path:
+            added, skipped = import_snippets(args.import_path, args.section)
+            print(f"Imported {added} snippets, skipped {skipped} duplicates")
+            return
+        if args.export_path:
+            print(f"Exported {export_snippets(args.export_path)} snippets")
+            return
+    except (OSError, ValueError, csv.Error, sqlite3.Error) as exc:
+        raise SystemExit(f"prompt_click: {exc}")
+    with tracer.span("popup_init"):
+        win = PopupWindow(args.paste_mode)
     win.connect("destroy", Gtk.main_quit)
     Gtk.main()
+    fold_config_journal()
 
 
 if __name__ == "__main__":
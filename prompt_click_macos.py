@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
+import fcntl
+import hashlib
+import heapq
+import itertools
 import json
 import os
+import pickle
+import select
+import shutil
+import socket
 import subprocess
 import sys
+import threading
+import time
+from array import array
+from collections.abc import Sequence
+from concurrent.futures import Future
 from pathlib import Path
 
 
@@ -11,15 +25,38 @@ CONFIG_FILE = Path(os.environ.get(
     "PROMPT_CLICK_CONFIG",
     os.path.expanduser("~/.config/prompt_click/strings.json"),
 ))
+CACHE_DIR = Path.home() / "Library" / "Caches" / "PromptClick"
+SEARCH_INDEX_FILE = str(CACHE_DIR / "search_index.pickle")
+PREVIEW_CACHE_FILE = str(CACHE_DIR / "previews.pickle")
+CONFIG_SNAPSHOT_FILE = str(CACHE_DIR / "config.pickle")
+DIRECTORY_INDEX_DIR = str(CACHE_DIR / "directories")
+DIRECTORY_FILE_EXTENSIONS = (".txt", ".md", ".markdown")
+JOURNAL_COMPACT_ENTRIES = 50
+CONFIG_RELOAD_DEBOUNCE_MS = 200
+SEARCH_INDEX_CHARS = 200
+SEARCH_RESULT_LIMIT = 50
 DEFAULT_TRUNCATE_LENGTH = 100
+DEFAULT_FREQUENT_SECTION = True
+USAGE_LOG_FILE = str(CONFIG_FILE.parent / "usage.log")
+USAGE_COMPACT_LINES = 1000
+FRECENCY_HALF_LIFE_SECONDS = 7 * 24 * 3600
+FREQUENT_SECTION_SIZE = 20
 PASTE_MODE_AUTO = "auto"
 PASTE_MODE_COPY = "copy"
 AUTOPASTE_TRIGGER_PATH = os.environ.get("PROMPT_CLICK_AUTOPASTE_TRIGGER")
 AUTOPASTE_TRIGGER_TOKEN = os.environ.get("PROMPT_CLICK_AUTOPASTE_TOKEN")
+DAEMON_SOCKET_PATH = os.environ.get(
+    "PROMPT_CLICK_DAEMON_SOCKET",
+    os.path.expanduser("~/Library/Caches/PromptClick/daemon.sock"),
+)
+DAEMON_CHANNEL_TIMEOUT_SECONDS = 1.0
+CONFIG_SCHEMA_VERSION = 3
+TAG_PREFIX = "#"
 
 DEFAULT_CONFIG = {
     "settings": {
-        "truncate_length": DEFAULT_TRUNCATE_LENGTH
+        "truncate_length": DEFAULT_TRUNCATE_LENGTH,
+        "frequent_section": DEFAULT_FREQUENT_SECTION
     },
     "sections": [
         {
@@ -45,31 +82,89 @@ def apply_config_migrations(config):
         section.setdefault("name", f"Section {idx}")
         section.setdefault("strings", [])
 
+    # Schema 2: a stable id per snippet, and tags or other metadata for some
+    # ids. Schema 3 files store each snippet as {"id", "text"}, so ids move
+    # with their text when snippets are inserted or reordered by hand;
+    # schema 2 files kept them in a parallel "ids" list. Missing or clashing
+    # ids are numbered in document order, so re-reading an older file gives
+    # the same ids.
+    for section in config["sections"]:
+        strings = section["strings"]
+        if any(isinstance(entry, dict) for entry in strings):
+            section["ids"] = [entry.get("id") if isinstance(entry, dict) else None for entry in strings]
+            section["strings"] = [
+                entry.get("text", "") if isinstance(entry, dict) else entry for entry in strings
+            ]
+    next_id = config.get("next_id")
+    if not is_snippet_id(next_id):
+        next_id = 1
+    for section in config["sections"]:
+        ids = section.get("ids")
+        if isinstance(ids, list) and ids:
+            next_id = max(next_id, max((i for i in ids if is_snippet_id(i)), default=0) + 1)
+    seen = set()
+    for section in config["sections"]:
+        ids = section.get("ids")
+        if not isinstance(ids, list) or len(ids) != len(section["strings"]):
+            ids = [None] * len(section["strings"])
+        fixed = []
+        for snippet_id in ids:
+            if not is_snippet_id(snippet_id) or snippet_id in seen:
+                snippet_id = next_id
+                next_id += 1
+            seen.add(snippet_id)
+            fixed.append(snippet_id)
+        section["ids"] = fixed
+    snippets = config.get("snippets")
+    config["snippets"] = {
+        key: info
+        for key, info in (snippets.items() if isinstance(snippets, dict) else ())
+        if isinstance(info, dict) and key.isdigit() and int(key) in seen
+    }
+    config["next_id"] = next_id
+    config["schema"] = CONFIG_SCHEMA_VERSION
+
     return config
 
 
-def load_config():
-    if CONFIG_FILE.exists():
-        try:
-            with CONFIG_FILE.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-
-            if isinstance(data, list):
-                return apply_config_migrations({
-                    "settings": DEFAULT_CONFIG["settings"].copy(),
-                    "sections": [{"name": "General", "strings": data}]
-                })
-
-            if "strings" in data and "sections" not in data:
-                return apply_config_migrations({
-                    "settings": data.get("settings", DEFAULT_CONFIG["settings"].copy()),
-                    "sections": [{"name": "General", "strings": data["strings"]}]
-                })
-
-            return apply_config_migrations(data)
-        except (OSError, json.JSONDecodeError):
-            pass
+def is_snippet_id(value):
+    return type(value) is int and value > 0
+
+
+def config_from_data(data):
+    if isinstance(data, list):
+        return apply_config_migrations({
+            "settings": DEFAULT_CONFIG["settings"].copy(),
+            "sections": [{"name": "General", "strings": data}]
+        })
+
+    if "strings" in data and "sections" not in data:
+        return apply_config_migrations({
+            "settings": data.get("settings", DEFAULT_CONFIG["settings"].copy()),
+            "sections": [{"name": "General", "strings": data["strings"]}]
+        })
+
+    return apply_config_migrations(data)
+
 
+def config_to_data(config):
+    """Return config as strings.json stores it, each id next to its text."""
+    return {
+        **config,
+        "sections": [
+            {
+                **{key: value for key, value in section.items() if key != "ids"},
+                "strings": [
+                    {"id": snippet_id, "text": text}
+                    for snippet_id, text in zip(section["ids"], section["strings"])
+                ],
+            }
+            for section in config["sections"]
+        ],
+    }
+
+
+def default_config():
     return apply_config_migrations({
         "settings": DEFAULT_CONFIG["settings"].copy(),
         "sections": [
@@ -82,19 +177,1680 @@ def load_config():
     })
 
 
+def journal_entry(old, new):
+    """Describe new as a change of old, or return None if they are equal.
+
+    Sections whose strings and ids did not change are referenced by their
+    index in old; only edited sections carry them. The snippet metadata is
+    only written when it changed.
+    """
+    by_content = {}  # {(count, first string): [old section index, ...]}
+    for idx, section in enumerate(old["sections"]):
+        strings = section["strings"]
+        by_content.setdefault((len(strings), strings[0] if strings else None), []).append(idx)
+
+    items = []
+    unchanged = new["settings"] == old["settings"] and len(new["sections"]) == len(old["sections"])
+    for idx, section in enumerate(new["sections"]):
+        strings = section["strings"]
+        candidates = by_content.get((len(strings), strings[0] if strings else None), [])
+        if idx in candidates:
+            candidates = [idx] + candidates  # Prefer the same position
+        origin = next(
+            (
+                i for i in candidates
+                if old["sections"][i]["strings"] == strings
+                and old["sections"][i].get("ids") == section["ids"]
+            ),
+            None,
+        )
+        if origin is None:
+            items.append({"name": section["name"], "strings": list(strings), "ids": list(section["ids"])})
+            unchanged = False
+        else:
+            items.append({"name": section["name"], "from": origin})
+            unchanged = unchanged and origin == idx and section["name"] == old["sections"][idx]["name"]
+    entry = {"settings": new["settings"], "next_id": new["next_id"], "sections": items}
+    if new["snippets"] != old.get("snippets"):
+        entry["snippets"] = new["snippets"]
+        unchanged = False
+    if unchanged and new["next_id"] == old.get("next_id"):
+        return None
+    return entry
+
+
+def apply_journal_entry(config, entry):
+    sections = config["sections"]
+    return {
+        "settings": entry["settings"],
+        "sections": [
+            {
+                "name": item["name"],
+                "strings": sections[item["from"]]["strings"] if "from" in item else item["strings"],
+                "ids": sections[item["from"]].get("ids") if "from" in item else item.get("ids"),
+            }
+            for item in entry["sections"]
+        ],
+        "next_id": entry.get("next_id", config.get("next_id")),
+        "snippets": entry.get("snippets", config.get("snippets")),
+    }
+
+
+def renumber_config(config, renumbered):
+    """config with its snippet ids mapped through renumbered."""
+    sections = [
+        {**section, "ids": [renumbered.get(snippet_id, snippet_id) for snippet_id in section["ids"]]}
+        if any(snippet_id in renumbered for snippet_id in section["ids"]) else section
+        for section in config["sections"]
+    ]
+    snippets = {
+        str(renumbered.get(int(key), int(key))): info for key, info in config.get("snippets", {}).items()
+    }
+    return {**config, "sections": sections, "snippets": snippets}
+
+
+def merge_configs(base, ours, theirs, renumbered=None):
+    """Apply the changes from base to ours on top of theirs.
+
+    Used when another process saved since base was loaded. Snippets are
+    matched by id. In the sections ours changed, its order, additions,
+    edits and deletions win; snippets it left untouched keep their text
+    from theirs, or stay deleted if theirs deleted them, and snippets theirs
+    added follow. Sections ours did not change are taken from theirs. New
+    ids that both sides handed out are renumbered on ours' side.
+
+    Returns (merged config, renumbered), where renumbered maps ours' ids to
+    the ids they were saved under. Pass it back for the next merge of a
+    config that still uses ours' ids.
+    """
+    renumbered = dict(renumbered or {})
+    if renumbered:
+        base = renumber_config(base, renumbered)
+        ours = renumber_config(ours, renumbered)
+    base_ids = {snippet_id for section in base["sections"] for snippet_id in section["ids"]}
+    base_sections = {}
+    for section in base["sections"]:
+        base_sections.setdefault(section["name"], section)
+    ours_names = {section["name"] for section in ours["sections"]}
+
+    def changed(section):
+        old = base_sections.get(section["name"])
+        if old is None:
+            return True
+        if old["strings"] is section["strings"] and old["ids"] is section["ids"]:
+            return False
+        return list(old["ids"]) != list(section["ids"]) or list(old["strings"]) != list(section["strings"])
+
+    touched = [section for section in ours["sections"] if changed(section)]
+    touched_names = {section["name"] for section in touched}
+    removed_names = set(base_sections) - ours_names
+    base_text = {}  # {id: text} in the base sections ours changed or removed
+    for name in touched_names | removed_names:
+        if name in base_sections:
+            base_text.update(zip(base_sections[name]["ids"], base_sections[name]["strings"]))
+
+    theirs_text = {}
+    for section in theirs["sections"]:
+        theirs_text.update(zip(section["ids"], section["strings"]))
+    next_id = max(ours.get("next_id", 1), theirs.get("next_id", 1))
+    new_ids = {}
+    for section in touched:
+        for snippet_id in section["ids"]:
+            if snippet_id not in base_ids and snippet_id in theirs_text and snippet_id not in new_ids:
+                new_ids[snippet_id] = next_id
+                next_id += 1
+
+    placed = set(base_text)  # Ids whose place ours decides.
+    ours_entries = {}
+    for section in touched:
+        entries = []
+        for snippet_id, text in zip(section["ids"], section["strings"]):
+            if snippet_id not in new_ids:
+                placed.add(snippet_id)
+            if snippet_id in base_text and text == base_text[snippet_id]:
+                if snippet_id not in theirs_text:
+                    continue  # Deleted by theirs.
+                text = theirs_text[snippet_id]
+            entries.append((new_ids.get(snippet_id, snippet_id), text))
+        ours_entries.setdefault(section["name"], entries)
+
+    sections = []
+    theirs_names = set()
+    for section in theirs["sections"]:
+        name = section["name"]
+        rest = [entry for entry in zip(section["ids"], section["strings"]) if entry[0] not in placed]
+        if name in touched_names and name not in theirs_names:
+            entries = ours_entries[name] + rest
+        elif name in removed_names:
+            entries = [entry for entry in rest if entry[0] not in base_ids]  # Added by theirs.
+            if not entries:
+                continue
+        elif len(rest) == len(section["ids"]):
+            sections.append(section)
+            theirs_names.add(name)
+            continue
+        else:
+            entries = rest
+        theirs_names.add(name)
+        sections.append({
+            "name": name,
+            "strings": [text for _snippet_id, text in entries],
+            "ids": [snippet_id for snippet_id, _text in entries],
+        })
+    for idx, section in enumerate(ours["sections"]):
+        name = section["name"]
+        if name in touched_names and name not in theirs_names:
+            theirs_names.add(name)
+            entries = ours_entries[name]
+            sections.insert(min(idx, len(sections)), {
+                "name": name,
+                "strings": [text for _snippet_id, text in entries],
+                "ids": [snippet_id for snippet_id, _text in entries],
+            })
+
+    def merge_dict(base_items, ours_items, theirs_items):
+        merged = dict(theirs_items)
+        for key in base_items.keys() | ours_items.keys():
+            if key not in ours_items:
+                merged.pop(key, None)
+            elif key not in base_items or ours_items[key] != base_items[key]:
+                merged[key] = ours_items[key]
+        return merged
+
+    ours_snippets = {str(new_ids.get(int(key), int(key))): info for key, info in ours.get("snippets", {}).items()}
+    snippets = merge_dict(base.get("snippets", {}), ours_snippets, theirs.get("snippets", {}))
+    kept = {str(snippet_id) for section in sections for snippet_id in section["ids"]}
+    renumbered.update(new_ids)
+    return {
+        **theirs,
+        "settings": merge_dict(base["settings"], ours["settings"], theirs["settings"]),
+        "sections": sections,
+        "next_id": next_id,
+        "snippets": {key: info for key, info in snippets.items() if key in kept},
+    }, renumbered
+
+
+def config_version(path):
+    """Cheap identity of the config file contents, or None if missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class ConfigJournal:
+    """strings.json plus an append-only journal of the saves since.
+
+    A save appends one fsynced line (see journal_entry) instead of
+    rewriting the file. After JOURNAL_COMPACT_ENTRIES lines, or once the
+    journal outgrows the file, both are folded into strings.json through a
+    temp file, fsync and rename. The journal starts with the digest of the
+    file it applies to; one left behind by a crash during compaction or by
+    an outside edit of strings.json is moved aside with a notification
+    instead of being applied. A torn last line is dropped. Readers and
+    writers hold an advisory lock, and a save merges with any other
+    process's save since this one loaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.loaded_version = None
+        self.loaded_config = None  # The config of loaded_version, the base of a merge.
+        self.renumbered = {}  # Ids of that config renumbered by merges since.
+
+    @contextlib.contextmanager
+    def locked(self, operation):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, operation)
+            yield  # Closing the file releases the lock
+
+    def version(self):
+        """Identity of the file and its journal, or None if the file is missing."""
+        base = config_version(self.path)
+        journal = config_version(self.journal_path)
+        if base is None or journal is None:
+            return base
+        return f"{base}:{journal}"
+
+    def digest(self):
+        digest = hashlib.blake2b(digest_size=16)
+        for path in (self.path, self.journal_path):
+            try:
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return None
+        return digest.digest()
+
+    def read(self):
+        """Return (config, state), with config None if the file is missing.
+
+        Raises OSError or ValueError if strings.json cannot be read.
+        Call with the lock held.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None, None
+        config = config_from_data(json.loads(raw))
+        state = {
+            "base": hashlib.blake2b(raw, digest_size=16).hexdigest(),
+            "base_size": len(raw),
+            "entries": 0,
+            "end": 0,  # Journal offset after the last valid line
+        }
+        try:
+            with open(self.journal_path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+        except FileNotFoundError:
+            lines = []
+        try:
+            if lines and json.loads(lines[0]).get("base") == state["base"]:
+                state["end"] = len(lines[0])
+                for line in lines[1:]:
+                    if not line.endswith(b"\n"):
+                        break  # Torn by a crash mid-append
+                    config = apply_journal_entry(config, json.loads(line))
+                    state["entries"] += 1
+                    state["end"] += len(line)
+            elif len(lines) > 1:
+                self.set_aside(sum(1 for line in lines[1:] if line.endswith(b"\n")))
+        except (ValueError, AttributeError, LookupError, TypeError):
+            pass  # Keep the entries read so far
+        return apply_config_migrations(config), state
+
+    def set_aside(self, entries):
+        """Keep a journal that no longer applies to strings.json, and say so."""
+        orphaned_path = f"{self.journal_path}.orphaned"
+        try:
+            os.replace(self.journal_path, orphaned_path)
+        except OSError:
+            return  # Already moved by another reader.
+        notify_user(
+            f"{self.path} was changed outside Prompt Click, so its journal no longer"
+            f" applies ({entries} saves). It was kept as {orphaned_path}."
+        )
+
+    def write(self, config, current, state):
+        """Record config over the current one read under the same lock.
+
+        Returns False if nothing changed.
+        """
+        if current is None or state is None:
+            self.compact(config)
+            return True
+        entry = journal_entry(current, config)
+        if entry is None:
+            return False
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        if state["entries"] + 1 >= JOURNAL_COMPACT_ENTRIES or state["end"] + len(line) > state["base_size"]:
+            self.compact(config)
+        elif state["end"] == 0:
+            header = (json.dumps({"base": state["base"]}) + "\n").encode("utf-8")
+            self.replace(self.journal_path, header + line)
+        else:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(state["end"])
+                f.seek(state["end"])
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def compact(self, config):
+        data = config_to_data(config)
+        self.replace(self.path, json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"))
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.journal_path)
+
+    @staticmethod
+    def replace(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        dir_fd = os.open(os.path.dirname(path), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+config_journal = ConfigJournal(str(CONFIG_FILE))
+
+
+class ConfigSnapshot:
+    """Migrated config plus previews, pickled and checked against strings.json.
+
+    strings.json and its journal stay the source of truth. A snapshot is
+    trusted when their mtimes and sizes match, or, if those moved, when
+    their contents still hash the same.
+    """
+
+    FORMAT = 3
+
+    def __init__(self, config, source=None, previews=None):
+        self.config = config
+        self.source = source  # (config_journal version, digest)
+        self.previews = previews  # (truncate_len, [[preview, ...], ...])
+
+    @classmethod
+    def load(cls, version, path=CONFIG_SNAPSHOT_FILE):
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            if not isinstance(state, dict) or state.get("format") != cls.FORMAT:
+                return None
+            snapshot = cls(state["config"], state["source"], state["previews"])
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+            return None
+
+        snapshot_version, digest = snapshot.source
+        if snapshot_version == version:
+            return snapshot
+        if digest is None or config_journal.digest() != digest:
+            return None
+        snapshot.source = (version, digest)
+        snapshot.save(path)
+        return snapshot
+
+    def save(self, path=CONFIG_SNAPSHOT_FILE):
+        if self.previews is None:
+            truncate_len = self.config["settings"].get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+            self.previews = (truncate_len, [
+                [truncate(text, truncate_len) for text in section["strings"]]
+                for section in self.config["sections"]
+            ])
+        state = {
+            "format": self.FORMAT,
+            "source": self.source,
+            "config": self.config,
+            "previews": self.previews,
+        }
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def section_previews(self, section_idx, truncate_len):
+        """Stored previews of a section, or None if they do not apply."""
+        if self.previews is None or self.previews[0] != truncate_len:
+            return None
+        sections = self.previews[1]
+        if section_idx >= len(sections):
+            return None
+        previews = sections[section_idx]
+        if len(previews) != len(self.config["sections"][section_idx]["strings"]):
+            return None
+        return previews
+
+
+def read_config_snapshot():
+    """Return (snapshot, version), replaying strings.json only when the snapshot is stale.
+
+    Safe to call off the Tk thread; adopt_config_snapshot makes the result
+    the config that later saves are merged against.
+    """
+    version = config_journal.version()
+    snapshot = ConfigSnapshot.load(version) if version is not None else None
+    if snapshot is not None:
+        return snapshot, version
+    with config_journal.locked(fcntl.LOCK_SH):
+        version = config_journal.version()
+        digest = config_journal.digest()
+        try:
+            config, _state = config_journal.read()
+        except (OSError, ValueError, TypeError) as exc:
+            keep_unreadable_config(exc)
+            config = None
+    if config is None:
+        snapshot = ConfigSnapshot(default_config())
+    else:
+        snapshot = ConfigSnapshot(config, (version, digest))
+        snapshot.save()
+    return snapshot, version
+
+
+def adopt_config_snapshot(snapshot, version):
+    config_journal.loaded_version = version
+    config_journal.loaded_config = snapshot.config
+    config_journal.renumbered = {}
+    return snapshot
+
+
+def load_config_snapshot():
+    """Load the config, replaying strings.json only when its snapshot is stale."""
+    return adopt_config_snapshot(*read_config_snapshot())
+
+
+def keep_unreadable_config(error):
+    """Copy an unreadable strings.json aside before the defaults replace it."""
+    backup = f"{CONFIG_FILE}.corrupt"
+    try:
+        shutil.copy2(CONFIG_FILE, backup)
+    except OSError:
+        backup = None
+    notify_user(
+        f"Could not read {CONFIG_FILE} ({error}); starting with the default snippets."
+        + (f" The old file was kept as {backup}." if backup else "")
+    )
+
+
+def load_config():
+    return load_config_snapshot().config
+
+
+def write_config(config):
+    """Journal config and refresh its snapshot; returns the new version.
+
+    If another process saved since the config was loaded, the changes are
+    merged into its save instead and the old version is returned, so the
+    picker reloads the merged config and its next save merges again.
+    """
+    with config_journal.locked(fcntl.LOCK_EX):
+        loaded_version = config_journal.loaded_version
+        loaded_config = config_journal.loaded_config
+        version = config_journal.version()
+        try:
+            current, state = config_journal.read()
+        except (OSError, ValueError, TypeError):
+            current, state = None, None  # Unreadable: rewrite it whole.
+        config_journal.loaded_config = config
+        merged = (
+            current is not None and loaded_config is not None
+            and loaded_version is not None and version != loaded_version
+        )
+        if merged:
+            notify_user("Snippets were changed in another Prompt Click window; merged your changes into theirs.")
+            config_merged, config_journal.renumbered = merge_configs(
+                loaded_config, config, current, config_journal.renumbered
+            )
+            config_journal.write(config_merged, current, state)
+            config_journal.loaded_version = version
+            return version
+        config_journal.renumbered = {}
+        changed = config_journal.write(config, current, state)
+        version = config_journal.loaded_version = config_journal.version()
+        if changed:
+            ConfigSnapshot(config, (version, config_journal.digest())).save()
+    return version
+
+
+class ConfigWriter:
+    """Saves configs on a background thread, one at a time.
+
+    A save queued while another runs replaces any older queued config. The
+    thread is not a daemon, so the process only exits once the last save
+    has landed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None  # (config, [Future, ...])
+        self.thread = None
+
+    def save(self, config):
+        """Queue config and return a Future of the new config version.
+
+        The Future resolves to None if the save failed.
+        """
+        future = Future()
+        with self.lock:
+            futures = self.pending[1] if self.pending else []
+            futures.append(future)
+            self.pending = (config, futures)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="prompt-click-save")
+                self.thread.start()
+        return future
+
+    def run(self):
+        while True:
+            with self.lock:
+                if self.pending is None:
+                    self.thread = None
+                    return
+                config, futures = self.pending
+                self.pending = None
+            version = None
+            try:
+                version = write_config(config)
+            except Exception as exc:  # Report and keep serving later saves
+                notify_user(f"Could not save snippets: {exc}")
+            for future in futures:
+                future.set_result(version)
+
+    def join(self):
+        """Wait for the queued saves to land."""
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+
+
+config_writer = ConfigWriter()
+
+
 def save_config(config):
-    CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with CONFIG_FILE.open("w", encoding="utf-8") as f:
-        json.dump(config, f, ensure_ascii=False, indent=2)
+    """Save config off the calling thread; see ConfigWriter.save."""
+    return config_writer.save(config)
+
+
+def fold_config_journal():
+    """Fold the journal into strings.json once the last save has landed.
+
+    Run on exit, so scripts and hand edits of strings.json see every save.
+    """
+    config_writer.join()
+    with config_journal.locked(fcntl.LOCK_EX):
+        try:
+            config, state = config_journal.read()
+        except (OSError, ValueError, TypeError):
+            return
+        if config is None or not state["entries"]:
+            return
+        config_journal.compact(config)
+        ConfigSnapshot(config, (config_journal.version(), config_journal.digest())).save()
+
+
+class ConfigWatcher:
+    """Calls back on the Tk loop once the config files stop changing.
+
+    kqueue watches the config directory, where saves rename files into
+    place, and the journal, which saves append to; the journal is watched
+    anew whenever the directory changes. Bursts of events within
+    CONFIG_RELOAD_DEBOUNCE_MS collapse into one callback. Raises OSError
+    if the directory cannot be watched.
+    """
+
+    NOTES = select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME
+
+    def __init__(self, tk, root, callback, path=str(CONFIG_FILE)):
+        self.tk = tk
+        self.root = root
+        self.callback = callback
+        self.journal_path = f"{path}.journal"
+        self.kqueue = select.kqueue()
+        self.dir_fd = os.open(os.path.dirname(path), getattr(os, "O_EVTONLY", os.O_RDONLY))
+        self.journal_fd = None
+        self.after_id = None
+        self.register(self.dir_fd)
+        self.watch_journal()
+        root.tk.createfilehandler(self.kqueue.fileno(), tk.READABLE, self.on_events)
+
+    def register(self, fd):
+        event = select.kevent(
+            fd, select.KQ_FILTER_VNODE, select.KQ_EV_ADD | select.KQ_EV_CLEAR, self.NOTES
+        )
+        self.kqueue.control([event], 0)
+
+    def watch_journal(self):
+        # Closing a descriptor drops its kevent.
+        if self.journal_fd is not None:
+            os.close(self.journal_fd)
+            self.journal_fd = None
+        try:
+            self.journal_fd = os.open(self.journal_path, getattr(os, "O_EVTONLY", os.O_RDONLY))
+        except OSError:
+            return
+        self.register(self.journal_fd)
+
+    def on_events(self, _fd, _mask):
+        events = self.kqueue.control(None, 32, 0)
+        if any(event.ident == self.dir_fd for event in events):
+            self.watch_journal()
+        if events:
+            if self.after_id is not None:
+                self.root.after_cancel(self.after_id)
+            self.after_id = self.root.after(CONFIG_RELOAD_DEBOUNCE_MS, self.on_settled)
+
+    def on_settled(self):
+        self.after_id = None
+        self.callback()
+
+    def close(self):
+        self.root.tk.deletefilehandler(self.kqueue.fileno())
+        if self.journal_fd is not None:
+            os.close(self.journal_fd)
+        os.close(self.dir_fd)
+        self.kqueue.close()
+
+
+class DirectoryWatcher:
+    """Calls back on the Tk loop with the directory sections whose folders changed.
+
+    kqueue watches each folder of a section's tree, which sees files being
+    added, removed and saved by rename. A file rewritten in place is picked
+    up by the refresh when the picker opens.
+    """
+
+    NOTES = select.KQ_NOTE_WRITE | select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME
+
+    def __init__(self, tk, root, callback):
+        self.root = root
+        self.callback = callback
+        self.kqueue = select.kqueue()
+        self.fds = {}  # {folder: fd}
+        self.sections = {}  # {fd: DirectorySection}
+        self.changed = set()
+        self.after_id = None
+        root.tk.createfilehandler(self.kqueue.fileno(), tk.READABLE, self.on_events)
+
+    def watch(self, directory):
+        for path in directory.folders:
+            fd = self.fds.get(path)
+            if fd is None:
+                try:
+                    fd = os.open(path, getattr(os, "O_EVTONLY", os.O_RDONLY))
+                except OSError:
+                    continue
+                event = select.kevent(
+                    fd, select.KQ_FILTER_VNODE, select.KQ_EV_ADD | select.KQ_EV_CLEAR, self.NOTES
+                )
+                self.kqueue.control([event], 0)
+                self.fds[path] = fd
+            self.sections[fd] = directory
+
+    def unwatch(self, fd):
+        # Closing a descriptor drops its kevent; the next refresh re-adds live folders.
+        self.fds = {path: watched for path, watched in self.fds.items() if watched != fd}
+        self.sections.pop(fd, None)
+        os.close(fd)
+
+    def on_events(self, _fd, _mask):
+        events = self.kqueue.control(None, 32, 0)
+        for event in events:
+            directory = self.sections.get(event.ident)
+            if directory is None:
+                continue
+            self.changed.add(directory)
+            if event.fflags & (select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME):
+                self.unwatch(event.ident)
+        if self.changed:
+            if self.after_id is not None:
+                self.root.after_cancel(self.after_id)
+            self.after_id = self.root.after(CONFIG_RELOAD_DEBOUNCE_MS, self.on_settled)
+
+    def on_settled(self):
+        self.after_id = None
+        changed, self.changed = self.changed, set()
+        self.callback(changed)
+
+    def close(self):
+        self.root.tk.deletefilehandler(self.kqueue.fileno())
+        for fd in self.fds.values():
+            os.close(fd)
+        self.kqueue.close()
 
 
 def truncate(text, max_len):
-    single_line = " ".join(
-        text.replace("\r\n", "\n").replace("\r", "\n").replace("\n", " ").split()
-    )
-    if len(single_line) <= max_len:
-        return single_line
-    return single_line[:max_len] + "..."
+    # Normalize a growing prefix only; huge snippets cost as much as short ones.
+    end = max_len + 1
+    while True:
+        single_line = " ".join(text[:end].split())
+        if len(single_line) > max_len:
+            return single_line[:max_len] + "..."
+        if end >= len(text):
+            return single_line
+        end *= 2
+
+
+class PreviewCache:
+    """One-line previews of every snippet, persisted per config version.
+
+    Keyed by the config file identity and truncate length like the search
+    index, so a warm start fills whole sections without reading any
+    snippet bodies.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, version, truncate_len, sections=None):
+        self.version = version
+        self.truncate_len = truncate_len
+        self.sections = sections or {}  # {section_idx: [preview, ...]}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, version, truncate_len, path=PREVIEW_CACHE_FILE):
+        if version is not None:
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                if (
+                    isinstance(state, dict)
+                    and state.get("format") == cls.FORMAT
+                    and state.get("version") == version
+                    and state.get("truncate_length") == truncate_len
+                ):
+                    return cls(version, truncate_len, state["sections"])
+            except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+                pass
+        return cls(version, truncate_len)
+
+    def section(self, section_idx, strings):
+        """Return the previews of one section, computing them on a miss."""
+        previews = self.sections.get(section_idx)
+        if previews is None or len(previews) != len(strings):
+            previews = [truncate(text, self.truncate_len) for text in strings]
+            self.sections[section_idx] = previews
+            self.dirty = True
+        return previews
+
+    def save(self, path=PREVIEW_CACHE_FILE):
+        if not self.dirty or self.version is None:
+            return
+        state = {
+            "format": self.FORMAT,
+            "version": self.version,
+            "truncate_length": self.truncate_len,
+            "sections": self.sections,
+        }
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self.dirty = False
+
+
+class SelectionModel:
+    """Ordered set of selected snippets shared by the pickers.
+
+    Entries are keyed by (section_idx, row_idx) and keep their text, so the
+    count is O(1), output follows the order the user picked snippets in,
+    and the selection can be re-resolved after the config is edited.
+    """
+
+    def __init__(self):
+        self.entries = {}  # {(section_idx, row_idx): text}, in selection order
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, key, text):
+        self.entries.setdefault(key, text)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def toggle(self, key, text):
+        """Flip one snippet; return True if it is now selected."""
+        if key in self.entries:
+            del self.entries[key]
+            return False
+        self.entries[key] = text
+        return True
+
+    def texts(self):
+        return list(self.entries.values())
+
+    def remap(self, old_config, new_config):
+        """Re-resolve the selection against an edited config.
+
+        Each snippet is looked up by its id, which follows it through moves
+        and edits, then by text, preferring a section with the same name;
+        snippets that no longer exist are dropped.
+        """
+        by_id = {
+            old_config["sections"][section_idx]["ids"][row_idx]: (section_idx, row_idx)
+            for section_idx, row_idx in self.entries
+        }
+        found = {}  # {old key: new key}
+        for section_idx, section in enumerate(new_config["sections"]):
+            for row_idx, snippet_id in enumerate(section["ids"]):
+                if snippet_id in by_id:
+                    found[by_id[snippet_id]] = (section_idx, row_idx)
+
+        wanted = {text for key, text in self.entries.items() if key not in found}
+        candidates = {}  # {text: [(section_idx, row_idx), ...]}
+        if wanted:
+            for section_idx, section in enumerate(new_config["sections"]):
+                if is_directory_section(section):
+                    continue  # Its files are matched by path.
+                for row_idx, text in enumerate(section["strings"]):
+                    if text in wanted:
+                        candidates.setdefault(text, []).append((section_idx, row_idx))
+
+        entries = {}
+        for (section_idx, row_idx), text in self.entries.items():
+            key = found.get((section_idx, row_idx))
+            if key is not None:
+                entries[key] = new_config["sections"][key[0]]["strings"][key[1]]
+                continue
+            positions = candidates.get(text)
+            if not positions:
+                continue
+            old_name = old_config["sections"][section_idx]["name"]
+            chosen = next(
+                (pos for pos in positions if new_config["sections"][pos[0]]["name"] == old_name),
+                positions[0],
+            )
+            positions.remove(chosen)
+            entries[chosen] = text
+        self.entries = entries
+
+
+class EditorModel:
+    """Change-tracked copy of a config that the editors modify in place.
+
+    Sections share their string and id lists with the source config until
+    their first edit copies them, so opening an editor copies no snippets.
+    Edits are small operations on one or two sections, and to_config()
+    passes untouched lists through as they are. Snippets keep their id
+    when they are edited or moved; new ones take the next free id.
+    """
+
+    def __init__(self, config):
+        self.settings = dict(config["settings"])
+        self.next_id = config["next_id"]
+        self.snippets = config["snippets"]  # Copied on the first tag edit
+        self.snippets_owned = False
+        # origin: index in the source config, None for new sections.
+        # owned: strings were copied on write and may differ from the source.
+        self.sections = [
+            {
+                "name": section["name"],
+                "strings": section["strings"],
+                "ids": section["ids"],
+                "origin": idx,
+                "owned": False,
+            }
+            for idx, section in enumerate(config["sections"])
+        ]
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.sections)
+
+    def name(self, idx):
+        return self.sections[idx]["name"]
+
+    def strings(self, idx):
+        """Strings of a section; read-only, edit through the model."""
+        return self.sections[idx]["strings"]
+
+    def ids(self, idx):
+        """Snippet ids of a section, parallel to its strings; read-only."""
+        return self.sections[idx]["ids"]
+
+    def origin(self, idx):
+        """Source index of a section whose strings are untouched, else None."""
+        section = self.sections[idx]
+        return None if section["owned"] else section["origin"]
+
+    def _writable(self, idx):
+        section = self.sections[idx]
+        if not section["owned"]:
+            section["strings"] = list(section["strings"])
+            section["ids"] = list(section["ids"])
+            section["owned"] = True
+        self.dirty = True
+        return section
+
+    def add_section(self, name):
+        self.sections.append({"name": name, "strings": [], "ids": [], "origin": None, "owned": True})
+        self.dirty = True
+        return len(self.sections) - 1
+
+    def rename_section(self, idx, name):
+        self.sections[idx]["name"] = name
+        self.dirty = True
+
+    def remove_section(self, idx):
+        del self.sections[idx]
+        self.dirty = True
+
+    def move_section(self, from_idx, to_idx):
+        self.sections.insert(to_idx, self.sections.pop(from_idx))
+        self.dirty = True
+
+    def insert_strings(self, idx, row_idx, texts, ids=None):
+        """Insert rows, as new snippets unless their ids are given; return the ids."""
+        if ids is None:
+            ids = list(range(self.next_id, self.next_id + len(texts)))
+            self.next_id += len(texts)
+        section = self._writable(idx)
+        section["strings"][row_idx:row_idx] = texts
+        section["ids"][row_idx:row_idx] = ids
+        return ids
+
+    def replace_string(self, idx, row_idx, text):
+        self._writable(idx)["strings"][row_idx] = text
+
+    def set_strings(self, idx, texts, ids):
+        section = self._writable(idx)
+        section["strings"][:] = texts
+        section["ids"][:] = ids
+
+    def _take(self, idx, row_indexes):
+        section = self._writable(idx)
+        drop = set(row_indexes)
+        taken = [(section["strings"][row_idx], section["ids"][row_idx]) for row_idx in sorted(drop)]
+        for key in ("strings", "ids"):
+            section[key][:] = [value for row_idx, value in enumerate(section[key]) if row_idx not in drop]
+        return [text for text, _snippet_id in taken], [snippet_id for _text, snippet_id in taken]
+
+    def remove_strings(self, idx, row_indexes):
+        """Remove rows from a section and return their texts in order."""
+        return self._take(idx, row_indexes)[0]
+
+    def move_strings(self, idx, row_indexes, to_row):
+        """Move rows as one block so the first lands at to_row."""
+        texts, ids = self._take(idx, row_indexes)
+        self.insert_strings(idx, to_row, texts, ids)
+
+    def move_strings_to_section(self, idx, row_indexes, target_idx):
+        """Append rows to another section and return their texts."""
+        texts, ids = self._take(idx, row_indexes)
+        self.insert_strings(target_idx, len(self.sections[target_idx]["strings"]), texts, ids)
+        return texts
+
+    def tags(self, snippet_id):
+        return list(self.snippets.get(str(snippet_id), {}).get("tags", []))
+
+    def set_tags(self, snippet_id, tags):
+        if tags == self.tags(snippet_id):
+            return
+        if not self.snippets_owned:
+            self.snippets = dict(self.snippets)
+            self.snippets_owned = True
+        key = str(snippet_id)
+        info = {k: v for k, v in self.snippets.get(key, {}).items() if k != "tags"}
+        if tags:
+            info["tags"] = list(tags)
+        if info:
+            self.snippets[key] = info
+        else:
+            self.snippets.pop(key, None)
+        self.dirty = True
+
+    def to_config(self):
+        sections = [
+            {"name": section["name"], "strings": section["strings"], "ids": section["ids"]}
+            for section in self.sections
+        ]
+        snippets = self.snippets
+        if snippets:
+            live = {snippet_id for section in sections for snippet_id in section["ids"]}
+            snippets = {key: info for key, info in snippets.items() if int(key) in live}
+        return {
+            "settings": dict(self.settings),
+            "sections": sections,
+            "next_id": self.next_id,
+            "snippets": dict(snippets),
+            "schema": CONFIG_SCHEMA_VERSION,
+        }
+
+
+def search_head(text):
+    """Normalized prefix of a snippet that search looks at."""
+    return " ".join(text[:SEARCH_INDEX_CHARS].lower().split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Trigram index over all snippets for type-to-filter search.
+
+    Built once per config version and pickled to the cache directory, so
+    later launches only load it. Only the first SEARCH_INDEX_CHARS of each
+    snippet are indexed, which bounds build time and memory.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, config, version=None):
+        self.version = version
+        self.keys = []  # doc id -> (section_idx, row_idx)
+        self.texts = []  # doc id -> search_head(text)
+        self.postings = {}  # trigram -> array of doc ids, ascending
+        for section_idx, section in enumerate(config["sections"]):
+            for row_idx, text in enumerate(section["strings"]):
+                doc_id = len(self.keys)
+                head = search_head(text)
+                self.keys.append((section_idx, row_idx))
+                self.texts.append(head)
+                for gram in trigrams(head):
+                    posting = self.postings.get(gram)
+                    if posting is None:
+                        posting = self.postings[gram] = array("I")
+                    posting.append(doc_id)
+
+    @classmethod
+    def load_or_build(cls, config, version, path=SEARCH_INDEX_FILE):
+        """Return the cached index for version, rebuilding it if stale."""
+        if version is not None:
+            try:
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                if (
+                    isinstance(state, dict)
+                    and state.get("format") == cls.FORMAT
+                    and state.get("version") == version
+                ):
+                    index = cls.__new__(cls)
+                    index.version = version
+                    index.keys = state["keys"]
+                    index.texts = state["texts"]
+                    index.postings = state["postings"]
+                    return index
+            except Exception:
+                pass  # Unreadable or from an older build; rebuild it.
+
+        index = cls(config, version)
+        if version is not None:
+            index.save(path)
+        return index
+
+    def save(self, path=SEARCH_INDEX_FILE):
+        state = {
+            "format": self.FORMAT,
+            "version": self.version,
+            "keys": self.keys,
+            "texts": self.texts,
+            "postings": self.postings,
+        }
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return up to limit (section_idx, row_idx) keys, best match first.
+
+        Exact substring matches rank first, earlier matches higher. For
+        queries of three or more trigrams, a doc sharing at least two thirds
+        of them also matches, which tolerates a typo.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+
+        if len(query) < 3:
+            # Too short for trigrams: take the first matches in library
+            # order instead of scanning everything.
+            hits = itertools.islice(
+                (doc_id for doc_id, text in enumerate(self.texts) if query in text),
+                limit,
+            )
+            ranked = sorted((self.texts[doc_id].find(query), doc_id) for doc_id in hits)
+            return [self.keys[doc_id] for _pos, doc_id in ranked]
+
+        grams = trigrams(query)
+        postings = sorted(
+            (posting for posting in (self.postings.get(gram) for gram in grams) if posting),
+            key=len,
+        )
+        # Any doc containing the query contains its rarest trigram; the
+        # second rarest also catches a typo inside the rarest one.
+        candidates = set()
+        for posting in postings[:2]:
+            candidates.update(posting)
+
+        ranked = []
+        for doc_id in candidates:
+            text = self.texts[doc_id]
+            pos = text.find(query)
+            if pos >= 0:
+                ranked.append(((0, pos), doc_id))
+                continue
+            if len(grams) < 3:
+                continue
+            matched = sum(1 for gram in grams if gram in text)
+            if matched * 3 >= len(grams) * 2:
+                ranked.append(((1, len(grams) - matched), doc_id))
+        return [self.keys[doc_id] for _score, doc_id in heapq.nsmallest(limit, ranked)]
+
+
+def split_tag_query(query):
+    """Split a search query into its #tags, lowercased, and the other words."""
+    tags = []
+    words = []
+    for word in query.split():
+        if word.startswith(TAG_PREFIX) and len(word) > len(TAG_PREFIX):
+            tags.append(word[len(TAG_PREFIX):].lower())
+        else:
+            words.append(word)
+    return tags, " ".join(words)
+
+
+def parse_tags(text):
+    """Tags from comma- or space-separated text, with any leading # dropped."""
+    tags = []
+    for word in text.replace(",", " ").split():
+        tag = word.lstrip(TAG_PREFIX)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def bitmap_ids(bits):
+    """Yield the positions of the set bits of an int bitmap, ascending."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_idx, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_idx * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+class TagIndex:
+    """Bitmap index from tags to snippet ids.
+
+    Each tag maps to an int whose set bits are the ids of its snippets, so
+    filtering on several tags is one AND per tag. Ids do not change when
+    snippets move, and positions are only resolved for the ids that
+    remain after the AND.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.tagged = set()
+        self.locations = None  # {snippet_id: (section_idx, row_idx)} of tagged snippets
+        bitmaps = {}  # {tag: bytearray}
+        for key, info in config["snippets"].items():
+            snippet_id = int(key)
+            for tag in info.get("tags", ()):
+                bitmap = bitmaps.setdefault(tag.lower(), bytearray())
+                byte_idx = snippet_id >> 3
+                if len(bitmap) <= byte_idx:
+                    bitmap.extend(bytes(byte_idx + 1 - len(bitmap)))
+                bitmap[byte_idx] |= 1 << (snippet_id & 7)
+                self.tagged.add(snippet_id)
+        self.bitmaps = {tag: int.from_bytes(bitmap, "little") for tag, bitmap in bitmaps.items()}
+
+    def match(self, tags):
+        """Bitmap of the snippets that carry all of tags."""
+        if not tags:
+            return 0
+        bits = -1
+        for tag in tags:
+            bits &= self.bitmaps.get(tag.lower(), 0)
+        return bits
+
+    def keys(self, tags):
+        """(section_idx, row_idx) of the snippets carrying all of tags, in library order."""
+        bits = self.match(tags)
+        if not bits:
+            return []
+        if self.locations is None:
+            self.locations = {
+                snippet_id: (section_idx, row_idx)
+                for section_idx, section in enumerate(self.config["sections"])
+                for row_idx, snippet_id in enumerate(section["ids"])
+                if snippet_id in self.tagged
+            }
+        return sorted(
+            self.locations[snippet_id] for snippet_id in bitmap_ids(bits) if snippet_id in self.locations
+        )
+
+
+def is_snippet_file_name(name):
+    return name.lower().endswith(DIRECTORY_FILE_EXTENSIONS)
+
+
+def read_snippet_file(path):
+    # Text of one snippet file, without its final newline.
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return text[:-1] if text.endswith("\n") else text
+
+
+class DirectoryStrings(Sequence):
+    """Read-only strings of a directory section, read from their files on access."""
+
+    def __init__(self, path, entries):
+        self.path = path
+        self.entries = entries  # ((relative path, mtime_ns, size, preview, search head), ...)
+        self.rows = None  # {relative path: row_idx}, built on first find()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, row_idx):
+        if isinstance(row_idx, slice):
+            return [self[i] for i in range(*row_idx.indices(len(self)))]
+        try:
+            return read_snippet_file(os.path.join(self.path, self.entries[row_idx][0]))
+        except (OSError, UnicodeDecodeError):
+            return ""  # Removed or rewritten since it was indexed.
+
+    def preview(self, row_idx):
+        return self.entries[row_idx][3]
+
+    def relative_path(self, row_idx):
+        return self.entries[row_idx][0]
+
+    def find(self, relative_path):
+        """Row of the file at relative_path, or None if it is not listed."""
+        if self.rows is None:
+            self.rows = {entry[0]: row_idx for row_idx, entry in enumerate(self.entries)}
+        return self.rows.get(relative_path)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        # Rows whose search head contains query, earlier matches first.
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+        ranked = (
+            (entry[4].find(query), row_idx)
+            for row_idx, entry in enumerate(self.entries)
+        )
+        return [row_idx for _pos, row_idx in heapq.nsmallest(limit, (hit for hit in ranked if hit[0] >= 0))]
+
+
+class DirectoryIds(Sequence):
+    """Ids of a directory section: the absolute paths of its files."""
+
+    def __init__(self, path, entries):
+        self.path = path
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, row_idx):
+        if isinstance(row_idx, slice):
+            return [self[i] for i in range(*row_idx.indices(len(self)))]
+        return os.path.join(self.path, self.entries[row_idx][0])
+
+
+class DirectorySection:
+    """A live section listing the snippet files under a directory.
+
+    The file list with each file's mtime, size, preview and search head is
+    pickled per directory, so opening the picker costs one cache load
+    however many files there are. refresh() re-stats the tree and reads
+    only new and changed files; a snippet's full text is read from its
+    file when it is selected. load() and refresh() run off the Tk thread
+    and only ever swap in a new entries tuple.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, name, path, truncate_len, cache_dir=DIRECTORY_INDEX_DIR):
+        self.name = name
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.truncate_len = truncate_len
+        key = hashlib.blake2b(os.fsencode(self.path), digest_size=8).hexdigest()
+        self.cache_path = os.path.join(cache_dir, f"{key}.pickle")
+        self.entries = ()
+        self.loaded = False
+        self.folders = []  # Folders of the tree as of the last refresh
+        self.refreshing = False
+        self.stale = False  # Changed again while refreshing
+
+    def section(self):
+        return {
+            "name": self.name,
+            "strings": DirectoryStrings(self.path, self.entries),
+            "ids": DirectoryIds(self.path, self.entries),
+            "directory": self.path,
+        }
+
+    def load(self):
+        # Take the entries from the cache, if it was written for this directory.
+        self.loaded = True
+        try:
+            with open(self.cache_path, "rb") as f:
+                state = pickle.load(f)
+            if (
+                isinstance(state, dict)
+                and state.get("format") == self.FORMAT
+                and state.get("path") == self.path
+                and state.get("truncate_length") == self.truncate_len
+            ):
+                self.entries = state["entries"]
+        except Exception:
+            pass  # Unreadable or from an older build; the refresh rescans.
+
+    def save(self):
+        state = {
+            "format": self.FORMAT,
+            "path": self.path,
+            "truncate_length": self.truncate_len,
+            "entries": self.entries,
+        }
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def scan(self):
+        # Yield (relative path, mtime_ns, size) of the snippet files, in tree order.
+        folders = []
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+            folders.append(root)
+            for name in sorted(files):
+                if not is_snippet_file_name(name):
+                    continue
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                yield os.path.relpath(file_path, self.path), stat.st_mtime_ns, stat.st_size
+        self.folders = folders
+
+    def refresh(self):
+        """Bring the entries up to date with the tree; return True if they changed."""
+        known = {entry[0]: entry for entry in self.entries}
+        entries = []
+        for relative, mtime_ns, size in self.scan():
+            entry = known.get(relative)
+            if entry is None or entry[1:3] != (mtime_ns, size):
+                try:
+                    text = read_snippet_file(os.path.join(self.path, relative))
+                except (OSError, UnicodeDecodeError):
+                    continue
+                if not text.strip():
+                    continue
+                entry = (relative, mtime_ns, size, truncate(text, self.truncate_len), search_head(text))
+            entries.append(entry)
+        entries = tuple(entries)
+        if entries == self.entries:
+            return False
+        self.entries = entries
+        self.save()
+        return True
+
+
+def directory_sections(settings, truncate_len):
+    # DirectorySection objects for the "directory_sections" setting.
+    sections = []
+    for spec in settings.get("directory_sections", []):
+        if isinstance(spec, dict) and spec.get("path"):
+            name = spec.get("name") or os.path.basename(os.path.normpath(spec["path"]))
+            sections.append(DirectorySection(name, spec["path"], truncate_len))
+    return sections
+
+
+def is_directory_section(section):
+    return "directory" in section
+
+
+def with_directory_sections(config, directories):
+    # The config with the directory sections appended after the stored ones.
+    return {**config, "sections": config["sections"] + [directory.section() for directory in directories]}
+
+
+def snippet_key(text):
+    """Short content hash identifying a snippet independent of its position."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class UsageLog:
+    """Append-only record of pasted snippets with frecency scores.
+
+    Every paste appends one JSON line per snippet. Once the log grows past
+    USAGE_COMPACT_LINES it is rewritten with one line per snippet holding
+    its score decayed to a reference time. A snippet's score is the sum of
+    0.5 ** (age / FRECENCY_HALF_LIFE_SECONDS) over its uses, so it blends
+    how often and how recently it was used. Lines also keep the section
+    name and row a snippet was last seen at, so resolving the top entries
+    does not need to hash the whole library. Snippets of directory
+    sections are kept by their file's relative path instead; they are
+    resolved once the folder has loaded and never searched for. When it does, the new
+    positions are appended, and so are the snippets that were not found
+    (edited or deleted) along with the store version they were missing
+    from; those are only looked for again once the store changes. Nothing
+    is dropped on a miss, so a broken or half-edited config cannot erase
+    the history.
+    """
+
+    def __init__(self, path=USAGE_LOG_FILE):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.read()
+
+    def read(self):
+        self.scores = {}  # {key: (score, reference_time)}
+        self.hints = {}  # {key: (section_name, row_idx)}
+        self.misses = {}  # {key: store version it was last not found in}
+        self.lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        key = entry["k"]
+                        if "t" in entry:  # Lines without a time only update the hint
+                            self._add(key, float(entry.get("s", 1.0)), float(entry["t"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if "n" in entry and "r" in entry:
+                        self.hints[key] = (entry["n"], entry["r"])
+                        self.misses.pop(key, None)
+                    if "x" in entry:
+                        self.misses[key] = entry["x"]
+                    self.lines += 1
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def locked(self, operation):
+        """Appends take a shared lock and compaction an exclusive one."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    @staticmethod
+    def _decay(seconds):
+        return 0.5 ** (seconds / FRECENCY_HALF_LIFE_SECONDS)
+
+    def _add(self, key, score, when):
+        current = self.scores.get(key)
+        if current is None:
+            self.scores[key] = (score, when)
+            return
+        old_score, old_when = current
+        if when >= old_when:
+            self.scores[key] = (old_score * self._decay(when - old_when) + score, when)
+        else:
+            self.scores[key] = (old_score + score * self._decay(old_when - when), old_when)
+
+    def score(self, key, now=None):
+        current = self.scores.get(key)
+        if current is None:
+            return 0.0
+        score, when = current
+        return score * self._decay((now or time.time()) - when)
+
+    def append(self, entries):
+        try:
+            with self.locked(fcntl.LOCK_SH), open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        except OSError:
+            return False
+        self.lines += len(entries)
+        return True
+
+    def record(self, entries):
+        """Log uses of (section, row_idx, text) entries."""
+        now = time.time()
+        lines = []
+        for section, row_idx, text in entries:
+            key = snippet_key(text)
+            if is_directory_section(section):
+                row_idx = section["strings"].relative_path(row_idx)
+            self._add(key, 1.0, now)
+            self.hints[key] = (section["name"], row_idx)
+            self.misses.pop(key, None)
+            lines.append({"t": now, "k": key, "n": section["name"], "r": row_idx})
+        if self.append(lines) and self.lines > USAGE_COMPACT_LINES:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the log as one decayed score per snippet.
+
+        The log is read again under the exclusive lock first, so uses that
+        other pickers appended since this one loaded it are kept.
+        """
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with self.locked(fcntl.LOCK_EX):
+                self.read()
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for key, (score, when) in self.scores.items():
+                        entry = {"t": when, "k": key, "s": score}
+                        if key in self.hints:
+                            entry["n"], entry["r"] = self.hints[key]
+                        if key in self.misses:
+                            entry["x"] = self.misses[key]
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.path)
+        except OSError:
+            return
+        self.lines = len(self.scores)
+
+    def top(self, config, version, limit=FREQUENT_SECTION_SIZE):
+        """Return (section_idx, row_idx) keys of the highest scoring snippets.
+
+        version is the store version config was loaded from, or None if
+        unknown; snippets missing from it are skipped without a search.
+        """
+        now = time.time()
+        ranked = heapq.nlargest(limit, self.scores, key=lambda key: self.score(key, now))
+        section_by_name = {
+            section["name"]: section_idx
+            for section_idx, section in enumerate(config["sections"])
+        }
+
+        found = {}
+        missing = set()
+        for key in ranked:
+            section_name, row_idx = self.hints.get(key, (None, None))
+            section_idx = section_by_name.get(section_name)
+            strings = config["sections"][section_idx]["strings"] if section_idx is not None else []
+            if isinstance(row_idx, str) and isinstance(strings, DirectoryStrings):
+                # Left out until the folder has loaded, or once the file is gone.
+                row_idx = strings.find(row_idx)
+                if row_idx is not None:
+                    found[key] = (section_idx, row_idx)
+                continue
+            if isinstance(row_idx, int) and 0 <= row_idx < len(strings) and snippet_key(strings[row_idx]) == key:
+                found[key] = (section_idx, row_idx)
+            elif version is None or self.misses.get(key) != version:
+                missing.add(key)
+
+        # Snippets moved since they were logged: look them up by content.
+        if missing:
+            moved = {}
+            for section_idx, section in enumerate(config["sections"]):
+                if is_directory_section(section):
+                    continue  # Would read every file.
+                for row_idx, text in enumerate(section["strings"]):
+                    key = snippet_key(text)
+                    if key in missing:
+                        missing.discard(key)
+                        found[key] = (section_idx, row_idx)
+                        moved[key] = (section["name"], row_idx)
+                if not missing:
+                    break
+            # Remember the outcome so the next open does not search again.
+            self.hints.update(moved)
+            lines = [{"k": key, "n": name, "r": row_idx} for key, (name, row_idx) in moved.items()]
+            if version is not None:
+                for key in missing:
+                    self.misses[key] = version
+                    lines.append({"k": key, "x": version})
+            if lines:
+                self.append(lines)
+
+        return [found[key] for key in ranked if key in found]
+
+
+class DaemonChannel:
+    """Persistent connection to the daemon's control socket.
+
+    The daemon already holds Accessibility permission and runs AppKit, so
+    it answers clipboard, paste, frontmost-app and notification requests
+    in-process. Requests are JSON lines; every helper falls back to
+    osascript/pbcopy when the daemon is not reachable.
+    """
+
+    def __init__(self, path=DAEMON_SOCKET_PATH):
+        self.path = path
+        self.sock = None
+        self.reader = None
+        self.unavailable = False
+        # The config writer thread sends notifications too.
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.sock is not None:
+            return True
+        if self.unavailable:
+            return False
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(DAEMON_CHANNEL_TIMEOUT_SECONDS)
+            sock.connect(self.path)
+        except OSError:
+            self.unavailable = True
+            return False
+        self.sock = sock
+        self.reader = sock.makefile("r", encoding="utf-8")
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+    def request(self, op, **fields):
+        """Send one request; return the reply dict, or None on failure."""
+        with self.lock:
+            if not self.connect():
+                return None
+            try:
+                message = json.dumps({"op": op, **fields}, ensure_ascii=False) + "\n"
+                self.sock.sendall(message.encode("utf-8"))
+                line = self.reader.readline()
+                reply = json.loads(line) if line else None
+            except (OSError, ValueError):
+                reply = None
+            if not isinstance(reply, dict):
+                self.close()
+                self.unavailable = True
+                return None
+        return reply if reply.get("ok") else None
+
+
+daemon_channel = DaemonChannel()
 
 
 def run_osascript(script):
@@ -107,6 +1863,20 @@ def run_osascript(script):
 
 
 def get_frontmost_app():
+    # The daemon captures the frontmost app at click time.
+    if os.environ.get("PROMPT_CLICK_FRONTMOST_NAME"):
+        return {
+            "bundle_id": os.environ.get("PROMPT_CLICK_FRONTMOST_BUNDLE_ID", ""),
+            "name": os.environ["PROMPT_CLICK_FRONTMOST_NAME"],
+        }
+
+    reply = daemon_channel.request("frontmost")
+    if reply is not None:
+        return {
+            "bundle_id": reply.get("bundle_id", ""),
+            "name": reply.get("name", ""),
+        }
+
     script = """
 tell application "System Events"
     set frontApp to first application process whose frontmost is true
@@ -134,6 +1904,8 @@ return bundleId & linefeed & appName
 
 
 def copy_text_to_clipboard(text):
+    if daemon_channel.request("clipboard", text=text) is not None:
+        return
     subprocess.run(["pbcopy"], input=text, text=True, check=True)
 
 
@@ -153,6 +1925,13 @@ def request_autopaste(text):
 
 
 def paste_to_frontmost_app(frontmost_app):
+    if daemon_channel.request(
+        "paste",
+        bundle_id=(frontmost_app or {}).get("bundle_id", ""),
+        name=(frontmost_app or {}).get("name", ""),
+    ) is not None:
+        return True
+
     if not frontmost_app:
         activate = ""
     elif frontmost_app.get("bundle_id"):
@@ -173,6 +1952,8 @@ end tell
 
 
 def notify_user(message):
+    if daemon_channel.request("notify", message=message) is not None:
+        return
     safe = message.replace("\\", "\\\\").replace('"', '\\"')
     run_osascript(f'display notification "{safe}" with title "Prompt Click"')
 
@@ -193,7 +1974,7 @@ def import_tk():
 
 
 class MultilineTextDialog:
-    def __init__(self, parent, title, initial_text=""):
+    def __init__(self, parent, title, initial_text="", initial_tags=()):
         tk, ttk, _, _ = import_tk()
         self.result = None
         self.top = tk.Toplevel(parent)
@@ -209,6 +1990,13 @@ class MultilineTextDialog:
         self.text.insert("1.0", initial_text)
         self.text.pack(fill=tk.BOTH, expand=True)
         self.text.focus_set()
+        self.tags = []
+
+        tags_row = ttk.Frame(frame)
+        tags_row.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(tags_row, text="Tags:").pack(side=tk.LEFT)
+        self.tags_var = tk.StringVar(value=", ".join(initial_tags))
+        ttk.Entry(tags_row, textvariable=self.tags_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(6, 0))
 
         buttons = ttk.Frame(frame)
         buttons.pack(fill=tk.X, pady=(10, 0))
@@ -221,6 +2009,7 @@ class MultilineTextDialog:
 
     def ok(self):
         self.result = self.text.get("1.0", "end-1c")
+        self.tags = parse_tags(self.tags_var.get())
         self.top.destroy()
 
     def cancel(self):
@@ -234,17 +2023,10 @@ class ConfigEditor:
         self.ttk = ttk
         self.messagebox = messagebox
         self.simpledialog = simpledialog
-        self.saved = False
-        self.config = {
-            "settings": config.get("settings", {}).copy(),
-            "sections": [
-                {
-                    "name": section.get("name", f"Section {idx + 1}"),
-                    "strings": section.get("strings", []).copy(),
-                }
-                for idx, section in enumerate(config.get("sections", []))
-            ],
-        }
+        self.saved = None  # Future of the background save, once saved
+        self.saved_config = None
+        # Edits go to a change-tracked model that shares untouched sections.
+        self.model = EditorModel(config)
 
         self.top = tk.Toplevel(parent)
         self.top.title("Edit Prompt Click")
@@ -259,7 +2041,7 @@ class ConfigEditor:
         settings.pack(fill=tk.X, pady=(0, 8))
         ttk.Label(settings, text="Display characters:").pack(side=tk.LEFT)
         self.truncate_var = tk.IntVar(
-            value=int(self.config.get("settings", {}).get(
+            value=int(self.model.settings.get(
                 "truncate_length",
                 DEFAULT_TRUNCATE_LENGTH,
             ))
@@ -272,6 +2054,14 @@ class ConfigEditor:
             width=6,
             textvariable=self.truncate_var,
         ).pack(side=tk.LEFT, padx=(6, 0))
+        self.frequent_var = tk.BooleanVar(
+            value=bool(self.model.settings.get("frequent_section", DEFAULT_FREQUENT_SECTION))
+        )
+        ttk.Checkbutton(
+            settings,
+            text="Show Frequent tab",
+            variable=self.frequent_var,
+        ).pack(side=tk.LEFT, padx=(12, 0))
 
         section_buttons = ttk.Frame(outer)
         section_buttons.pack(fill=tk.X, pady=(0, 8))
@@ -281,10 +2071,20 @@ class ConfigEditor:
         ttk.Button(section_buttons, text="Section Up", command=lambda: self.move_section(-1)).pack(side=tk.LEFT, padx=(18, 0))
         ttk.Button(section_buttons, text="Section Down", command=lambda: self.move_section(1)).pack(side=tk.LEFT, padx=(6, 0))
 
+        # Previews of untouched sections come from the cache of the config on disk.
+        self.preview_cache = PreviewCache.load(config_journal.version(), self.truncate_len())
+
+        # Tabs start empty; a tab's listbox is built the first time it is shown.
         self.notebook = ttk.Notebook(outer)
         self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook.bind(
+            "<<NotebookTabChanged>>",
+            lambda _event: self.build_tab(self.current_section_index()),
+        )
+        self.tab_frames = []
         self.listboxes = []
-        self.rebuild_tabs()
+        for idx in range(len(self.model)):
+            self.add_tab(idx)
 
         bottom = ttk.Frame(outer)
         bottom.pack(fill=tk.X, pady=(10, 0))
@@ -295,6 +2095,9 @@ class ConfigEditor:
         self.top.protocol("WM_DELETE_WINDOW", self.cancel)
         parent.wait_window(self.top)
 
+    def truncate_len(self):
+        return int(self.truncate_var.get() or DEFAULT_TRUNCATE_LENGTH)
+
     def current_section_index(self):
         selected = self.notebook.select()
         if not selected:
@@ -308,65 +2111,80 @@ class ConfigEditor:
         return self.listboxes[idx]
 
     def selected_string_index(self):
+        rows = self.selected_string_indexes()
+        return rows[0] if rows else None
+
+    def selected_string_indexes(self):
         listbox = self.current_listbox()
         if not listbox:
-            return None
-        selection = listbox.curselection()
-        return selection[0] if selection else None
-
-    def rebuild_tabs(self):
-        for tab_id in self.notebook.tabs():
-            self.notebook.forget(tab_id)
-        self.listboxes = []
-
-        truncate_len = int(self.truncate_var.get() or DEFAULT_TRUNCATE_LENGTH)
-        for idx, section in enumerate(self.config["sections"]):
-            frame = self.ttk.Frame(self.notebook, padding=8)
-            listbox = self.tk.Listbox(frame, activestyle="dotbox")
-            listbox.pack(fill=self.tk.BOTH, expand=True)
-            listbox.bind("<Double-Button-1>", lambda _event: self.edit_string())
-
-            for value in section["strings"]:
-                listbox.insert(self.tk.END, truncate(value, truncate_len))
-
-            buttons = self.ttk.Frame(frame)
-            buttons.pack(fill=self.tk.X, pady=(8, 0))
-            self.ttk.Button(buttons, text="Add", command=self.add_string).pack(side=self.tk.LEFT)
-            self.ttk.Button(buttons, text="Edit", command=self.edit_string).pack(side=self.tk.LEFT, padx=(6, 0))
-            self.ttk.Button(buttons, text="Remove", command=self.remove_string).pack(side=self.tk.LEFT, padx=(6, 0))
-            self.ttk.Button(buttons, text="Up", command=lambda: self.move_string(-1)).pack(side=self.tk.LEFT, padx=(18, 0))
-            self.ttk.Button(buttons, text="Down", command=lambda: self.move_string(1)).pack(side=self.tk.LEFT, padx=(6, 0))
-            self.ttk.Button(buttons, text="Move To...", command=self.move_string_to_section).pack(side=self.tk.LEFT, padx=(18, 0))
-
-            self.notebook.add(frame, text=section["name"])
-            self.listboxes.append(listbox)
-
-        if self.config["sections"]:
-            self.notebook.select(min(0, len(self.config["sections"]) - 1))
-
-    def refresh_current_listbox(self):
-        idx = self.current_section_index()
-        if idx < 0:
+            return []
+        return sorted(listbox.curselection())
+
+    @staticmethod
+    def row_runs(rows):
+        """Split sorted rows into (first, last) runs of consecutive rows."""
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        return runs
+
+    def take_rows(self, listbox, rows):
+        """Delete rows from a listbox, one range per run, and return their previews."""
+        previews = [listbox.get(row) for row in rows]
+        for first, last in reversed(self.row_runs(rows)):
+            listbox.delete(first, last)
+        return previews
+
+    def add_tab(self, idx):
+        frame = self.ttk.Frame(self.notebook, padding=8)
+        self.tab_frames.append(frame)
+        self.listboxes.append(None)
+        self.notebook.add(frame, text=self.model.name(idx))
+
+    def section_previews(self, idx):
+        truncate_len = self.truncate_len()
+        origin = self.model.origin(idx)
+        if origin is not None and truncate_len == self.preview_cache.truncate_len:
+            return self.preview_cache.section(origin, self.model.strings(idx))
+        return [truncate(value, truncate_len) for value in self.model.strings(idx)]
+
+    def build_tab(self, idx):
+        if idx < 0 or idx >= len(self.listboxes) or self.listboxes[idx] is not None:
             return
-        listbox = self.listboxes[idx]
-        listbox.delete(0, self.tk.END)
-        truncate_len = int(self.truncate_var.get() or DEFAULT_TRUNCATE_LENGTH)
-        for value in self.config["sections"][idx]["strings"]:
-            listbox.insert(self.tk.END, truncate(value, truncate_len))
+        frame = self.tab_frames[idx]
+        # Shift/Cmd-click selects several rows for bulk remove and move.
+        listbox = self.tk.Listbox(frame, selectmode=self.tk.EXTENDED, activestyle="dotbox")
+        listbox.pack(fill=self.tk.BOTH, expand=True)
+        listbox.bind("<Double-Button-1>", lambda _event: self.edit_string())
+        listbox.insert(self.tk.END, *self.section_previews(idx))
+
+        buttons = self.ttk.Frame(frame)
+        buttons.pack(fill=self.tk.X, pady=(8, 0))
+        self.ttk.Button(buttons, text="Add", command=self.add_string).pack(side=self.tk.LEFT)
+        self.ttk.Button(buttons, text="Edit", command=self.edit_string).pack(side=self.tk.LEFT, padx=(6, 0))
+        self.ttk.Button(buttons, text="Remove", command=self.remove_string).pack(side=self.tk.LEFT, padx=(6, 0))
+        self.ttk.Button(buttons, text="Up", command=lambda: self.move_string(-1)).pack(side=self.tk.LEFT, padx=(18, 0))
+        self.ttk.Button(buttons, text="Down", command=lambda: self.move_string(1)).pack(side=self.tk.LEFT, padx=(6, 0))
+        self.ttk.Button(buttons, text="Move To...", command=self.move_string_to_section).pack(side=self.tk.LEFT, padx=(18, 0))
+
+        self.listboxes[idx] = listbox
 
     def add_section(self):
         name = self.simpledialog.askstring("New Section", "Section name:", parent=self.top)
         if not name:
             return
-        self.config["sections"].append({"name": name.strip(), "strings": []})
-        self.rebuild_tabs()
-        self.notebook.select(len(self.config["sections"]) - 1)
+        idx = self.model.add_section(name.strip())
+        self.add_tab(idx)
+        self.notebook.select(idx)
 
     def rename_section(self):
         idx = self.current_section_index()
         if idx < 0:
             return
-        current = self.config["sections"][idx]["name"]
+        current = self.model.name(idx)
         name = self.simpledialog.askstring(
             "Rename Section",
             "Section name:",
@@ -375,91 +2193,102 @@ class ConfigEditor:
         )
         if not name:
             return
-        self.config["sections"][idx]["name"] = name.strip()
+        self.model.rename_section(idx, name.strip())
         self.notebook.tab(idx, text=name.strip())
 
     def remove_section(self):
         idx = self.current_section_index()
         if idx < 0:
             return
-        if len(self.config["sections"]) <= 1:
+        if len(self.model) <= 1:
             self.messagebox.showinfo("Prompt Click", "Keep at least one section.", parent=self.top)
             return
-        name = self.config["sections"][idx]["name"]
+        name = self.model.name(idx)
         if not self.messagebox.askyesno(
             "Delete Section",
             f"Delete section '{name}' and all strings in it?",
             parent=self.top,
         ):
             return
-        del self.config["sections"][idx]
-        self.rebuild_tabs()
+        self.model.remove_section(idx)
+        frame = self.tab_frames.pop(idx)
+        del self.listboxes[idx]
+        self.notebook.forget(frame)
+        frame.destroy()
 
     def move_section(self, delta):
         idx = self.current_section_index()
         target = idx + delta
-        if idx < 0 or target < 0 or target >= len(self.config["sections"]):
+        if idx < 0 or target < 0 or target >= len(self.model):
             return
-        self.config["sections"][idx], self.config["sections"][target] = (
-            self.config["sections"][target],
-            self.config["sections"][idx],
-        )
-        self.rebuild_tabs()
+        self.model.move_section(idx, target)
+        self.tab_frames.insert(target, self.tab_frames.pop(idx))
+        self.listboxes.insert(target, self.listboxes.pop(idx))
+        # Inserting a managed tab moves it.
+        self.notebook.insert(target, self.tab_frames[target])
         self.notebook.select(target)
 
     def add_string(self):
         idx = self.current_section_index()
-        if idx < 0:
+        listbox = self.current_listbox()
+        if idx < 0 or listbox is None:
             return
         dialog = MultilineTextDialog(self.top, "Add String")
         if dialog.result is None or not dialog.result.strip():
             return
-        self.config["sections"][idx]["strings"].append(dialog.result)
-        self.refresh_current_listbox()
+        [snippet_id] = self.model.insert_strings(idx, len(self.model.strings(idx)), [dialog.result])
+        self.model.set_tags(snippet_id, dialog.tags)
+        listbox.insert(self.tk.END, truncate(dialog.result, self.truncate_len()))
 
     def edit_string(self):
         section_idx = self.current_section_index()
         string_idx = self.selected_string_index()
         if section_idx < 0 or string_idx is None:
             return
-        current = self.config["sections"][section_idx]["strings"][string_idx]
-        dialog = MultilineTextDialog(self.top, "Edit String", current)
+        current = self.model.strings(section_idx)[string_idx]
+        snippet_id = self.model.ids(section_idx)[string_idx]
+        dialog = MultilineTextDialog(self.top, "Edit String", current, self.model.tags(snippet_id))
         if dialog.result is None:
             return
-        self.config["sections"][section_idx]["strings"][string_idx] = dialog.result
-        self.refresh_current_listbox()
-        self.current_listbox().selection_set(string_idx)
+        self.model.replace_string(section_idx, string_idx, dialog.result)
+        self.model.set_tags(snippet_id, dialog.tags)
+        listbox = self.current_listbox()
+        listbox.delete(string_idx)
+        listbox.insert(string_idx, truncate(dialog.result, self.truncate_len()))
+        listbox.selection_set(string_idx)
 
     def remove_string(self):
         section_idx = self.current_section_index()
-        string_idx = self.selected_string_index()
-        if section_idx < 0 or string_idx is None:
+        rows = self.selected_string_indexes()
+        if section_idx < 0 or not rows:
             return
-        del self.config["sections"][section_idx]["strings"][string_idx]
-        self.refresh_current_listbox()
+        self.model.remove_strings(section_idx, rows)
+        self.take_rows(self.current_listbox(), rows)
 
     def move_string(self, delta):
+        """Move the selected strings one step as a block."""
         section_idx = self.current_section_index()
-        string_idx = self.selected_string_index()
-        if section_idx < 0 or string_idx is None:
+        rows = self.selected_string_indexes()
+        if section_idx < 0 or not rows:
             return
-        target = string_idx + delta
-        strings = self.config["sections"][section_idx]["strings"]
-        if target < 0 or target >= len(strings):
+        target = min(max(rows[0] + delta, 0), len(self.model.strings(section_idx)) - len(rows))
+        if target == rows[0] and rows[-1] - rows[0] == len(rows) - 1:
             return
-        strings[string_idx], strings[target] = strings[target], strings[string_idx]
-        self.refresh_current_listbox()
-        self.current_listbox().selection_set(target)
+        self.model.move_strings(section_idx, rows, target)
+        listbox = self.current_listbox()
+        previews = self.take_rows(listbox, rows)
+        listbox.insert(target, *previews)
+        listbox.selection_set(target, target + len(rows) - 1)
 
     def move_string_to_section(self):
         section_idx = self.current_section_index()
-        string_idx = self.selected_string_index()
-        if section_idx < 0 or string_idx is None or len(self.config["sections"]) < 2:
+        rows = self.selected_string_indexes()
+        if section_idx < 0 or not rows or len(self.model) < 2:
             return
 
         choices = [
-            f"{idx + 1}. {section['name']}"
-            for idx, section in enumerate(self.config["sections"])
+            f"{idx + 1}. {self.model.name(idx)}"
+            for idx in range(len(self.model))
             if idx != section_idx
         ]
         choice = self.simpledialog.askstring(
@@ -473,22 +2302,30 @@ class ConfigEditor:
             target = int(choice.split(".", 1)[0]) - 1
         except ValueError:
             return
-        if target < 0 or target >= len(self.config["sections"]) or target == section_idx:
+        if target < 0 or target >= len(self.model) or target == section_idx:
             return
 
-        value = self.config["sections"][section_idx]["strings"].pop(string_idx)
-        self.config["sections"][target]["strings"].append(value)
-        self.refresh_current_listbox()
+        self.model.move_strings_to_section(section_idx, rows, target)
+        previews = self.take_rows(self.current_listbox(), rows)
+        # An unbuilt target tab picks the strings up from the model when shown.
+        if self.listboxes[target] is not None:
+            self.listboxes[target].insert(self.tk.END, *previews)
 
     def save(self):
-        self.config["settings"] = {
-            "truncate_length": int(self.truncate_var.get() or DEFAULT_TRUNCATE_LENGTH)
-        }
-        save_config(self.config)
-        self.saved = True
-        self.top.destroy()
+        config = self.model.to_config()
+        config["settings"].update({
+            "truncate_length": self.truncate_len(),
+            "frequent_section": bool(self.frequent_var.get()),
+        })
+        self.saved_config = config
+        self.saved = save_config(config)
+        self.close()
 
     def cancel(self):
+        self.close()
+
+    def close(self):
+        self.preview_cache.save()
         self.top.destroy()
 
 
@@ -500,7 +2337,13 @@ class PickerApp:
         self.messagebox = messagebox
         self.paste_mode = paste_mode
         self.external_autopaste = bool(AUTOPASTE_TRIGGER_PATH and AUTOPASTE_TRIGGER_TOKEN)
-        self.config = load_config()
+        self.snapshot = load_config_snapshot()
+        # Sections read from directories go after the stored ones.
+        self.directory_settings = self.get_directory_settings(self.snapshot.config)
+        self.directories = directory_sections(self.snapshot.config["settings"], self.truncate_len(self.snapshot.config))
+        self.directory_updates = []  # (directory, changed, done), appended by the refresh threads
+        self.polling_directories = False
+        self.config = with_directory_sections(self.snapshot.config, self.directories)
         self.frontmost_app = (
             get_frontmost_app()
             if paste_mode == PASTE_MODE_AUTO and not self.external_autopaste
@@ -513,8 +2356,30 @@ class PickerApp:
         self.root.protocol("WM_DELETE_WINDOW", self.cancel)
 
         self.listboxes = []
+        self.selection = SelectionModel()
+        self.usage_log = UsageLog()
+        self.search_index = None
+        self.search_index_generation = 0
+        self.pending_search_indexes = {}  # {generation: SearchIndex}, set by the worker.
         self.build_ui()
+        self.start_search_index()
         self.position_near_pointer()
+        # Pick up saves from other instances and scripts while open.
+        self.editing = False
+        self.reload_pending = False
+        self.reloading = False
+        self.pending_snapshot = None  # (snapshot replaced, (snapshot, version) or None), set by the reload thread
+        try:
+            self.config_watcher = ConfigWatcher(tk, self.root, self.on_config_changed)
+        except OSError:
+            self.config_watcher = None
+        self.directory_watcher = None
+        if self.directories:
+            try:
+                self.directory_watcher = DirectoryWatcher(tk, self.root, self.refresh_directories)
+            except OSError:
+                pass
+        self.refresh_directories(self.directories)
 
     def position_near_pointer(self):
         self.root.update_idletasks()
@@ -535,23 +2400,31 @@ class PickerApp:
         outer = self.ttk.Frame(self.root, padding=10)
         outer.pack(fill=self.tk.BOTH, expand=True)
 
-        self.notebook = self.ttk.Notebook(outer)
+        self.search_var = self.tk.StringVar()
+        search_entry = self.ttk.Entry(outer, textvariable=self.search_var)
+        search_entry.pack(fill=self.tk.X, pady=(0, 8))
+        search_entry.focus_set()
+        self.search_var.trace_add("write", lambda *_args: self.on_search_changed())
+
+        # The body shows either the section tabs or the search results.
+        body = self.ttk.Frame(outer)
+        body.pack(fill=self.tk.BOTH, expand=True)
+        self.notebook = self.ttk.Notebook(body)
         self.notebook.pack(fill=self.tk.BOTH, expand=True)
-        self.listboxes = []
-        truncate_len = int(self.config.get("settings", {}).get(
-            "truncate_length",
-            DEFAULT_TRUNCATE_LENGTH,
-        ))
+        self.results_frame = self.ttk.Frame(body, padding=8)
+        self.results_listbox = self.make_key_listbox(self.results_frame)
+        self.searching = False
 
-        for section in self.config["sections"]:
-            frame = self.ttk.Frame(self.notebook, padding=8)
-            listbox = self.tk.Listbox(frame, selectmode=self.tk.MULTIPLE, activestyle="dotbox")
-            listbox.pack(fill=self.tk.BOTH, expand=True)
-            listbox.bind("<Double-Button-1>", lambda _event: self.accept())
-            for value in section.get("strings", []):
-                listbox.insert(self.tk.END, truncate(value, truncate_len))
-            self.notebook.add(frame, text=section.get("name", "Section"))
-            self.listboxes.append(listbox)
+        # Tabs start empty; a section's listbox is filled the first time it is shown.
+        self.section_frames = []
+        self.listboxes = []
+        self.frequent_frame = None
+        self.frequent_listbox = None
+        self.notebook.bind(
+            "<<NotebookTabChanged>>",
+            lambda _event: self.build_section_listbox(self.current_tab_section()),
+        )
+        self.populate_tabs({})
 
         buttons = self.ttk.Frame(outer)
         buttons.pack(fill=self.tk.X, pady=(10, 0))
@@ -560,26 +2433,450 @@ class PickerApp:
         self.ttk.Button(buttons, text="Copy", command=self.copy_only).pack(side=self.tk.RIGHT, padx=(0, 6))
         self.ttk.Button(buttons, text="Paste", command=self.accept).pack(side=self.tk.RIGHT, padx=(0, 6))
 
-        self.root.bind("<Escape>", lambda _event: self.cancel())
+        self.root.bind("<Escape>", lambda _event: self.on_escape())
         self.root.bind("<Return>", lambda _event: self.accept())
 
+    def truncate_len(self, config=None):
+        return int((config or self.config).get("settings", {}).get(
+            "truncate_length",
+            DEFAULT_TRUNCATE_LENGTH,
+        ))
+
+    def preview(self, section_idx, row_idx, truncate_len):
+        strings = self.config["sections"][section_idx]["strings"]
+        if isinstance(strings, DirectoryStrings):
+            return strings.preview(row_idx)
+        return truncate(strings[row_idx], truncate_len)
+
+    def populate_tabs(self, reused):
+        """Lay out the tabs for self.config.
+
+        reused maps a section index to the (frame, listbox) of an old tab
+        whose strings did not change; every other section gets an empty
+        tab that is filled when shown.
+        """
+        for tab_id in self.notebook.tabs():
+            self.notebook.forget(tab_id)
+        kept = [frame for frame, _listbox in reused.values()]
+        for frame in self.section_frames:
+            if frame not in kept:
+                frame.destroy()
+        if self.frequent_frame is not None:
+            self.frequent_frame.destroy()
+        self.frequent_frame = None
+        self.frequent_listbox = None
+        self.section_frames = []
+        self.listboxes = []
+
+        # Most used snippets across all sections, as the first tab.
+        if self.config["settings"].get("frequent_section", DEFAULT_FREQUENT_SECTION):
+            frequent_keys = self.usage_log.top(self.config, config_journal.loaded_version)
+            if frequent_keys:
+                self.frequent_frame = self.ttk.Frame(self.notebook, padding=8)
+                self.frequent_listbox = self.make_key_listbox(self.frequent_frame)
+                self.fill_key_listbox(self.frequent_listbox, frequent_keys, self.truncate_len())
+                self.notebook.add(self.frequent_frame, text="Frequent")
+
+        for section_idx, section in enumerate(self.config["sections"]):
+            frame, listbox = reused.get(section_idx, (None, None))
+            if frame is None:
+                frame = self.ttk.Frame(self.notebook, padding=8)
+            self.section_frames.append(frame)
+            self.listboxes.append(listbox)
+            self.notebook.add(frame, text=section.get("name", "Section"))
+
+        self.sync_listboxes()
+        self.build_section_listbox(self.current_tab_section())
+
+    def current_tab_section(self):
+        """Section index of the selected tab, or -1 for the Frequent tab."""
+        selected = self.notebook.select()
+        if not selected:
+            return -1
+        frame = self.notebook.nametowidget(selected)
+        return self.section_frames.index(frame) if frame in self.section_frames else -1
+
+    def build_section_listbox(self, section_idx):
+        if section_idx < 0 or self.listboxes[section_idx] is not None:
+            return
+        # exportselection=False keeps each tab's selection independent.
+        listbox = self.tk.Listbox(
+            self.section_frames[section_idx],
+            selectmode=self.tk.MULTIPLE,
+            activestyle="dotbox",
+            exportselection=False,
+        )
+        listbox.pack(fill=self.tk.BOTH, expand=True)
+        listbox.bind("<Double-Button-1>", lambda _event: self.accept())
+        # Kept tabs can change position after an edit, so look the index up.
+        listbox.bind(
+            "<<ListboxSelect>>",
+            lambda _event: self.on_listbox_select(self.listboxes.index(listbox)),
+        )
+        truncate_len = self.truncate_len()
+        strings = self.config["sections"][section_idx]["strings"]
+        if isinstance(strings, DirectoryStrings):
+            previews = [strings.preview(row_idx) for row_idx in range(len(strings))]
+        else:
+            previews = self.snapshot.section_previews(section_idx, truncate_len)
+        if previews is None:
+            previews = [
+                truncate(value, truncate_len)
+                for value in self.config["sections"][section_idx].get("strings", [])
+            ]
+        listbox.insert(self.tk.END, *previews)
+        for selected_section, row_idx in self.selection.entries:
+            if selected_section == section_idx:
+                listbox.selection_set(row_idx)
+        listbox.selected_rows = set(listbox.curselection())
+        self.listboxes[section_idx] = listbox
+
+    def start_search_index(self, saved=None):
+        """Load or build the search index for this config off the UI thread.
+
+        saved is the pending save of this config, whose version keys the index.
+        """
+        config = self.snapshot.config
+        version = config_journal.version() if saved is None else None
+        self.search_index_generation += 1
+        generation = self.search_index_generation
+        self.search_index = None
+        self.pending_search_indexes.clear()
+        self.tag_index = None
+
+        def worker():
+            try:
+                if saved is not None:
+                    index = SearchIndex.load_or_build(config, saved.result())
+                else:
+                    index = SearchIndex.load_or_build(config, version)
+            except Exception:
+                index = SearchIndex(config)  # Unsaved, so the poll always ends.
+            # Tk is not thread-safe; hand the result over through a dict keyed
+            # by generation, so a late worker for an older config cannot
+            # replace the current one's.
+            if generation == self.search_index_generation:
+                self.pending_search_indexes[generation] = index
+
+        threading.Thread(target=worker, name="prompt-click-search-index", daemon=True).start()
+        self.root.after(50, self.poll_search_index, generation)
+
+    def poll_search_index(self, generation):
+        if generation != self.search_index_generation:
+            return  # A newer config started its own poll.
+        index = self.pending_search_indexes.pop(generation, None)
+        if index is None:
+            self.root.after(50, self.poll_search_index, generation)  # Not built yet.
+            return
+        self.pending_search_indexes.clear()
+        self.search_index = index
+        if self.searching:
+            self.on_search_changed()
+
+    def search(self, query):
+        tags, query = split_tag_query(query)
+        if tags:
+            if self.tag_index is None:
+                self.tag_index = TagIndex(self.snapshot.config)
+            keys = self.tag_index.keys(tags)
+            needle = " ".join(query.lower().split())
+            if needle:
+                sections = self.config["sections"]
+                keys = [key for key in keys if needle in search_head(sections[key[0]]["strings"][key[1]])]
+            return keys
+        if self.search_index is not None:
+            keys = self.search_index.search(query)
+        else:
+            # Index still loading: fall back to a plain scan.
+            needle = " ".join(query.lower().split())
+            hits = (
+                (section_idx, row_idx)
+                for section_idx, section in enumerate(self.snapshot.config["sections"])
+                for row_idx, text in enumerate(section.get("strings", []))
+                if needle in search_head(text)
+            )
+            keys = list(itertools.islice(hits, SEARCH_RESULT_LIMIT))
+        # Directory sections are searched through their cached heads.
+        for section_idx, section in enumerate(self.config["sections"]):
+            if len(keys) >= SEARCH_RESULT_LIMIT:
+                break
+            if is_directory_section(section):
+                rows = section["strings"].search(query, SEARCH_RESULT_LIMIT - len(keys))
+                keys.extend((section_idx, row_idx) for row_idx in rows)
+        return keys
+
+    def on_search_changed(self):
+        """Show matches across all sections, or go back to the tabs."""
+        query = self.search_var.get()
+        if not query.strip():
+            if self.searching:
+                self.searching = False
+                self.results_frame.pack_forget()
+                self.notebook.pack(fill=self.tk.BOTH, expand=True)
+                self.sync_listboxes()
+            return
+
+        if not self.searching:
+            self.searching = True
+            self.notebook.pack_forget()
+            self.results_frame.pack(fill=self.tk.BOTH, expand=True)
+
+        truncate_len = int(self.config.get("settings", {}).get(
+            "truncate_length",
+            DEFAULT_TRUNCATE_LENGTH,
+        ))
+        self.fill_key_listbox(self.results_listbox, self.search(query), truncate_len)
+
+    def make_key_listbox(self, parent):
+        """Listbox whose rows are (section_idx, row_idx) keys from any section."""
+        listbox = self.tk.Listbox(
+            parent,
+            selectmode=self.tk.MULTIPLE,
+            activestyle="dotbox",
+            exportselection=False,
+        )
+        listbox.pack(fill=self.tk.BOTH, expand=True)
+        listbox.bind("<Double-Button-1>", lambda _event: self.accept())
+        listbox.bind("<<ListboxSelect>>", lambda _event: self.on_key_listbox_select(listbox))
+        listbox.keys = []
+        listbox.selected_rows = set()
+        return listbox
+
+    def fill_key_listbox(self, listbox, keys, truncate_len):
+        listbox.keys = keys
+        listbox.delete(0, self.tk.END)
+        listbox.insert(self.tk.END, *[
+            f"{self.config['sections'][section_idx]['name']}: {self.preview(section_idx, row_idx, truncate_len)}"
+            for section_idx, row_idx in keys
+        ])
+        self.sync_key_listbox(listbox)
+
+    def on_key_listbox_select(self, listbox):
+        """Apply the search or Frequent rows that changed to the selection."""
+        current = set(listbox.curselection())
+        for row_idx in sorted(current - listbox.selected_rows):
+            section_idx, string_idx = listbox.keys[row_idx]
+            text = self.config["sections"][section_idx]["strings"][string_idx]
+            self.selection.add((section_idx, string_idx), text)
+        for row_idx in listbox.selected_rows - current:
+            self.selection.discard(listbox.keys[row_idx])
+        listbox.selected_rows = current
+        if listbox is self.frequent_listbox:
+            self.sync_listboxes()
+
+    def sync_key_listbox(self, listbox):
+        if listbox is None:
+            return
+        listbox.selection_clear(0, self.tk.END)
+        for row_idx, key in enumerate(listbox.keys):
+            if key in self.selection:
+                listbox.selection_set(row_idx)
+        listbox.selected_rows = set(listbox.curselection())
+
+    def sync_listboxes(self):
+        """Mirror the selection model into the section and Frequent listboxes."""
+        built = [listbox for listbox in self.listboxes if listbox is not None]
+        for listbox in built:
+            listbox.selection_clear(0, self.tk.END)
+        for section_idx, row_idx in self.selection.entries:
+            if self.listboxes[section_idx] is not None:
+                self.listboxes[section_idx].selection_set(row_idx)
+        for listbox in built:
+            listbox.selected_rows = set(listbox.curselection())
+        self.sync_key_listbox(self.frequent_listbox)
+
+    def on_escape(self):
+        if self.searching:
+            self.search_var.set("")
+            return
+        self.cancel()
+
+    def on_listbox_select(self, section_idx):
+        """Apply the rows that changed in one listbox to the selection."""
+        listbox = self.listboxes[section_idx]
+        strings = self.config["sections"][section_idx].get("strings", [])
+        current = set(listbox.curselection())
+        for row_idx in sorted(current - listbox.selected_rows):
+            if row_idx < len(strings):
+                self.selection.add((section_idx, row_idx), strings[row_idx])
+        for row_idx in listbox.selected_rows - current:
+            self.selection.discard((section_idx, row_idx))
+        listbox.selected_rows = current
+        self.sync_key_listbox(self.frequent_listbox)
+
     def selected_strings(self):
-        selected = []
-        for section_idx, listbox in enumerate(self.listboxes):
-            strings = self.config["sections"][section_idx].get("strings", [])
-            for row_idx in listbox.curselection():
-                if row_idx < len(strings):
-                    selected.append(strings[row_idx])
-        return selected
+        return self.selection.texts()
 
     def selected_text(self):
         return ", ".join(self.selected_strings())
 
+    def record_usage(self):
+        self.usage_log.record([
+            (self.config["sections"][section_idx], row_idx, text)
+            for (section_idx, row_idx), text in self.selection.entries.items()
+        ])
+
     def open_editor(self):
-        editor = ConfigEditor(self.root, self.config)
-        if editor.saved:
-            self.config = load_config()
-            self.build_ui()
+        self.editing = True
+        editor = ConfigEditor(self.root, self.snapshot.config)
+        self.editing = False
+        if editor.saved is not None:
+            self.reload_pending = False  # The save replaces outside changes.
+            # Keep the tabs of sections whose strings the edit did not touch.
+            origins = {}
+            for section_idx in range(len(editor.model)):
+                origin = editor.model.origin(section_idx)
+                if origin is not None:
+                    origins[section_idx] = origin
+            # The save runs in the background; use what the editor saved.
+            self.replace_config(ConfigSnapshot(editor.saved_config), origins, editor.saved)
+        elif self.reload_pending:
+            self.reload_pending = False
+            self.on_config_changed()
+
+    def replace_config(self, snapshot, origins, saved=None, refreshed=()):
+        """Swap in a new config; origins maps unchanged sections to their old index.
+
+        Directory sections are re-attached after the stored ones and keep
+        their tabs, except those in refreshed.
+        """
+        old_config = self.config
+        old_truncate_len = self.truncate_len()
+        old_stored = len(self.snapshot.config["sections"])
+        stored_changed = snapshot is not self.snapshot
+        self.snapshot = snapshot
+        directory_settings = self.get_directory_settings(snapshot.config)
+        if directory_settings != self.directory_settings:
+            self.directory_settings = directory_settings
+            self.directories = directory_sections(snapshot.config["settings"], self.truncate_len(snapshot.config))
+            refreshed = self.directories
+            if self.directories and self.directory_watcher is None:
+                try:
+                    self.directory_watcher = DirectoryWatcher(self.tk, self.root, self.refresh_directories)
+                except OSError:
+                    pass
+            self.refresh_directories(self.directories)
+        self.config = with_directory_sections(snapshot.config, self.directories)
+        self.selection.remap(old_config, self.config)
+        origins = dict(origins)
+        stored = len(snapshot.config["sections"])
+        for position, directory in enumerate(self.directories):
+            if directory not in refreshed:
+                origins[stored + position] = old_stored + position
+        reused = {}
+        if self.truncate_len() == old_truncate_len:
+            for section_idx, origin in origins.items():
+                reused[section_idx] = (self.section_frames[origin], self.listboxes[origin])
+        self.populate_tabs(reused)
+        if stored_changed:
+            self.start_search_index(saved)
+        if self.searching:
+            self.on_search_changed()
+
+    @staticmethod
+    def get_directory_settings(config):
+        settings = config["settings"]
+        return settings.get("directory_sections"), settings.get("truncate_length", DEFAULT_TRUNCATE_LENGTH)
+
+    def refresh_directories(self, directories):
+        """Re-index directory sections off the Tk thread, one thread each."""
+        for directory in directories:
+            if directory not in self.directories:
+                continue  # Dropped from the settings.
+            if directory.refreshing:
+                directory.stale = True
+                continue
+            directory.refreshing = True
+
+            def worker(directory=directory):
+                # Tk is not thread-safe; hand results over through a list.
+                changed = True  # Redraw whatever a failed refresh left behind.
+                try:
+                    if not directory.loaded:
+                        directory.load()
+                        self.directory_updates.append((directory, bool(directory.entries), False))
+                    changed = directory.refresh()
+                finally:
+                    # Always clear refreshing, or the folder is never rescanned.
+                    self.directory_updates.append((directory, changed, True))
+
+            threading.Thread(target=worker, name="prompt-click-directory", daemon=True).start()
+        if not self.polling_directories and any(directory.refreshing for directory in self.directories):
+            self.polling_directories = True
+            self.root.after(50, self.poll_directories)
+
+    def poll_directories(self):
+        updates, self.directory_updates = self.directory_updates, []
+        refreshed = set()
+        stale = []
+        for directory, changed, done in updates:
+            if done:
+                directory.refreshing = False
+                if self.directory_watcher is not None and directory in self.directories:
+                    self.directory_watcher.watch(directory)
+                if directory.stale:
+                    directory.stale = False
+                    stale.append(directory)
+            if changed and directory in self.directories:
+                refreshed.add(directory)
+        if refreshed:
+            origins = {section_idx: section_idx for section_idx in range(len(self.snapshot.config["sections"]))}
+            self.replace_config(self.snapshot, origins, refreshed=refreshed)
+        self.polling_directories = False
+        self.refresh_directories(stale)
+        if not self.polling_directories and (
+            self.directory_updates or any(directory.refreshing for directory in self.directories)
+        ):
+            self.polling_directories = True
+            self.root.after(50, self.poll_directories)
+
+    def on_config_changed(self):
+        """Reload the config after another process saved it."""
+        if self.editing:
+            self.reload_pending = True  # Reload if the edit is cancelled.
+            return
+        if self.reloading:
+            return  # Checked again once the running reload lands.
+        if config_journal.version() == config_journal.loaded_version:
+            return  # Our own save, or nothing new.
+        base = self.snapshot
+        self.reloading = True
+
+        def worker():
+            loaded = None
+            try:
+                # Usually a snapshot hit: the saving process wrote one.
+                loaded = read_config_snapshot()
+            finally:
+                # Tk is not thread-safe; hand the result over through an
+                # attribute, None if loading failed, so the poll always ends.
+                self.pending_snapshot = (base, loaded)
+
+        threading.Thread(target=worker, name="prompt-click-reload", daemon=True).start()
+        self.root.after(50, self.poll_config_snapshot)
+
+    def poll_config_snapshot(self):
+        pending = self.pending_snapshot
+        if pending is None or self.editing:
+            # Still loading, or held back until the editor closes.
+            self.root.after(50, self.poll_config_snapshot)
+            return
+        self.pending_snapshot = None
+        self.reloading = False
+        base, loaded = pending
+        if loaded is None:
+            return  # Retried on the next change to strings.json.
+        if self.snapshot is base:  # Otherwise the editor saved over it.
+            snapshot = adopt_config_snapshot(*loaded)
+            old_sections = base.config["sections"]
+            origins = {
+                section_idx: section_idx
+                for section_idx, (old, new) in enumerate(zip(old_sections, snapshot.config["sections"]))
+                if old["name"] == new["name"] and old["strings"] == new["strings"]
+            }
+            self.replace_config(snapshot, origins)
+        # Pick up saves that landed while loading.
+        self.on_config_changed()
 
     def copy_only(self):
         text = self.selected_text()
@@ -589,6 +2886,7 @@ class PickerApp:
         copy_text_to_clipboard(text)
         notify_user("Copied selected text")
         self.root.destroy()
+        self.record_usage()
 
     def accept(self):
         text = self.selected_text()
@@ -600,6 +2898,7 @@ class PickerApp:
             if not request_autopaste(text):
                 notify_user("Copied selected text. Auto-paste trigger failed.")
             self.root.destroy()
+            self.record_usage()
             return
 
         self.root.destroy()
@@ -608,6 +2907,7 @@ class PickerApp:
                 notify_user("Copied selected text. Auto-paste needs Accessibility permission.")
         else:
             notify_user("Copied selected text")
+        self.record_usage()
 
     def cancel(self):
         self.root.destroy()
@@ -654,10 +2954,12 @@ def main():
 
     if args.edit:
         run_editor()
+        fold_config_journal()
         return 0
 
     app = PickerApp(args.paste_mode)
     app.run()
+    fold_config_journal()
     return 0
 
 
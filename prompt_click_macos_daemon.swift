@@ -18,12 +18,129 @@ struct AutoPastePayload: Decodable {
     let text: String
 }
 
+/// Local control socket that lets the picker use the daemon's clipboard,
+/// paste and notification code instead of spawning osascript or pbcopy.
+/// Each connection carries one JSON request per line and gets one JSON
+/// reply per line; requests are executed on the main thread.
+final class AutomationChannel {
+    let socketPath: String
+    private let handler: ([String: Any]) -> [String: Any]
+    private var listenFD: Int32 = -1
+
+    init(socketPath: String, handler: @escaping ([String: Any]) -> [String: Any]) {
+        self.socketPath = socketPath
+        self.handler = handler
+    }
+
+    func start() -> Bool {
+        unlink(socketPath)
+        listenFD = socket(AF_UNIX, SOCK_STREAM, 0)
+        guard listenFD >= 0 else {
+            fputs("\(label): failed to create control socket\n", stderr)
+            return false
+        }
+
+        var address = sockaddr_un()
+        address.sun_family = sa_family_t(AF_UNIX)
+        let pathBytes = Array(socketPath.utf8)
+        guard pathBytes.count < MemoryLayout.size(ofValue: address.sun_path) else {
+            fputs("\(label): control socket path is too long: \(socketPath)\n", stderr)
+            close(listenFD)
+            return false
+        }
+        withUnsafeMutableBytes(of: &address.sun_path) { buffer in
+            buffer.copyBytes(from: pathBytes)
+        }
+
+        let bound = withUnsafePointer(to: &address) { pointer in
+            pointer.withMemoryRebound(to: sockaddr.self, capacity: 1) {
+                bind(listenFD, $0, socklen_t(MemoryLayout<sockaddr_un>.size))
+            }
+        }
+        guard bound == 0, listen(listenFD, 4) == 0 else {
+            fputs("\(label): failed to listen on \(socketPath)\n", stderr)
+            close(listenFD)
+            return false
+        }
+        chmod(socketPath, 0o600)
+
+        Thread.detachNewThread { [weak self] in
+            self?.acceptLoop()
+        }
+        writeLine("\(label): control socket at \(socketPath)")
+        return true
+    }
+
+    private func acceptLoop() {
+        while true {
+            let fd = accept(listenFD, nil, nil)
+            if fd < 0 {
+                continue
+            }
+            var noSigPipe: Int32 = 1
+            setsockopt(fd, SOL_SOCKET, SO_NOSIGPIPE, &noSigPipe, socklen_t(MemoryLayout<Int32>.size))
+            Thread.detachNewThread { [weak self] in
+                self?.serve(fd)
+            }
+        }
+    }
+
+    private func serve(_ fd: Int32) {
+        defer { close(fd) }
+        var pending = Data()
+        var chunk = [UInt8](repeating: 0, count: 4096)
+
+        while true {
+            let count = read(fd, &chunk, chunk.count)
+            if count <= 0 {
+                return
+            }
+            pending.append(contentsOf: chunk[0..<count])
+
+            while let newline = pending.firstIndex(of: 0x0A) {
+                let line = pending.subdata(in: pending.startIndex..<newline)
+                pending.removeSubrange(pending.startIndex...newline)
+                var reply = respond(to: line)
+                reply.append(0x0A)
+                guard send(reply, to: fd) else {
+                    return
+                }
+            }
+        }
+    }
+
+    private func respond(to line: Data) -> Data {
+        var reply: [String: Any] = ["ok": false, "error": "bad request"]
+        if let request = (try? JSONSerialization.jsonObject(with: line)) as? [String: Any] {
+            DispatchQueue.main.sync {
+                reply = self.handler(request)
+            }
+        }
+        return (try? JSONSerialization.data(withJSONObject: reply)) ?? Data("{\"ok\":false}".utf8)
+    }
+
+    private func send(_ data: Data, to fd: Int32) -> Bool {
+        return data.withUnsafeBytes { (buffer: UnsafeRawBufferPointer) -> Bool in
+            var offset = 0
+            while offset < buffer.count {
+                let written = write(fd, buffer.baseAddress! + offset, buffer.count - offset)
+                if written <= 0 {
+                    return false
+                }
+                offset += written
+            }
+            return true
+        }
+    }
+}
+
 final class PromptClickDaemon {
     private var eventTap: CFMachPort?
     private var runLoopSource: CFRunLoopSource?
     private var lastLaunch = Date.distantPast
     private var launchInProgress = false
     private let lock = NSLock()
+    private var channel: AutomationChannel?
 
     private var promptBinary: String {
         if let configured = ProcessInfo.processInfo.environment["PROMPT_CLICK_BIN"], !configured.isEmpty {
@@ -86,9 +203,70 @@ final class PromptClickDaemon {
         CFRunLoopAddSource(CFRunLoopGetCurrent(), source, .commonModes)
         CGEvent.tapEnable(tap: tap, enable: true)
         writeLine("\(label): listening for middle mouse clicks")
+        startChannel()
         return true
     }
 
+    private func startChannel() {
+        do {
+            try FileManager.default.createDirectory(
+                at: triggerDirectory,
+                withIntermediateDirectories: true
+            )
+        } catch {
+            fputs("\(label): failed to prepare control socket directory: \(error)\n", stderr)
+            return
+        }
+
+        let socketPath = triggerDirectory.appendingPathComponent("daemon.sock").path
+        let channel = AutomationChannel(socketPath: socketPath) { [weak self] request in
+            self?.handleChannelRequest(request) ?? ["ok": false, "error": "daemon stopped"]
+        }
+        if channel.start() {
+            self.channel = channel
+        }
+    }
+
+    private func handleChannelRequest(_ request: [String: Any]) -> [String: Any] {
+        switch request["op"] as? String {
+        case "frontmost":
+            let app = NSWorkspace.shared.frontmostApplication
+            return [
+                "ok": true,
+                "bundle_id": app?.bundleIdentifier ?? "",
+                "name": app?.localizedName ?? "",
+            ]
+        case "clipboard":
+            guard let text = request["text"] as? String else {
+                return ["ok": false, "error": "missing text"]
+            }
+            setClipboard(text)
+            return ["ok": true]
+        case "paste":
+            let app = runningApplication(
+                bundleID: request["bundle_id"] as? String,
+                name: request["name"] as? String
+            )
+            activateAndPaste(app)
+            return ["ok": true]
+        case "notify":
+            notify(request["message"] as? String ?? "")
+            return ["ok": true]
+        default:
+            return ["ok": false, "error": "unknown op"]
+        }
+    }
+
+    private func runningApplication(bundleID: String?, name: String?) -> NSRunningApplication? {
+        if let bundleID, !bundleID.isEmpty {
+            return NSRunningApplication.runningApplications(withBundleIdentifier: bundleID).first
+        }
+        if let name, !name.isEmpty {
+            return NSWorkspace.shared.runningApplications.first { $0.localizedName == name }
+        }
+        return nil
+    }
+
     private func handleEvent(proxy: CGEventTapProxy, type: CGEventType, event: CGEvent) -> Unmanaged<CGEvent>? {
         if type == .tapDisabledByTimeout || type == .tapDisabledByUserInput {
             if let eventTap {
@@ -160,6 +338,11 @@ final class PromptClickDaemon {
         }
         environment["PROMPT_CLICK_AUTOPASTE_TOKEN"] = token
         environment["PROMPT_CLICK_AUTOPASTE_TRIGGER"] = triggerURL.path
+        environment["PROMPT_CLICK_FRONTMOST_BUNDLE_ID"] = previousApp?.bundleIdentifier ?? ""
+        environment["PROMPT_CLICK_FRONTMOST_NAME"] = previousApp?.localizedName ?? ""
+        if let channel {
+            environment["PROMPT_CLICK_DAEMON_SOCKET"] = channel.socketPath
+        }
         process.environment = environment
         process.terminationHandler = { [weak self] _ in
             self?.handlePromptExit(triggerURL: triggerURL, token: token, previousApp: previousApp)
@@ -192,8 +375,12 @@ final class PromptClickDaemon {
         }
 
         setClipboard(payload.text)
+        activateAndPaste(previousApp)
+    }
+
+    private func activateAndPaste(_ app: NSRunningApplication?) {
         DispatchQueue.main.asyncAfter(deadline: .now() + 0.12) {
-            previousApp?.activate(options: [])
+            app?.activate(options: [])
             DispatchQueue.main.asyncAfter(deadline: .now() + 0.12) {
                 self.emitPaste()
                 writeLine("\(label): pasted selected text")
@@ -201,6 +388,18 @@ final class PromptClickDaemon {
         }
     }
 
+    private func notify(_ message: String) {
+        let safe = message
+            .replacingOccurrences(of: "\\", with: "\\\\")
+            .replacingOccurrences(of: "\"", with: "\\\"")
+        var error: NSDictionary?
+        NSAppleScript(source: "display notification \"\(safe)\" with title \"Prompt Click\"")?
+            .executeAndReturnError(&error)
+        if let error {
+            fputs("\(label): notification failed: \(error)\n", stderr)
+        }
+    }
+
     private func setClipboard(_ text: String) {
         let pasteboard = NSPasteboard.general
         pasteboard.clearContents()
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import contextlib
 import glob
 import json
 import logging
@@ -20,7 +21,16 @@ PROMPT_BINARY_NAME = "prompt_click"
 SESSION_RETRY_SECONDS = 2.0
 DEVICE_RETRY_SECONDS = 2.0
 LAUNCH_COOLDOWN_SECONDS = 0.5
-PASTE_DELAY_SECONDS = 0.15
+CLIPBOARD_CONFIRM_TIMEOUT_SECONDS = 0.5
+CLIPBOARD_POLL_INTERVAL_SECONDS = 0.01
+TRIGGER_POLL_INTERVAL_SECONDS = 0.01
+FOCUS_SETTLE_SECONDS = 0.05
+DIRECT_TYPE_MAX_CHARS = 200
+FORM_FILL_PASTE_SETTLE_SECONDS = 0.05
+FORM_FILL_KEYS = {"tab": "KEY_TAB", "enter": "KEY_ENTER", "down": "KEY_DOWN"}
+KEYBOARD_DEFAULTS_FILE = "/etc/default/keyboard"
+DCONF_USER_FILE = ".config/dconf/user"  # Relative to the user's home
+TRACE_DIR = os.environ.get("PROMPT_CLICK_TRACE_DIR")
 ENV_KEYS = (
     "DBUS_SESSION_BUS_ADDRESS",
     "DESKTOP_SESSION",
@@ -38,6 +48,36 @@ _keyboard = None
 _keyboard_lock = threading.Lock()
 _prompt_thread = None
 _prompt_thread_lock = threading.Lock()
+_type_tables = {}  # {user: (layout source key, table)}
+
+# (unshifted, shifted, key) for the US layout; letters are added below.
+US_LAYOUT_KEYS = (
+    ("1", "!", "KEY_1"),
+    ("2", "@", "KEY_2"),
+    ("3", "#", "KEY_3"),
+    ("4", "$", "KEY_4"),
+    ("5", "%", "KEY_5"),
+    ("6", "^", "KEY_6"),
+    ("7", "&", "KEY_7"),
+    ("8", "*", "KEY_8"),
+    ("9", "(", "KEY_9"),
+    ("0", ")", "KEY_0"),
+    ("-", "_", "KEY_MINUS"),
+    ("=", "+", "KEY_EQUAL"),
+    ("[", "{", "KEY_LEFTBRACE"),
+    ("]", "}", "KEY_RIGHTBRACE"),
+    ("\\", "|", "KEY_BACKSLASH"),
+    (";", ":", "KEY_SEMICOLON"),
+    ("'", '"', "KEY_APOSTROPHE"),
+    ("`", "~", "KEY_GRAVE"),
+    (",", "<", "KEY_COMMA"),
+    (".", ">", "KEY_DOT"),
+    ("/", "?", "KEY_SLASH"),
+    (" ", None, "KEY_SPACE"),
+) + tuple(
+    (letter, letter.upper(), f"KEY_{letter.upper()}")
+    for letter in "abcdefghijklmnopqrstuvwxyz"
+)
 
 
 @dataclass
@@ -68,6 +108,95 @@ class GraphicalSession:
         return os.path.join(self.runtime_dir, "prompt_click_middle_launch.log")
 
 
+class Tracer:
+    """Spans of one click, written in the Chrome trace JSON array format.
+
+    The daemon and the picker append to the same file, one write per
+    event, so Perfetto or chrome://tracing shows a click as one timeline.
+    Every event carries the click's token. Timestamps come from
+    CLOCK_MONOTONIC, which both processes share. A tracer without a path
+    records nothing. With create set the file must not exist yet, and is
+    never reached through a symlink.
+    """
+
+    def __init__(self, path, token, process_name, create=False):
+        self.path = path
+        self.token = token
+        self.fd = None
+        if path is None:
+            return
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC
+        if create:
+            flags |= os.O_EXCL | os.O_NOFOLLOW
+        try:
+            self.fd = os.open(path, flags, 0o644)
+            if os.fstat(self.fd).st_size == 0:
+                os.write(self.fd, b"[\n")  # The closing bracket is optional
+        except OSError:
+            logging.exception("Failed to open trace file %s", path)
+            self.close()
+            return
+        self.write({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": process_name}})
+
+    def write(self, event):
+        if self.fd is None:
+            return
+        try:
+            os.write(self.fd, (json.dumps(event) + ",\n").encode("utf-8"))
+        except OSError:
+            pass
+
+    def complete(self, name, start_ns, **args):
+        """Record a span from start_ns, a time.monotonic_ns() value, until now."""
+        if self.fd is None:
+            return
+        end_ns = time.monotonic_ns()
+        self.write({
+            "name": name,
+            "cat": "prompt_click",
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "args": {"token": self.token, **args},
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start_ns = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.complete(name, start_ns, **args)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _open_tracer(session, token):
+    """Tracer for one click, shared with the picker it launches."""
+    if not TRACE_DIR:
+        return Tracer(None, token, "prompt_click_middle_daemon")
+    path = os.path.join(TRACE_DIR, f"{token}.json")
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+    except OSError:
+        logging.exception("Failed to create trace directory %s", TRACE_DIR)
+        return Tracer(None, token, "prompt_click_middle_daemon")
+    # Root creates the file, so a link planted at the path must not be followed
+    tracer = Tracer(path, token, "prompt_click_middle_daemon", create=True)
+    if tracer.fd is None:
+        return tracer
+    try:
+        os.fchown(tracer.fd, session.uid, session.gid)
+    except OSError:
+        logging.exception("Failed to hand trace file %s to %s", path, session.user)
+    return tracer
+
+
 def _stop(_signum, _frame):
     global _running
     _running = False
@@ -296,7 +425,7 @@ def _session_env_items(session, extra_env=None):
     return [f"{key}={value}" for key, value in sorted(env.items()) if value]
 
 
-def _build_prompt_cmd(session, token):
+def _build_prompt_cmd(session, token, trace_path=None):
     return [
         "/usr/sbin/runuser",
         "-u",
@@ -308,6 +437,7 @@ def _build_prompt_cmd(session, token):
             {
                 "PROMPT_CLICK_AUTOPASTE_TOKEN": token,
                 "PROMPT_CLICK_AUTOPASTE_TRIGGER": session.trigger_path,
+                "PROMPT_CLICK_TRACE_FILE": trace_path,
             },
         ),
         session.prompt_path,
@@ -332,8 +462,20 @@ def _emit_paste():
     logging.info("Injected Shift+Insert into active window")
 
 
-def _copy_with_xclip(session, text_bytes):
-    base_cmd = [
+def _tap_key(code):
+    if _keyboard is None:
+        logging.error("Virtual keyboard is not initialized")
+        return
+
+    with _keyboard_lock:
+        _keyboard.write(ecodes.EV_KEY, code, 1)
+        _keyboard.syn()
+        _keyboard.write(ecodes.EV_KEY, code, 0)
+        _keyboard.syn()
+
+
+def _session_base_cmd(session):
+    return [
         "/usr/sbin/runuser",
         "-u",
         session.user,
@@ -341,6 +483,128 @@ def _copy_with_xclip(session, text_bytes):
         "env",
         *_session_env_items(session),
     ]
+
+
+def _build_us_type_table():
+    table = {}
+    for plain, shifted, key_name in US_LAYOUT_KEYS:
+        code = getattr(ecodes, key_name)
+        table[plain] = (code, False)
+        if shifted:
+            table[shifted] = (code, True)
+    return table
+
+
+def _read_keyboard_defaults():
+    data = {}
+    try:
+        with open(KEYBOARD_DEFAULTS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if "=" in line and not line.lstrip().startswith("#"):
+                    key, value = line.split("=", 1)
+                    data[key.strip()] = value.strip().strip('"')
+    except OSError:
+        pass
+    return data
+
+
+def _session_input_sources(session):
+    """Return the user's GNOME xkb input sources, or None if unknown."""
+    try:
+        result = subprocess.run(
+            _session_base_cmd(session)
+            + ["gsettings", "get", "org.gnome.desktop.input-sources", "sources"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    # Output looks like "[('xkb', 'us'), ('xkb', 'de')]" or "@a(ss) []".
+    return [
+        part.split("'")[3]
+        for part in result.stdout.split("(")[1:]
+        if part.count("'") >= 4
+    ]
+
+
+def _session_layout(session):
+    sources = _session_input_sources(session)
+    if sources:
+        # With several sources the active one is unknown, so do not guess.
+        return sources[0] if len(sources) == 1 else None
+
+    defaults = _read_keyboard_defaults()
+    layouts = defaults.get("XKBLAYOUT", "").split(",")
+    if len(layouts) != 1 or defaults.get("XKBVARIANT"):
+        return None
+    return layouts[0] or None
+
+
+def _layout_source_key(session):
+    """Identify the layout settings a table was computed from.
+
+    gsettings are stored in the user's dconf database, so its mtime changes
+    whenever the input sources do; stat-ing it is far cheaper than asking
+    gsettings on every paste.
+    """
+    key = [session.session_id]
+    for path in (os.path.join(session.home, DCONF_USER_FILE), KEYBOARD_DEFAULTS_FILE):
+        try:
+            key.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            key.append(None)
+    return tuple(key)
+
+
+def _type_table_for(session):
+    """Character -> (keycode, shift) table for the session's keymap.
+
+    Computed again when the session or its layout settings change. Only the
+    US layout is known; any other layout gets an empty table so every paste
+    goes through the clipboard.
+    """
+    source_key = _layout_source_key(session)
+    cached = _type_tables.get(session.user)
+    if cached is not None and cached[0] == source_key:
+        return cached[1]
+    layout = _session_layout(session)
+    table = _build_us_type_table() if layout == "us" else {}
+    _type_tables[session.user] = (source_key, table)
+    logging.info("Direct typing layout for %s: %s", session.user, layout or "unknown")
+    return table
+
+
+def _can_type(text, table):
+    return bool(table) and len(text) <= DIRECT_TYPE_MAX_CHARS and all(
+        char in table for char in text
+    )
+
+
+def _type_text(text, table):
+    if _keyboard is None:
+        logging.error("Virtual keyboard is not initialized")
+        return
+
+    with _keyboard_lock:
+        for char in text:
+            code, shift = table[char]
+            if shift:
+                _keyboard.write(ecodes.EV_KEY, ecodes.KEY_LEFTSHIFT, 1)
+            _keyboard.write(ecodes.EV_KEY, code, 1)
+            _keyboard.syn()
+            _keyboard.write(ecodes.EV_KEY, code, 0)
+            if shift:
+                _keyboard.write(ecodes.EV_KEY, ecodes.KEY_LEFTSHIFT, 0)
+            _keyboard.syn()
+
+    logging.info("Typed %d characters into active window", len(text))
+
+
+def _copy_with_xclip(session, text_bytes):
+    base_cmd = _session_base_cmd(session)
     for selection in ("clipboard", "primary"):
         proc = subprocess.Popen(
             base_cmd + ["xclip", "-selection", selection],
@@ -352,14 +616,7 @@ def _copy_with_xclip(session, text_bytes):
 
 
 def _copy_with_wl_copy(session, text_bytes):
-    base_cmd = [
-        "/usr/sbin/runuser",
-        "-u",
-        session.user,
-        "--",
-        "env",
-        *_session_env_items(session),
-    ]
+    base_cmd = _session_base_cmd(session)
     subprocess.run(
         base_cmd + ["wl-copy", "--type", "text/plain;charset=utf-8"],
         input=text_bytes,
@@ -376,25 +633,175 @@ def _copy_with_wl_copy(session, text_bytes):
     )
 
 
+def _xclip_owns_text(session, text_bytes, timeout):
+    # A clipboard owner that never answers would block xclip -o forever.
+    try:
+        result = subprocess.run(
+            _session_base_cmd(session) + ["xclip", "-o", "-selection", "clipboard"],
+            capture_output=True,
+            check=False,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return False
+    return result.returncode == 0 and result.stdout == text_bytes
+
+
+def _wait_for_clipboard(session, text_bytes):
+    """Poll until the xclip owner serves text_bytes; False on timeout."""
+    deadline = time.monotonic() + CLIPBOARD_CONFIRM_TIMEOUT_SECONDS
+    while True:
+        timeout = max(deadline - time.monotonic(), CLIPBOARD_POLL_INTERVAL_SECONDS)
+        if _xclip_owns_text(session, text_bytes, timeout):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(CLIPBOARD_POLL_INTERVAL_SECONDS)
+
+
 def _set_clipboard_text(session, text):
+    """Copy text for the session; False if the clipboard is not confirmed."""
     text_bytes = text.encode("utf-8")
     if session.session_type == "wayland" and _command_exists("wl-copy"):
+        # wl-copy only returns once it has taken the selection.
         _copy_with_wl_copy(session, text_bytes)
         logging.info("Updated clipboard with selected Prompt Click text via wl-copy")
-        return
+        return True
 
     if session.env.get("DISPLAY") and _command_exists("xclip"):
+        # xclip forks before taking ownership, so read the text back.
         _copy_with_xclip(session, text_bytes)
+        if not _wait_for_clipboard(session, text_bytes):
+            logging.warning("xclip did not take clipboard ownership in time")
+            return False
         logging.info("Updated clipboard with selected Prompt Click text via xclip")
-        return
+        return True
 
     logging.warning("No clipboard helper available; keeping Prompt Click clipboard state")
+    return True
+
+
+def _read_trigger(session):
+    try:
+        with open(session.trigger_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _paste_request(payload, token):
+    return (
+        isinstance(payload, dict)
+        and payload.get("token") == token
+        and isinstance(payload.get("text"), str)
+    )
+
+
+def _fill_fields(session, fields, separator, table, focus_confirmed, tracer):
+    """Paste each field in turn, tapping the separator key between them.
+
+    Typeable fields are typed and cost no clipboard round trip; a pasted
+    field gets FORM_FILL_PASTE_SETTLE_SECONDS to read the clipboard before
+    the next field replaces it.
+    """
+    code = getattr(ecodes, FORM_FILL_KEYS.get(separator, FORM_FILL_KEYS["tab"]))
+    if not focus_confirmed:
+        time.sleep(FOCUS_SETTLE_SECONDS)
+    pasted = False
+    for index, text in enumerate(fields):
+        if index:
+            if pasted:
+                time.sleep(FORM_FILL_PASTE_SETTLE_SECONDS)
+            _tap_key(code)
+        pasted = False
+        if not text:
+            continue
+        if _can_type(text, table):
+            with tracer.span("type_text", field=index):
+                _type_text(text, table)
+        elif _set_clipboard(session, text, tracer, field=index):
+            with tracer.span("emit_paste", field=index):
+                _emit_paste()
+            pasted = True
+        else:
+            logging.warning("Stopped filling after %d fields: clipboard does not hold the next one", index)
+            return
+    logging.info("Filled %d fields", len(fields))
+
+
+def _set_clipboard(session, text, tracer, **args):
+    with tracer.span("clipboard", **args):
+        return _set_clipboard_text(session, text)
+
+
+def _paste_payload(session, payload, tracer):
+    fields = payload.get("fields")
+    if isinstance(fields, list) and all(isinstance(field, str) for field in fields):
+        table = _type_table_for(session) if payload.get("direct_typing") else {}
+        with tracer.span("fill_fields", fields=len(fields)):
+            _fill_fields(session, fields, payload.get("separator"), table, payload.get("focus_confirmed"), tracer)
+        return
+
+    text = payload["text"]
+    table = _type_table_for(session) if payload.get("direct_typing") else {}
+    if _can_type(text, table):
+        if not payload.get("focus_confirmed"):
+            time.sleep(FOCUS_SETTLE_SECONDS)
+        with tracer.span("type_text"):
+            _type_text(text, table)
+    elif _set_clipboard(session, text, tracer):
+        # The popup is hidden or gone; without a focus confirmation from
+        # the picker, give the compositor a moment to refocus.
+        if not payload.get("focus_confirmed"):
+            time.sleep(FOCUS_SETTLE_SECONDS)
+        with tracer.span("emit_paste"):
+            _emit_paste()
+    else:
+        logging.warning("Skipping paste: clipboard does not hold the selected text")
+
 
+def _serve_sticky_pastes(session, token, proc, tracer):
+    """Paste the requests of a popup that stays open until it exits.
 
-def _run_prompt_click_session(session):
+    Each request carries a sequence number, written back as "done" once
+    the paste is injected so the popup knows when it may come back.
+    """
+    signature = None
+    served = set()
+    while True:
+        try:
+            proc.wait(timeout=TRIGGER_POLL_INTERVAL_SECONDS)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            stat = os.stat(session.trigger_path)
+        except OSError:
+            continue
+        if (stat.st_mtime_ns, stat.st_size) == signature:
+            continue
+        signature = (stat.st_mtime_ns, stat.st_size)
+        payload = _read_trigger(session)
+        if not _paste_request(payload, token) or not payload.get("sticky"):
+            continue  # Partly written, or a final request served after exit
+        sequence = payload.get("sequence")
+        if sequence in served:
+            continue
+        served.add(sequence)
+        with tracer.span("paste", sequence=sequence):
+            _paste_payload(session, payload, tracer)
+        try:
+            with open(session.trigger_path, "w", encoding="utf-8") as f:
+                json.dump({"token": token, "done": sequence}, f)
+        except OSError:
+            logging.exception("Failed to confirm paste in %s", session.trigger_path)
+        logging.info("Served sticky paste %s", sequence)
+
+
+def _run_prompt_click_session(session, token, tracer):
     global _prompt_thread
 
-    token = uuid.uuid4().hex
+    started_ns = time.monotonic_ns()
     try:
         with open(session.trigger_path, "w", encoding="utf-8") as f:
             f.write("")
@@ -404,27 +811,20 @@ def _run_prompt_click_session(session):
         logging.exception("Failed to reset trigger file %s", session.trigger_path)
 
     try:
-        with open(session.log_path, "ab") as log_file:
-            subprocess.run(
-                _build_prompt_cmd(session, token),
+        with open(session.log_path, "ab") as log_file, tracer.span("picker"):
+            proc = subprocess.Popen(
+                _build_prompt_cmd(session, token, tracer.path),
                 stdout=log_file,
                 stderr=subprocess.STDOUT,
-                check=False,
             )
+            _serve_sticky_pastes(session, token, proc, tracer)
     except OSError:
         logging.exception("Failed to launch Prompt Click")
 
-    payload = None
-    try:
-        with open(session.trigger_path, "r", encoding="utf-8") as f:
-            payload = json.load(f)
-    except (OSError, json.JSONDecodeError):
-        payload = None
-
-    if payload and payload.get("token") == token and isinstance(payload.get("text"), str):
-        _set_clipboard_text(session, payload["text"])
-        time.sleep(PASTE_DELAY_SECONDS)
-        _emit_paste()
+    payload = _read_trigger(session)
+    if _paste_request(payload, token) and not payload.get("sticky"):
+        with tracer.span("paste"):
+            _paste_payload(session, payload, tracer)
     else:
         logging.info("Prompt Click closed without auto-paste request")
 
@@ -435,6 +835,8 @@ def _run_prompt_click_session(session):
     except OSError:
         logging.exception("Failed to remove trigger file %s", session.trigger_path)
 
+    tracer.complete("session", started_ns)
+    tracer.close()
     with _prompt_thread_lock:
         _prompt_thread = None
 
@@ -443,6 +845,7 @@ def _launch_prompt_click():
     global _last_launch
     global _prompt_thread
 
+    started_ns = time.monotonic_ns()
     now = time.monotonic()
     if now - _last_launch < LAUNCH_COOLDOWN_SECONDS:
         return
@@ -473,9 +876,12 @@ def _launch_prompt_click():
             logging.info("Skipping middle click: Prompt Click launcher is already active")
             return
 
+        token = uuid.uuid4().hex
+        tracer = _open_tracer(session, token)
+        tracer.complete("launch", started_ns)
         _prompt_thread = threading.Thread(
             target=_run_prompt_click_session,
-            args=(session,),
+            args=(session, token, tracer),
             name="prompt-click-launcher",
             daemon=True,
         )
@@ -544,9 +950,15 @@ def _forward_loop(device_path):
         version=source.info.version,
         bustype=source.info.bustype,
     )
+    type_keys = sorted({code for code, _shift in _build_us_type_table().values()})
     _keyboard = UInput(
         {
-            ecodes.EV_KEY: [ecodes.KEY_LEFTSHIFT, ecodes.KEY_INSERT],
+            ecodes.EV_KEY: [
+                ecodes.KEY_LEFTSHIFT,
+                ecodes.KEY_INSERT,
+                *type_keys,
+                *(getattr(ecodes, name) for name in FORM_FILL_KEYS.values()),
+            ],
         },
         name="Prompt Click Virtual Keyboard",
     )